@@ -0,0 +1,495 @@
+"""
+Motor de agregación del dashboard
+
+Calcula en una sola pasada todo lo que necesita un rerun: los KPIs y las
+tablas de cada dashboard de stakeholder. Cada vista declara qué medidas del
+cubo necesita por dimensión (VIEW_PLANS); el motor une los planes de las
+vistas pedidas, lee una vez las columnas de medidas de las celdas
+seleccionadas y calcula cada suma (dimensión, medida) una única vez con
+np.bincount sobre los códigos de las categóricas, que ya vienen factorizados
+del esquema. Los conteos distintos se resuelven en una pasada sobre los
+códigos de order_id/customer_id de las filas seleccionadas.
+
+Las variaciones de los KPIs frente al período anterior (compute_deltas) no
+recorren las filas de nuevo: la ventana actual es el último mes (o trimestre)
+de la selección y la anterior el mes o trimestre previo, o el mismo mes del
+año anterior (comparison_windows). Las sumas salen de las celdas de cubo por
+(ano, mes), las de la ventana actual de las celdas ya seleccionadas, y los
+conteos distintos de las dos ventanas se resuelven juntos, desplazando los
+códigos por ventana. Si la selección cabe entera en la ventana actual se
+reutilizan sus KPIs.
+
+Sumas y conteos distintos se calculan como parciales combinables
+(group_sums_partial/merge_group_sums, distinct_partial/merge_distinct), lo
+que permite repartirlos entre varios núcleos (ver parallel.py).
+
+El resultado es un DashboardAggregates que leen todas las funciones de render.
+Otros backends (pg_backend.py) devuelven el mismo objeto.
+"""
+
+from dataclasses import dataclass
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from cube import (DELIVERY_RATING_N_COLUMNS, DELIVERY_RATING_SUM_COLUMNS,
+                  RATING_HIST_COLUMNS, RATING_VALUES, filter_mask)
+from filters import DATE_FILTER
+from sketches import delivery_quantiles, sla_table
+
+# Etiquetas de los rangos de entrega de cube.DELIVERY_BINS
+DELIVERY_BIN_LABELS = ['1-7 días (Rápido)', '8-14 días (Normal)',
+                       '15-21 días (Lento)', '>21 días (Muy lento)']
+
+DAY_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+VIEWS = ('ceo', 'cmo', 'coo')
+
+# Comparación de los KPIs: nombre -> (meses de cada ventana, meses entre ventanas)
+COMPARISONS = {
+    'Mes anterior': (1, 1),
+    'Trimestre anterior': (3, 3),
+    'Mismo mes del año anterior': (1, 12),
+}
+DEFAULT_COMPARISON = 'Mes anterior'
+
+# Totales de la selección que necesitan los KPIs y el resumen del sidebar
+KPI_MEASURES = ['n', 'precio_sum', 'precio_n', 'rating_sum', 'rating_n',
+                'dias_entrega_sum', 'dias_entrega_n', 'fast_n', 'satisfied_n']
+
+# Por vista: totales adicionales y sumas por dimensión {dimensión: [medidas]}
+VIEW_PLANS = {
+    'ceo': {
+        'totals': [],
+        'by': {'mes_nombre': ['precio_sum'], 'estado': ['precio_sum']}
+    },
+    'cmo': {
+        'totals': [],
+        'by': {
+            'categoria': ['precio_sum', 'rating_sum', 'rating_n'],
+            'metodo_pago': ['n'],
+            'dia_semana': ['precio_sum', 'precio_n']
+        }
+    },
+    'coo': {
+        'totals': RATING_HIST_COLUMNS + DELIVERY_RATING_SUM_COLUMNS + DELIVERY_RATING_N_COLUMNS,
+        'by': {'estado': ['dias_entrega_sum', 'dias_entrega_n', 'n']}
+    }
+}
+
+
+@dataclass
+class DashboardAggregates:
+    """Resumen, KPIs y tablas de cada vista para una selección (None = no calculado)"""
+    summary: dict
+    kpis: dict
+    ceo: dict = None
+    cmo: dict = None
+    coo: dict = None
+    views: tuple = VIEWS
+    # Variación (%) de cada KPI de la ventana actual frente a la anterior (ver compute_deltas)
+    deltas: dict = None
+    comparison: str = None
+    # Ventanas ((inicio, fin) anterior, (inicio, fin) actual) de la variación, ver comparison_windows
+    windows: tuple = None
+
+
+def _ratio(numerator, denominator):
+    """Cociente que devuelve NaN (como un mean vacío de pandas) si el denominador es 0"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.divide(numerator, denominator, dtype='float64')
+
+
+def merge_plans(views):
+    """Une los planes de las vistas pedidas: (totales, {dimensión: medidas}) sin repetir cálculos"""
+    totals = list(KPI_MEASURES)
+    by = {}
+    for view in views:
+        plan = VIEW_PLANS[view]
+        totals += [m for m in plan['totals'] if m not in totals]
+        for dim, measures in plan['by'].items():
+            by.setdefault(dim, [])
+            by[dim] += [m for m in measures if m not in by[dim]]
+    return totals, by
+
+
+def group_sums_partial(dim_codes, measures, total_measures, by, n_categories):
+    """Sumas de un bloque de celdas: totales, celdas por categoría y sumas por (dimensión, medida)
+
+    Todo lo que devuelve es aditivo: los parciales de bloques disjuntos se
+    combinan con merge_group_sums.
+    """
+    totals = {m: measures[m].sum() for m in total_measures}
+    counts, sums = {}, {}
+    for dim, dim_measures in by.items():
+        codes = dim_codes[dim]
+        valid = codes >= 0
+        counts[dim] = np.bincount(codes[valid], minlength=n_categories[dim])
+        for m in dim_measures:
+            sums[dim, m] = np.bincount(codes[valid], weights=measures[m][valid], minlength=n_categories[dim])
+    return totals, counts, sums
+
+
+def merge_group_sums(partials):
+    """Suma los parciales de group_sums_partial"""
+    partials = iter(partials)
+    totals, counts, sums = next(partials)
+    totals, counts, sums = dict(totals), dict(counts), dict(sums)
+    for other_totals, other_counts, other_sums in partials:
+        for m, value in other_totals.items():
+            totals[m] += value
+        for dim, value in other_counts.items():
+            counts[dim] = counts[dim] + value
+        for key, value in other_sums.items():
+            sums[key] = sums[key] + value
+    return totals, counts, sums
+
+
+class _GroupSums:
+    """Sumas por dimensión (ya calculadas con bincount) de las categorías presentes en la selección"""
+
+    def __init__(self, categories, counts, sums):
+        observed = {dim: dim_counts > 0 for dim, dim_counts in counts.items()}
+        self.categories = {dim: categories[dim][mask] for dim, mask in observed.items()}
+        self.sums = {(dim, m): values[observed[dim]] for (dim, m), values in sums.items()}
+
+    def table(self, dim, measures, names):
+        """DataFrame con la dimensión y las sumas pedidas, con los nombres de columna del gráfico"""
+        data = {names[0]: self.categories[dim]}
+        data.update({name: self.sums[dim, m] for name, m in zip(names[1:], measures)})
+        return pd.DataFrame(data)
+
+
+def distinct_partial(order_codes, customer_codes):
+    """Conteos distintos de un bloque de filas en forma combinable
+
+    Devuelve las órdenes distintas del bloque, los clientes distintos
+    (ordenados) y cuántas órdenes distintas tiene cada uno. Si los bloques
+    no comparten órdenes (partición por order_id), las órdenes se suman y
+    las órdenes por cliente se suman cliente a cliente (merge_distinct).
+    """
+    total_orders = np.count_nonzero(np.bincount(order_codes[order_codes >= 0]))
+
+    # Pares (cliente, orden) distintos -> órdenes distintas por cliente
+    both = (order_codes >= 0) & (customer_codes >= 0)
+    n_order_codes = int(order_codes.max()) + 1 if len(order_codes) else 1
+    pairs = np.unique(customer_codes[both].astype(np.int64) * n_order_codes + order_codes[both])
+    customers = pairs // n_order_codes
+    # pairs está ordenado, así que los clientes salen agrupados
+    starts = np.flatnonzero(np.diff(customers, prepend=-1))
+    orders_per_customer = np.diff(np.append(starts, len(customers)))
+
+    # Clientes sin ninguna orden (order_id nulo) también cuentan como clientes
+    customer_only = np.setdiff1d(customer_codes[(customer_codes >= 0) & (order_codes < 0)], customers[starts])
+    return (total_orders,
+            np.concatenate([customers[starts], customer_only]),
+            np.concatenate([orders_per_customer, np.zeros(len(customer_only), dtype=orders_per_customer.dtype)]))
+
+
+def merge_distinct(partials):
+    """Órdenes y clientes distintos y % de clientes con más de una orden a partir de parciales disjuntos por orden"""
+    partials = list(partials)
+    total_orders = sum(p[0] for p in partials)
+    if len(partials) == 1:
+        orders_per_customer = partials[0][2]
+    else:
+        customers = np.concatenate([p[1] for p in partials])
+        counts = np.concatenate([p[2] for p in partials])
+        orders_per_customer = np.bincount(customers, weights=counts)
+        # Los clientes que no aparecen en ningún bloque tienen -1 (no cuentan)
+        present = np.bincount(customers, minlength=len(orders_per_customer)) > 0
+        orders_per_customer = np.where(present, orders_per_customer, -1)
+    total_customers = np.count_nonzero(orders_per_customer >= 0)
+    recurrent_customers = np.count_nonzero(orders_per_customer > 1)
+
+    return {
+        'total_orders': total_orders,
+        'total_customers': total_customers,
+        'recurrent_customers_pct': _ratio(recurrent_customers, total_customers) * 100
+    }
+
+
+def distinct_counts(order_codes, customer_codes):
+    """Órdenes y clientes distintos y % de clientes con más de una orden, en una pasada"""
+    return merge_distinct([distinct_partial(order_codes, customer_codes)])
+
+
+def grouped_distinct_counts(group_codes, order_codes, customer_codes, n_groups):
+    """distinct_counts de cada grupo (0..n_groups-1) en una sola pasada
+
+    Los códigos de orden y cliente se desplazan por grupo, así que una misma
+    orden o cliente en dos grupos cuenta como distinto en cada uno. Pensado
+    para selecciones pequeñas (ventanas de comparación): ordena las claves en
+    lugar de contar sobre todo el rango de códigos.
+    """
+    group_codes = np.asarray(group_codes, dtype=np.int64)
+    n_orders = int(order_codes.max()) + 1 if len(order_codes) else 1
+    n_customers = int(customer_codes.max()) + 1 if len(customer_codes) else 1
+
+    has_order, has_customer = order_codes >= 0, customer_codes >= 0
+    orders = np.unique(group_codes[has_order] * n_orders + order_codes[has_order])
+    customers = np.unique(group_codes[has_customer] * n_customers + customer_codes[has_customer])
+
+    # Pares (cliente, orden) distintos -> clientes con más de una orden
+    both = has_order & has_customer
+    pairs = np.unique((group_codes[both] * n_customers + customer_codes[both]) * n_orders + order_codes[both])
+    pair_customers, orders_per_customer = np.unique(pairs // n_orders, return_counts=True)
+
+    total_orders = np.bincount(orders // n_orders, minlength=n_groups)
+    total_customers = np.bincount(customers // n_customers, minlength=n_groups)
+    recurrent_customers = np.bincount(pair_customers[orders_per_customer > 1] // n_customers, minlength=n_groups)
+    return [
+        {
+            'total_orders': int(total_orders[g]),
+            'total_customers': int(total_customers[g]),
+            'recurrent_customers_pct': _ratio(recurrent_customers[g], total_customers[g]) * 100
+        }
+        for g in range(n_groups)
+    ]
+
+
+def _kpis(totals, distinct):
+    return {
+        'total_orders': distinct['total_orders'],
+        'gmv': totals['precio_sum'],
+        'aov': _ratio(totals['precio_sum'], totals['precio_n']),
+        'avg_rating': _ratio(totals['rating_sum'], totals['rating_n']),
+        'avg_delivery_days': _ratio(totals['dias_entrega_sum'], totals['dias_entrega_n']),
+        'fast_delivery_pct': _ratio(totals['fast_n'], totals['n']) * 100,
+        'satisfied_customers_pct': _ratio(totals['satisfied_n'], totals['n']) * 100,
+        'total_customers': distinct['total_customers'],
+        'recurrent_customers_pct': distinct['recurrent_customers_pct']
+    }
+
+
+def _summary(cells, totals):
+    months = cells['mes_nombre']
+    return {
+        'n_rows': int(totals['n']),
+        'period_start': months.min() if len(cells) else None,
+        'period_end': months.max() if len(cells) else None
+    }
+
+
+def _month_numbers(cells):
+    """Mes de cada celda como meses desde el año 0 (NaN si la celda no tiene fecha)"""
+    return (cells['ano'].to_numpy(dtype='float64', na_value=np.nan) * 12
+            + cells['mes'].to_numpy(dtype='float64', na_value=np.nan) - 1)
+
+
+def month_span(cells):
+    """Primer y último mes con datos de las celdas (meses desde el año 0), o None"""
+    months = _month_numbers(cells)
+    months = months[~np.isnan(months) & (cells['n'].to_numpy() > 0)]
+    return (int(months.min()), int(months.max())) if len(months) else None
+
+
+def label_month(label):
+    """Mes de una etiqueta mes_nombre (AAAA-MM) como meses desde el año 0"""
+    return int(label[:4]) * 12 + int(label[5:7]) - 1
+
+
+def comparison_windows(last, comparison=DEFAULT_COMPARISON):
+    """Ventanas (anterior, actual) de meses [inicio, fin) que compara el KPI; la actual termina en el mes last"""
+    length, lag = COMPARISONS[comparison]
+    current = (last - length + 1, last + 1)
+    return (current[0] - lag, current[1] - lag), current
+
+
+def window_dates(window):
+    """Filtro de fechas (primer día, último día) de una ventana de meses [inicio, fin)"""
+    start, end = window
+    last_day = np.datetime64(f'{end // 12:04d}-{end % 12 + 1:02d}', 'M').astype('datetime64[D]') - 1
+    return date(start // 12, start % 12 + 1, 1), last_day.item()
+
+
+def clip_dates(dates, filters):
+    """Fechas (inicio, fin) recortadas al rango de fechas de los filtros, si lo hay"""
+    if filters.get(DATE_FILTER) is None:
+        return dates
+    start, end = (pd.Timestamp(day).date() for day in filters[DATE_FILTER])
+    return max(dates[0], start), min(dates[1], end)
+
+
+def value_filters(filters):
+    """Filtros por valor sin año ni fechas (los de la ventana anterior, que puede salir del año elegido)"""
+    return {col: value for col, value in filters.items() if col not in ('ano', DATE_FILTER)}
+
+
+def _change(current, previous):
+    """Variación porcentual (NaN si no hay base con la que comparar)"""
+    if previous == 0 or np.isnan(previous):
+        return np.nan
+    return (current - previous) / abs(previous) * 100
+
+
+def kpi_changes(previous, current):
+    """Variación (%) de cada KPI entre dos diccionarios de KPIs"""
+    return {kpi: _change(current[kpi], previous[kpi]) for kpi in current}
+
+
+def _window_totals(cells, window, mask=None):
+    """Totales KPI_MEASURES de las celdas cuyo (ano, mes) cae en la ventana [inicio, fin)"""
+    months = _month_numbers(cells)
+    inside = (months >= window[0]) & (months < window[1])
+    if mask is not None:
+        inside &= mask
+    sums = cells[KPI_MEASURES].to_numpy(dtype='float64')[inside].sum(axis=0)
+    return dict(zip(KPI_MEASURES, sums))
+
+
+def compute_deltas(cube, filters, cells, windows, selections, kpis=None):
+    """Variación (%) de cada KPI entre la ventana actual y la anterior, sin recorrer de nuevo las filas
+
+    Las sumas de la ventana anterior salen de las celdas del cubo que cumplen
+    los filtros por valor y las de la actual de cells (las celdas de la
+    selección). selections son las filas de cada ventana (anterior y, si no se
+    pasan kpis, actual), que solo se usan para los conteos distintos, en una
+    pasada agrupada. kpis son los de la selección cuando cabe entera en la
+    ventana actual: se reutilizan en lugar de recalcularlos.
+    """
+    totals = [_window_totals(cube, windows[0], filter_mask(cube, value_filters(filters)))]
+    if kpis is None:
+        totals.append(_window_totals(cells, windows[1]))
+
+    group_codes = np.repeat(np.arange(len(selections)), [len(selection) for selection in selections])
+    order_codes = np.concatenate([selection.codes('order_id') for selection in selections])
+    customer_codes = np.concatenate([selection.codes('customer_id') for selection in selections])
+    distinct = grouped_distinct_counts(group_codes, order_codes, customer_codes, len(selections))
+
+    previous, *current = (_kpis(t, d) for t, d in zip(totals, distinct))
+    return kpi_changes(previous, kpis if kpis is not None else current[0])
+
+
+def daily_gmv_series(dates, gmv):
+    """Serie de GMV diario con todos los días del período (0 los días sin ventas)"""
+    series = pd.Series(np.asarray(gmv, dtype='float64'), index=pd.DatetimeIndex(dates, name='fecha'), name='GMV')
+    series = series[series.index.notna()]
+    if series.empty:
+        return series
+    return series.groupby(level=0).sum().asfreq('D', fill_value=0.0)
+
+
+def _daily_gmv(daily_cells):
+    """GMV diario de las celdas seleccionadas del cubo diario"""
+    codes, days = pd.factorize(daily_cells['fecha'], sort=True)
+    valid = codes >= 0
+    sums = np.bincount(codes[valid], weights=daily_cells['precio_sum'].to_numpy(dtype='float64')[valid],
+                       minlength=len(days))
+    return daily_gmv_series(days, sums)
+
+
+def _ceo_tables(groups, daily_cells=None):
+    monthly_gmv = groups.table('mes_nombre', ['precio_sum'], ['Mes', 'GMV'])
+    state_gmv = groups.table('estado', ['precio_sum'], ['Estado', 'GMV']).nlargest(10, 'GMV')
+    daily_gmv = _daily_gmv(daily_cells) if daily_cells is not None else None
+    return {'monthly_gmv': monthly_gmv, 'state_gmv': state_gmv, 'daily_gmv': daily_gmv}
+
+
+def _cmo_tables(groups, totals):
+    payment_dist = groups.table('metodo_pago', ['n'], ['Método', 'Cantidad'])
+    payment_dist = payment_dist.sort_values('Cantidad', ascending=False)
+    payment_dist = payment_dist[payment_dist['Cantidad'] > 0]
+    credit_card_rows = payment_dist.loc[payment_dist['Método'] == 'Credit Card', 'Cantidad'].sum()
+
+    cat_sales = groups.table('categoria', ['precio_sum', 'rating_sum', 'rating_n'],
+                             ['Categoría', 'Ventas', 'rating_sum', 'rating_n'])
+    cat_sales['Rating'] = _ratio(cat_sales.pop('rating_sum'), cat_sales.pop('rating_n'))
+    cat_sales = cat_sales.nlargest(10, 'Ventas')
+
+    day_sales = groups.table('dia_semana', ['precio_sum', 'precio_n'], ['Día', 'Total Ventas', 'Núm Órdenes'])
+    day_sales.insert(2, 'Ticket Promedio', _ratio(day_sales['Total Ventas'], day_sales['Núm Órdenes']))
+    day_sales['Día_orden'] = day_sales['Día'].map({d: i for i, d in enumerate(DAY_ORDER)})
+    day_sales = day_sales.sort_values('Día_orden')
+
+    return {
+        'credit_card_pct': _ratio(credit_card_rows, totals['n']) * 100,
+        'cat_sales': cat_sales,
+        'payment_dist': payment_dist,
+        'day_sales': day_sales
+    }
+
+
+def _coo_tables(groups, totals, sketch_cells=None):
+    rating_counts = np.array([totals[c] for c in RATING_HIST_COLUMNS], dtype='int64')
+    rating_dist = pd.DataFrame({'Rating': RATING_VALUES, 'Cantidad': rating_counts})
+    rating_dist = rating_dist[rating_dist['Cantidad'] > 0]
+
+    state_delivery = groups.table('estado', ['dias_entrega_sum', 'dias_entrega_n', 'n'],
+                                  ['Estado', 'dias_entrega_sum', 'dias_entrega_n', 'Órdenes'])
+    state_delivery.insert(1, 'Días Promedio', _ratio(state_delivery.pop('dias_entrega_sum'),
+                                                     state_delivery.pop('dias_entrega_n')))
+    state_delivery = state_delivery.nlargest(10, 'Órdenes')
+
+    rating_sums = np.array([totals[c] for c in DELIVERY_RATING_SUM_COLUMNS])
+    rating_ns = np.array([totals[c] for c in DELIVERY_RATING_N_COLUMNS])
+    delivery_analysis = pd.DataFrame({
+        'Rango': DELIVERY_BIN_LABELS,
+        'Rating Promedio': _ratio(rating_sums, rating_ns),
+        'Total Reviews': rating_ns.astype('int64')
+    })
+    delivery_analysis = delivery_analysis.dropna()
+
+    tables = {
+        'rating_dist': rating_dist,
+        'state_delivery': state_delivery,
+        'delivery_analysis': delivery_analysis
+    }
+    if sketch_cells is not None:
+        tables.update(delivery_sla_tables(sketch_cells))
+    return tables
+
+
+def delivery_sla_tables(sketch_cells):
+    """Percentiles de entrega y retraso (total, por estado y por categoría) de los histogramas seleccionados"""
+    return {
+        'delivery_quantiles': delivery_quantiles(sketch_cells),
+        'state_sla': sla_table(sketch_cells, 'estado', 'Estado'),
+        'category_sla': sla_table(sketch_cells, 'categoria', 'Categoría')
+    }
+
+
+def compute_aggregates(cells, selection, views=VIEWS, with_kpis=True, pool=None, daily_cells=None,
+                       sketch_cells=None):
+    """Calcula resumen, KPIs (opcional) y tablas de las vistas pedidas en una sola pasada
+
+    Con pool (parallel.AggregationPool) las selecciones grandes se reparten en
+    particiones que se calculan en paralelo y se combinan. Con daily_cells
+    (celdas del cubo diario) la vista CEO incluye la serie de GMV diario y con
+    sketch_cells (histogramas de sketches.py) la vista COO incluye los
+    percentiles de entrega.
+    """
+    total_measures, by = merge_plans(views)
+    measure_names = list(dict.fromkeys(total_measures + [m for ms in by.values() for m in ms]))
+    measures = {m: cells[m].to_numpy(dtype='float64') for m in measure_names}
+    dim_codes = {dim: cells[dim].cat.codes.to_numpy() for dim in by}
+    categories = {dim: cells[dim].cat.categories for dim in by}
+    n_categories = {dim: len(values) for dim, values in categories.items()}
+
+    if pool is not None:
+        sums = pool.group_sums(dim_codes, measures, total_measures, by, n_categories)
+    else:
+        sums = group_sums_partial(dim_codes, measures, total_measures, by, n_categories)
+    totals, counts, group_sums = sums
+    groups = _GroupSums(categories, counts, group_sums)
+    if with_kpis:
+        order_codes, customer_codes = selection.codes('order_id'), selection.codes('customer_id')
+        if pool is not None:
+            distinct = pool.distinct_counts(order_codes, customer_codes)
+        else:
+            distinct = distinct_counts(order_codes, customer_codes)
+
+    return DashboardAggregates(
+        summary=_summary(cells, totals),
+        kpis=_kpis(totals, distinct) if with_kpis else None,
+        ceo=_ceo_tables(groups, daily_cells) if 'ceo' in views else None,
+        cmo=_cmo_tables(groups, totals) if 'cmo' in views else None,
+        coo=_coo_tables(groups, totals, sketch_cells) if 'coo' in views else None,
+        views=tuple(views)
+    )
+
+
+def calculate_kpis(cells, selection, pool=None):
+    """Calcula los KPIs principales del dashboard (sin tablas de vistas)"""
+    return compute_aggregates(cells, selection, views=(), pool=pool).kpis
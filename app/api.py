@@ -0,0 +1,210 @@
+"""
+API HTTP/JSON con los KPIs y las tablas del dashboard
+
+Expone los mismos resultados que pinta cada vista sin ejecutar el script de
+Streamlit: un servidor de la librería estándar en un hilo daemon del mismo
+proceso (como el endpoint /metrics), que lee el dataset vigente y la caché
+de resultados compartida (ver main.start_api_server). Una consulta que ya
+respondió el dashboard, o otra consulta de la API, es una búsqueda en la
+caché.
+
+    GET /api/kpis                resumen, KPIs, su variación y las ventanas comparadas
+    GET /api/ceo | /cmo | /coo   resumen y tablas de la vista
+    GET /api/filtros             valores disponibles de cada filtro
+
+Los filtros van en la query string con los nombres del sidebar: ano,
+estado, categoria y metodo_pago (valores separados por comas o repetidos),
+desde y hasta (AAAA-MM-DD, ambos incluidos) y comparacion (ver
+aggregations.COMPARISONS). Cada respuesta lleva un ETag calculado con la
+versión de los datos y la consulta normalizada: con If-None-Match se
+responde 304 sin calcular nada mientras los datos no cambien.
+"""
+
+import hashlib
+import json
+import math
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from aggregations import COMPARISONS, DEFAULT_COMPARISON, VIEWS
+from filters import DATE_FILTER, FILTER_COLUMNS
+from result_cache import filter_signature
+
+API_PREFIX = '/api'
+JSON_CONTENT_TYPE = 'application/json; charset=utf-8'
+
+_DATE_PARAMS = ('desde', 'hasta')
+_QUERY_PARAMS = set(FILTER_COLUMNS) | set(_DATE_PARAMS) | {'comparacion'}
+
+
+class ApiError(ValueError):
+    """Consulta inválida (se responde 400 con el mensaje)"""
+
+
+@dataclass(frozen=True)
+class ApiSnapshot:
+    """Versión vigente de los datos para una petición: filtros disponibles y cálculo de agregados"""
+    version: str
+    filter_options: dict
+    # aggregates(filters, views, with_kpis, comparison) -> DashboardAggregates
+    aggregates: Callable
+
+
+def to_jsonable(value):
+    """Convierte resultados agregados (DataFrames, Series, escalares numpy, fechas) a tipos JSON; NaN -> null"""
+    if isinstance(value, pd.DataFrame):
+        return json.loads(value.to_json(orient='records', date_format='iso', force_ascii=False))
+    if isinstance(value, pd.Series):
+        frame = value.rename(value.name or 'valor').rename_axis(value.index.name or 'indice').reset_index()
+        return to_jsonable(frame)
+    if isinstance(value, dict):
+        return {str(key): to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def _parse_value(col, raw):
+    if col == 'ano':
+        try:
+            return int(raw)
+        except ValueError:
+            raise ApiError(f"ano debe ser un número: {raw!r}") from None
+    return raw
+
+
+def parse_query(query, filter_options):
+    """Filtros (mismas claves y normalización que el sidebar) y comparación de una query string"""
+    params = parse_qs(query, keep_blank_values=False)
+    unknown = set(params) - _QUERY_PARAMS
+    if unknown:
+        raise ApiError(f"Parámetros desconocidos: {', '.join(sorted(unknown))}")
+
+    filters = {'ano': None, DATE_FILTER: None}
+    for col in FILTER_COLUMNS:
+        values = {_parse_value(col, v.strip()) for raw in params.get(col, []) for v in raw.split(',') if v.strip()}
+        filters[col] = tuple(sorted(values)) or None
+    # Como en el selectbox del sidebar, un único año se guarda como valor suelto (misma firma de caché)
+    if filters['ano'] is not None and len(filters['ano']) == 1:
+        filters['ano'] = filters['ano'][0]
+
+    if any(param in params for param in _DATE_PARAMS):
+        if not filter_options.get(DATE_FILTER):
+            raise ApiError("El dataset no tiene fechas")
+        bounds = list(filter_options[DATE_FILTER])
+        for i, param in enumerate(_DATE_PARAMS):
+            if param in params:
+                try:
+                    bounds[i] = date.fromisoformat(params[param][-1])
+                except ValueError:
+                    raise ApiError(f"{param} debe tener el formato AAAA-MM-DD: {params[param][-1]!r}") from None
+        if bounds[0] > bounds[1]:
+            raise ApiError("desde es posterior a hasta")
+        # El rango completo equivale a no filtrar (misma entrada de caché que el sidebar)
+        if tuple(bounds) != tuple(filter_options[DATE_FILTER]):
+            filters[DATE_FILTER] = tuple(bounds)
+
+    comparison = params.get('comparacion', [DEFAULT_COMPARISON])[-1]
+    if comparison not in COMPARISONS:
+        raise ApiError(f"comparacion debe ser una de: {', '.join(COMPARISONS)}")
+    # Mismo orden de claves que los filtros del sidebar
+    return {col: filters[col] for col in ('ano', DATE_FILTER, 'estado', 'categoria', 'metodo_pago')}, comparison
+
+
+def etag(version, resource, filters=None, comparison=None):
+    """ETag de una respuesta: versión de los datos, recurso y consulta normalizada"""
+    key = repr((version, resource, filter_signature(filters or {}), comparison))
+    return '"' + hashlib.sha1(key.encode()).hexdigest()[:20] + '"'
+
+
+class DashboardApi:
+    """Resuelve las peticiones de la API contra la versión vigente de los datos"""
+
+    def __init__(self, snapshot):
+        # snapshot() -> ApiSnapshot; se llama una vez por petición
+        self.snapshot = snapshot
+
+    def handle(self, path, query, if_none_match=None):
+        """(estado HTTP, ETag, cuerpo JSON o None) de una petición GET"""
+        resource = path[len(API_PREFIX):].strip('/') if path.startswith(API_PREFIX + '/') else None
+        if resource not in ('kpis', 'filtros') + VIEWS:
+            return 404, None, {'error': f"Recurso desconocido: {path}"}
+
+        snapshot = self.snapshot()
+        try:
+            if resource == 'filtros':
+                if query:
+                    raise ApiError("filtros no admite parámetros")
+                filters, comparison = None, None
+            else:
+                filters, comparison = parse_query(query, snapshot.filter_options)
+        except ApiError as e:
+            return 400, None, {'error': str(e)}
+
+        tag = etag(snapshot.version, resource, filters, comparison)
+        if if_none_match and tag in (value.strip() for value in if_none_match.split(',')):
+            return 304, tag, None
+
+        body = {'version': snapshot.version}
+        if resource == 'filtros':
+            body['filtros'] = snapshot.filter_options
+            return 200, tag, to_jsonable(body)
+
+        views = () if resource == 'kpis' else (resource,)
+        try:
+            aggregates = snapshot.aggregates(filters, views, True, comparison)
+        except ValueError as e:
+            # p.ej. rango de fechas en la ingesta por bloques sin volcado a disco
+            return 400, None, {'error': str(e)}
+
+        body.update(filtros=filters, resumen=aggregates.summary)
+        if resource == 'kpis':
+            windows = dict(zip(('anterior', 'actual'), aggregates.windows)) if aggregates.windows else None
+            body.update(kpis=aggregates.kpis, variacion=aggregates.deltas, comparacion=aggregates.comparison,
+                        ventanas=windows)
+        else:
+            body['tablas'] = getattr(aggregates, resource)
+        return 200, tag, to_jsonable(body)
+
+
+class _ApiHandler(BaseHTTPRequestHandler):
+    api = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        status, tag, body = self.api.handle(url.path.rstrip('/'), url.query, self.headers.get('If-None-Match'))
+        payload = b'' if body is None else json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(status)
+        if tag:
+            self.send_header('ETag', tag)
+            # Se puede guardar, pero hay que revalidar con If-None-Match en cada uso
+            self.send_header('Cache-Control', 'no-cache')
+        if body is not None:
+            self.send_header('Content-Type', JSON_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(api, port, host='127.0.0.1'):
+    """Sirve la API en un hilo daemon"""
+    handler = type('ApiHandler', (_ApiHandler,), {'api': api})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name='api-http', daemon=True).start()
+    return server
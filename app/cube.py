@@ -0,0 +1,126 @@
+"""
+Cubo OLAP de medidas aditivas
+
+Se construye una sola vez al cargar los datos: agrupa las filas por
+(ano, mes, estado, categoria, metodo_pago, dia_semana) y guarda en cada celda
+sumas y conteos. Cualquier combinación de filtros del sidebar y cualquier
+gráfico mensual, por estado, categoría, día o método de pago se responde
+sumando celdas, con un coste que depende del número de celdas y no del
+número de filas del dataset.
+
+Los conteos distintos (órdenes, clientes, recurrencia) no son aditivos y se
+calculan sobre las filas seleccionadas (ver aggregations.calculate_kpis).
+
+Las series temporales diarias y semanales salen de un segundo cubo, más
+pequeño, con la fecha como dimensión y solo las medidas de GMV
+(build_daily_cube).
+"""
+
+import numpy as np
+import pandas as pd
+
+from filters import date_bounds, filter_values
+
+# mes_nombre depende funcionalmente de (ano, mes): no añade celdas, pero evita
+# reconstruir la etiqueta del mes en cada consulta
+CUBE_DIMENSIONS = ['ano', 'mes', 'mes_nombre', 'estado', 'categoria', 'metodo_pago', 'dia_semana']
+
+# Dimensiones que se pueden filtrar desde el sidebar
+FILTER_DIMENSIONS = ('ano', 'estado', 'categoria', 'metodo_pago')
+
+# Cubo diario: fecha (día) más las dimensiones filtrables; ordenado por fecha
+DAILY_DIMENSIONS = ['fecha', 'ano', 'estado', 'categoria', 'metodo_pago']
+
+# Valores posibles del rating (las órdenes con varias reviews traen medias .5)
+RATING_VALUES = np.arange(1.0, 5.5, 0.5)
+RATING_HIST_COLUMNS = [f'rating_n_{v:.1f}' for v in RATING_VALUES]
+
+# Rangos de tiempo de entrega del análisis COO: (0, 7], (7, 14], (14, 21], (21, 100]
+DELIVERY_BINS = [0, 7, 14, 21, 100]
+DELIVERY_BIN_COUNT = len(DELIVERY_BINS) - 1
+DELIVERY_RATING_SUM_COLUMNS = [f'bin{i}_rating_sum' for i in range(DELIVERY_BIN_COUNT)]
+DELIVERY_RATING_N_COLUMNS = [f'bin{i}_rating_n' for i in range(DELIVERY_BIN_COUNT)]
+
+
+def _sum_and_count(cell, n_cells, values):
+    """Suma y número de valores no nulos por celda"""
+    valid = ~np.isnan(values)
+    total = np.bincount(cell[valid], weights=values[valid], minlength=n_cells)
+    count = np.bincount(cell[valid], minlength=n_cells)
+    return total, count
+
+
+def _bucket_counts(cell, n_cells, bucket, n_buckets, weights=None):
+    """Matriz (celda x bucket) con el conteo (o suma de weights) de cada bucket; bucket < 0 se ignora"""
+    valid = bucket >= 0
+    flat = cell[valid] * n_buckets + bucket[valid]
+    w = None if weights is None else weights[valid]
+    return np.bincount(flat, weights=w, minlength=n_cells * n_buckets).reshape(n_cells, n_buckets)
+
+
+def build_cube(df):
+    """Construye el cubo de medidas aditivas a partir de las filas del dataset"""
+    grouped = df.groupby(CUBE_DIMENSIONS, observed=True, dropna=False, sort=True)
+    cell = grouped.ngroup().to_numpy()
+    cube = grouped.size().reset_index(name='n')
+    n_cells = len(cube)
+
+    precio = df['precio'].to_numpy(dtype='float64', na_value=np.nan)
+    rating = df['rating'].to_numpy(dtype='float64', na_value=np.nan)
+    dias_entrega = df['dias_entrega'].to_numpy(dtype='float64', na_value=np.nan)
+
+    cube['precio_sum'], cube['precio_n'] = _sum_and_count(cell, n_cells, precio)
+    cube['rating_sum'], cube['rating_n'] = _sum_and_count(cell, n_cells, rating)
+    cube['dias_entrega_sum'], cube['dias_entrega_n'] = _sum_and_count(cell, n_cells, dias_entrega)
+    cube['fast_n'] = np.bincount(cell, weights=dias_entrega <= 7, minlength=n_cells)
+    cube['satisfied_n'] = np.bincount(cell, weights=rating >= 4, minlength=n_cells)
+
+    # Histograma del rating en pasos de media estrella
+    with np.errstate(invalid='ignore'):
+        rating_bucket = np.where(np.isnan(rating), -1, np.rint((rating - RATING_VALUES[0]) * 2)).astype('int64')
+    rating_bucket[rating_bucket >= len(RATING_VALUES)] = -1
+    cube[RATING_HIST_COLUMNS] = _bucket_counts(cell, n_cells, rating_bucket, len(RATING_VALUES))
+
+    # Rating por rango de entrega: mismos intervalos (a, b] que pd.cut
+    delivery_bucket = pd.cut(df['dias_entrega'], bins=DELIVERY_BINS, labels=False).to_numpy(dtype='float64', na_value=np.nan)
+    delivery_bucket = np.where(np.isnan(delivery_bucket) | np.isnan(rating), -1, delivery_bucket).astype('int64')
+    cube[DELIVERY_RATING_N_COLUMNS] = _bucket_counts(cell, n_cells, delivery_bucket, DELIVERY_BIN_COUNT)
+    cube[DELIVERY_RATING_SUM_COLUMNS] = _bucket_counts(cell, n_cells, delivery_bucket, DELIVERY_BIN_COUNT,
+                                                       weights=np.nan_to_num(rating))
+
+    return cube
+
+
+def build_daily_cube(df):
+    """Cubo de GMV por día y combinación de filtros del sidebar (series temporales del CEO)"""
+    grouped = df.assign(fecha=df['fecha'].dt.normalize()).groupby(
+        DAILY_DIMENSIONS, observed=True, dropna=False, sort=True)
+    cell = grouped.ngroup().to_numpy()
+    cube = grouped.size().reset_index(name='n')
+
+    precio = df['precio'].to_numpy(dtype='float64', na_value=np.nan)
+    cube['precio_sum'], cube['precio_n'] = _sum_and_count(cell, len(cube), precio)
+    return cube
+
+
+def filter_mask(cube, filters):
+    """Máscara de las celdas del cubo que cumplen los filtros por valor activos (None = sin filtro; un valor o varios)"""
+    mask = np.ones(len(cube), dtype=bool)
+    for dim in FILTER_DIMENSIONS:
+        values = filter_values(filters.get(dim))
+        if values is not None:
+            mask &= cube[dim].isin(values).to_numpy()
+    return mask
+
+
+def slice_cube(cube, filters):
+    """Celdas del cubo que cumplen los filtros por valor activos"""
+    return cube[filter_mask(cube, filters)]
+
+
+def slice_daily_cube(daily_cube, filters):
+    """Celdas del cubo diario que cumplen los filtros; el rango de fechas es un tramo contiguo (searchsorted)"""
+    bounds = date_bounds(daily_cube['fecha'].to_numpy(), filters)
+    if bounds is not None:
+        daily_cube = daily_cube.iloc[bounds[0]:bounds[1]]
+    return slice_cube(daily_cube, filters)
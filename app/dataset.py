@@ -0,0 +1,155 @@
+"""
+Dataset compartido entre sesiones
+
+Agrupa en un único objeto inmutable todo lo que se deriva del dataset al
+cargarlo: el DataFrame tipado, los cubos de medidas (general y diario), los
+índices de filtros,
+los valores de los filtros del sidebar y la versión de los datos. Se crea una
+vez por proceso (st.cache_resource) y todas las sesiones leen la misma copia
+en memoria, en lugar de la copia deserializada por llamada de st.cache_data.
+
+Es de solo lectura: ningún consumidor modifica df ni el cubo; los cálculos
+devuelven objetos nuevos (ver aggregations.py). Las filas se guardan
+ordenadas por fecha para resolver los rangos de fechas con búsqueda binaria
+(ver filters.py).
+
+Las estructuras derivadas se guardan junto al snapshot Parquet
+(build_dataset con snapshot_path): un arranque en frío con el snapshot
+vigente las lee en lugar de recalcular cubos, histogramas e índices. El
+fichero va ligado al tamaño y mtime del snapshot, así que al regenerarse el
+snapshot se recalculan también (ver precompute.py para generarlas al
+construir la imagen).
+"""
+
+import logging
+import os
+import pickle
+from dataclasses import dataclass
+from pathlib import Path
+
+import pandas as pd
+
+from cube import build_cube, build_daily_cube, slice_cube, slice_daily_cube
+from filters import (DATE_FILTER, FILTER_COLUMNS, RowSelection, build_filter_index, date_bounds,
+                     date_range, select_rows)
+from sketches import build_sketch
+from snapshot import write_atomic
+
+logger = logging.getLogger(__name__)
+
+# Se incrementa cuando cambia cualquiera de las estructuras derivadas para invalidar las guardadas
+DERIVED_FORMAT_VERSION = 1
+
+_DERIVED_FIELDS = ('cube', 'daily_cube', 'sketch', 'filter_index', 'filter_options')
+
+
+@dataclass(frozen=True)
+class Dataset:
+    """Dataset cargado y sus estructuras derivadas (solo lectura)"""
+    df: pd.DataFrame
+    cube: pd.DataFrame
+    daily_cube: pd.DataFrame
+    sketch: pd.DataFrame
+    filter_index: dict
+    filter_options: dict
+    version: str
+
+    supports_date_range = True
+
+    @property
+    def n_rows(self):
+        return len(self.df)
+
+    def select(self, filters):
+        """Filas que cumplen los filtros del sidebar, resueltas con los índices y el orden por fecha"""
+        bounds = date_bounds(self.df['fecha'].to_numpy(), filters)
+        return RowSelection(self.df, select_rows(self.filter_index, filters, bounds))
+
+    def cells(self, filters, selection):
+        """Celdas de cubo de la selección: del cubo precalculado o, con rango de fechas, de sus filas"""
+        if date_range(filters) is None:
+            return slice_cube(self.cube, filters)
+        # El cubo no tiene la fecha como dimensión: se construye con las filas de la ventana
+        return build_cube(self.df.iloc[selection.rows])
+
+    def daily_cells(self, filters):
+        """Celdas del cubo diario que cumplen los filtros"""
+        return slice_daily_cube(self.daily_cube, filters)
+
+    def sketch_cells(self, filters, selection):
+        """Histogramas de tiempos de entrega de la selección (ver sketches.py)"""
+        if date_range(filters) is None:
+            return slice_cube(self.sketch, filters)
+        return build_sketch(self.df.iloc[selection.rows])
+
+
+def filter_options(df):
+    """Valores de los filtros del sidebar y extremos del rango de fechas"""
+    options = {col: sorted(df[col].dropna().unique()) for col in FILTER_COLUMNS}
+    dates = df['fecha'].dropna()
+    options[DATE_FILTER] = (dates.min().date(), dates.max().date()) if len(dates) else None
+    return options
+
+
+def derived_path(snapshot_path):
+    """Ruta del fichero de estructuras derivadas de un snapshot"""
+    snapshot_path = Path(snapshot_path)
+    return snapshot_path.with_name(f"{snapshot_path.stem}.derived.pkl")
+
+
+def _derived_key(snapshot_path):
+    stat = os.stat(snapshot_path)
+    return (DERIVED_FORMAT_VERSION, stat.st_size, stat.st_mtime_ns)
+
+
+def build_derived(df):
+    """Cubos, histogramas, índices y valores de los filtros del DataFrame ordenado por fecha"""
+    return {
+        'cube': build_cube(df),
+        'daily_cube': build_daily_cube(df),
+        'sketch': build_sketch(df),
+        'filter_index': build_filter_index(df),
+        'filter_options': filter_options(df)
+    }
+
+
+def load_derived(snapshot_path):
+    """Estructuras derivadas guardadas para el snapshot actual, o None si faltan o no corresponden"""
+    try:
+        key = _derived_key(snapshot_path)
+        with open(derived_path(snapshot_path), 'rb') as f:
+            stored = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # Un pickle truncado o de otra versión de pandas/numpy puede fallar de muchas formas: se recalcula
+        logger.warning("Estructuras derivadas ilegibles (%s), se recalculan", e)
+        return None
+    if not isinstance(stored, dict) or stored.get('key') != key:
+        return None
+    return stored['derived']
+
+
+def save_derived(snapshot_path, derived):
+    """Guarda las estructuras derivadas ligadas al tamaño y mtime del snapshot"""
+    payload = {'key': _derived_key(snapshot_path), 'derived': derived}
+    write_atomic(derived_path(snapshot_path),
+                 lambda p: p.write_bytes(pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)))
+
+
+def build_dataset(df, version, snapshot_path=None):
+    """Construye el Dataset compartido a partir del DataFrame tipado (lo ordena por fecha si hace falta);
+    con snapshot_path (el snapshot del que se leyó df) reutiliza o guarda las estructuras derivadas"""
+    if not df['fecha'].is_monotonic_increasing:
+        df = df.sort_values('fecha', kind='stable', ignore_index=True)
+
+    derived = load_derived(snapshot_path) if snapshot_path is not None else None
+    if derived is None:
+        derived = build_derived(df)
+        if snapshot_path is not None:
+            try:
+                save_derived(snapshot_path, derived)
+            except OSError as e:
+                # Igual que el snapshot: un volumen de solo lectura no impide servir el dashboard
+                logger.warning("No se pudieron guardar las estructuras derivadas de %s: %s", snapshot_path, e)
+    return Dataset(df=df, version=version, **{field: derived[field] for field in _DERIVED_FIELDS})
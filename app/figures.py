@@ -0,0 +1,135 @@
+"""
+Figuras Plotly compactas para el navegador
+
+Cada st.plotly_chart serializa la figura completa a JSON y la envía por el
+websocket en cada rerun; en conexiones remotas ese payload es buena parte de
+la latencia percibida. Antes de enviarla (ver main.plotly_chart):
+
+- compact_figure redondea los arrays numéricos de las trazas (un float64 se
+  escribe con hasta 17 dígitos), escribe las fechas a medianoche como
+  AAAA-MM-DD en lugar de ISO completo y deja en la plantilla solo los
+  valores por defecto de los tipos de traza que usa la figura (la de
+  Streamlit trae los de una decena de tipos en cada gráfico);
+- fit_to_budget mide el JSON de la figura y, si supera el presupuesto,
+  reduce sus series con LTTB (timeseries.lttb) hasta que quepa.
+
+scatter elige Scattergl (WebGL) para las series largas. Las etiquetas de
+valor de las barras se generan en el navegador con texttemplate en lugar de
+enviar una lista de textos ya formateados.
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from timeseries import lttb
+
+DEFAULT_DECIMALS = 2
+DEFAULT_MAX_KB = 128
+# Puntos a partir de los que una serie se pinta con WebGL (cada gráfico WebGL ocupa un contexto del navegador)
+DEFAULT_WEBGL_MIN_POINTS = 1000
+# Puntos que conserva como mínimo una serie al ajustarse al presupuesto
+DEFAULT_MIN_POINTS = 100
+
+SERIES_TYPES = ('scatter', 'scattergl')
+
+# Arrays de las trazas que se compactan y, en las series, las propiedades por punto que se reducen juntas
+_ARRAY_PROPS = ('x', 'y')
+_POINT_PROPS = ('x', 'y', 'text', 'hovertext', 'customdata')
+
+
+def scatter(x, y, webgl_min_points=DEFAULT_WEBGL_MIN_POINTS, **kwargs):
+    """Traza de línea/área: Scattergl si la serie tiene al menos webgl_min_points puntos, Scatter si no"""
+    trace_type = go.Scattergl if webgl_min_points and len(y) >= webgl_min_points else go.Scatter
+    return trace_type(x=x, y=y, **kwargs)
+
+
+def _compact_array(values, decimals):
+    """Floats redondeados y fechas sin hora como AAAA-MM-DD; None si no hay nada que compactar"""
+    array = np.asarray(values)
+    if array.dtype.kind == 'f':
+        return np.round(array, decimals)
+    if array.dtype.kind == 'M' or (array.dtype == object and len(array) and isinstance(array[0], datetime)):
+        try:
+            dates = pd.DatetimeIndex(array)
+        except (TypeError, ValueError):
+            return None
+        if dates.tz is None and not dates.hasnans and (dates == dates.normalize()).all():
+            return np.datetime_as_string(dates.to_numpy(), unit='D')
+    return None
+
+
+def compact_figure(fig, decimals=DEFAULT_DECIMALS):
+    """Compacta la figura en su sitio: arrays redondeados, fechas cortas y plantilla con los tipos usados"""
+    for trace in fig.data:
+        updates = {}
+        for prop in _ARRAY_PROPS:
+            # Algunos tipos (Indicator, Pie) no tienen x/y
+            values = trace[prop] if prop in trace else None
+            if values is None or isinstance(values, str) or len(values) == 0:
+                continue
+            compacted = _compact_array(values, decimals)
+            if compacted is not None:
+                updates[prop] = compacted
+        if updates:
+            trace.update(updates)
+
+    template = fig.layout.template
+    if template is not None and template.data is not None:
+        # Los valores por defecto de otros tipos de traza no cambian nada en esta figura
+        template.data = {trace_type: template.data[trace_type] for trace_type in {trace.type for trace in fig.data}
+                         if template.data[trace_type]}
+    return fig
+
+
+def figure_bytes(fig):
+    """Tamaño del JSON de la figura (la misma serialización que hace Streamlit)"""
+    return len(pio.to_json(fig, validate=False))
+
+
+def reducible_traces(fig, min_points=DEFAULT_MIN_POINTS):
+    """Series de la figura con más de min_points puntos (las únicas que puede reducir fit_to_budget)"""
+    return [trace for trace in fig.data
+            if trace.type in SERIES_TYPES and trace.y is not None and len(trace.y) > min_points]
+
+
+def _x_positions(x, n):
+    """Posiciones numéricas del eje x para LTTB: números, fechas o, si no, el orden de los puntos"""
+    if x is None:
+        return np.arange(n, dtype='float64')
+    values = np.asarray(x)
+    if values.dtype.kind in 'fiu':
+        return values.astype('float64')
+    try:
+        return pd.DatetimeIndex(values).asi8.astype('float64')
+    except (TypeError, ValueError):
+        return np.arange(n, dtype='float64')
+
+
+def _reduce_trace(trace, max_points):
+    n = len(trace.y)
+    keep = lttb(_x_positions(trace.x, n), np.asarray(trace.y, dtype='float64'), max_points)
+    updates = {}
+    for prop in _POINT_PROPS:
+        values = trace[prop]
+        if values is not None and not isinstance(values, str) and len(values) == n:
+            updates[prop] = np.asarray(values)[keep]
+    trace.update(updates)
+
+
+def fit_to_budget(fig, max_bytes, min_points=DEFAULT_MIN_POINTS):
+    """Reduce con LTTB las series de la figura hasta que su JSON quepa en max_bytes; devuelve los bytes finales"""
+    size = figure_bytes(fig)
+    while size > max_bytes:
+        traces = reducible_traces(fig, min_points)
+        if not traces:
+            break
+        # Lo que no son puntos (layout, plantilla) no se reduce: puede hacer falta más de una pasada
+        ratio = max_bytes / size
+        for trace in traces:
+            _reduce_trace(trace, max(min_points, int(len(trace.y) * ratio)))
+        size = figure_bytes(fig)
+    return size
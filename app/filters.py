@@ -0,0 +1,140 @@
+"""
+Motor de filtros basado en índices
+
+Al cargar los datos se precalcula, para cada columna filtrable, la lista
+ordenada de posiciones de fila de cada valor. Una selección del sidebar se
+resuelve uniendo las listas de los valores elegidos de cada columna
+(multiselección) e intersecando las de distintas columnas (empezando por la
+más corta) en lugar de copiar el DataFrame y aplicar una máscara booleana
+por filtro.
+
+Las filas están ordenadas por fecha, así que un rango de fechas es un tramo
+contiguo de posiciones que se localiza con dos búsquedas binarias: sin otros
+filtros la selección es un slice (una vista, sin copia) y con ellos basta
+recortar las posiciones ya ordenadas con otras dos búsquedas. El coste
+depende del tamaño de la ventana, no del histórico.
+
+El resultado es una selección perezosa: solo materializa las columnas que se
+le piden.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Filtros por valor (multiselección); el de fecha es un rango (inicio, fin) con ambos días incluidos
+FILTER_COLUMNS = ('ano', 'estado', 'categoria', 'metodo_pago')
+DATE_FILTER = 'fecha'
+
+_EMPTY = np.array([], dtype=np.int64)
+
+
+def filter_values(value):
+    """Valores de un filtro como tupla (None = sin filtro); acepta un valor suelto o una lista"""
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(value) if len(value) else None
+    return (value,)
+
+
+def date_range(filters):
+    """Rango de fechas activo como (inicio, fin_exclusivo) en datetime64[ns], o None"""
+    value = filters.get(DATE_FILTER)
+    if value is None:
+        return None
+    start, end = value
+    return (np.datetime64(pd.Timestamp(start).normalize(), 'ns'),
+            np.datetime64(pd.Timestamp(end).normalize() + pd.Timedelta(days=1), 'ns'))
+
+
+def date_bounds(sorted_dates, filters):
+    """Posiciones [lo, hi) de las filas dentro del rango de fechas (sorted_dates ordenado), o None"""
+    bounds = date_range(filters)
+    if bounds is None:
+        return None
+    lo, hi = np.searchsorted(sorted_dates, bounds)
+    return int(lo), int(hi)
+
+
+def build_filter_index(df, columns=FILTER_COLUMNS):
+    """Para cada columna, diccionario valor -> posiciones de fila (ordenadas) con ese valor"""
+    index = {}
+    for col in columns:
+        codes, uniques = pd.factorize(df[col], sort=True)
+        order = np.argsort(codes, kind='stable')
+        # Las filas con NaN (código -1) quedan al principio y no se indexan
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        index[col] = {
+            value: order[bounds[i]:bounds[i + 1]]
+            for i, value in enumerate(uniques.tolist())
+        }
+    return index
+
+
+def _intersect_sorted(a, b):
+    """Intersección de dos arrays ordenados sin duplicados; recorre a y busca en b"""
+    if len(a) == 0 or len(b) == 0:
+        return _EMPTY
+    pos = np.searchsorted(b, a)
+    found = pos < len(b)
+    found[found] = b[pos[found]] == a[found]
+    return a[found]
+
+
+def _union_sorted(row_sets):
+    """Unión de listas de posiciones disjuntas (valores distintos de una columna), ordenada"""
+    if len(row_sets) == 1:
+        return row_sets[0]
+    return np.sort(np.concatenate(row_sets))
+
+
+def _restrict(rows, bounds):
+    """Posiciones ordenadas que caen en [lo, hi): dos búsquedas binarias"""
+    lo, hi = np.searchsorted(rows, bounds)
+    return rows[lo:hi]
+
+
+def select_rows(index, filters, bounds=None):
+    """Posiciones de fila que cumplen todos los filtros
+
+    bounds es el tramo [lo, hi) del rango de fechas (ver date_bounds). Devuelve
+    None si no hay filtros activos y un slice si solo hay rango de fechas.
+    """
+    row_sets = []
+    for col, value in filters.items():
+        values = filter_values(value) if col in index else None
+        if values is not None:
+            row_sets.append(_union_sorted([index[col].get(v, _EMPTY) for v in values]))
+    if not row_sets:
+        return None if bounds is None else slice(*bounds)
+
+    row_sets.sort(key=len)
+    rows = row_sets[0] if bounds is None else _restrict(row_sets[0], bounds)
+    for other in row_sets[1:]:
+        rows = _intersect_sorted(rows, other)
+    return rows
+
+
+class RowSelection:
+    """Selección perezosa de filas (rows: posiciones, máscara booleana, slice o None = todas, sin copia)
+
+    df es un DataFrame con columnas categóricas o cualquier objeto con len() cuyas
+    columnas ya son arrays de códigos enteros (ver ingest.KeyColumns).
+    """
+
+    def __init__(self, df, rows=None):
+        self.df = df
+        self.rows = rows
+
+    def __len__(self):
+        if self.rows is None:
+            return len(self.df)
+        if isinstance(self.rows, slice):
+            return len(range(*self.rows.indices(len(self.df))))
+        return int(np.count_nonzero(self.rows)) if self.rows.dtype == bool else len(self.rows)
+
+    def codes(self, column):
+        """Códigos enteros de una columna en las filas seleccionadas (vista si no hay filtros o es un slice)"""
+        column = self.df[column]
+        codes = column.cat.codes.to_numpy() if isinstance(column, pd.Series) else column
+        return codes if self.rows is None else codes[self.rows]
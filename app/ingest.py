@@ -0,0 +1,431 @@
+"""
+Ingesta por bloques para CSVs mayores que la memoria
+
+En lugar de cargar el CSV entero en un DataFrame, lo lee por bloques con el
+esquema tipado y de cada bloque conserva solo lo que necesitan los
+dashboards:
+
+- los cubos de medidas aditivas (cube.build_cube y cube.build_daily_cube)
+  y los histogramas de tiempos de entrega (sketches.build_sketch), que se
+  suman en árbol (_TreeSum) y ocupan lo mismo con 10k que con 100M de filas;
+- las columnas clave por fila: códigos de ano, estado, categoria y
+  metodo_pago y el día de fecha (para filtrar) y de order_id y customer_id
+  (para los conteos distintos). Son ~20 bytes por fila frente a los ~300
+  de la fila tipada completa.
+
+Los ids se codifican con un hash de 64 bits y cada bloque traduce sus hashes
+a códigos densos con un diccionario incremental (_IdCodes), así que la
+columna de códigos se escribe según llega: en memoria solo está el
+diccionario, que crece con los ids distintos y no con las filas. Con 100M de
+ids distintos la probabilidad de una colisión es del orden de 1e-4.
+
+Con spill_dir, las columnas clave se escriben en disco y se sirven con
+memory-map (el sistema operativo pagina lo que haga falta) y las columnas
+tipadas completas se vuelcan a un Parquet por grupos de filas, así que el
+proceso no necesita tener en RAM ni el CSV ni el DataFrame. Los rangos de
+fechas necesitan ese volcado: el cubo no tiene la fecha como dimensión y las
+filas de la ventana se leen del Parquet (solo los grupos que las contienen).
+"""
+
+import logging
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from cube import CUBE_DIMENSIONS, DAILY_DIMENSIONS, build_cube, build_daily_cube, slice_cube, slice_daily_cube
+from filters import DATE_FILTER, FILTER_COLUMNS, RowSelection, date_range, filter_values
+from schema import ID_COLUMNS, ORDERED_CATEGORICAL_COLUMNS, apply_schema, read_dataset_csv_chunks
+from sketches import SKETCH_DIMENSIONS, SKETCH_MEASURES, build_sketch
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_ROWS = 500_000
+
+# Dimensiones del cubo que llegan como categóricas (con categorías distintas en cada bloque)
+_CATEGORICAL_DIMENSIONS = ['mes_nombre', 'estado', 'categoria', 'metodo_pago', 'dia_semana']
+
+# Claves de los histogramas de sketches.py (dimensiones, medida y día)
+_SKETCH_KEYS = SKETCH_DIMENSIONS + ['medida', 'dias']
+
+_MISSING_HASH = np.uint64(2 ** 64 - 1)
+# Día (desde 1970-01-01) de las filas sin fecha: al final, para no romper el orden
+_MISSING_DAY = np.iinfo(np.int32).max
+_REMAP_BLOCK_ROWS = 10_000_000
+
+
+class _GlobalCodes:
+    """Códigos estables de una columna de baja cardinalidad que llega por bloques"""
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def encode(self, series):
+        """Códigos globales (int32, -1 = nulo) de los valores de un bloque"""
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            local, uniques = series.cat.codes.to_numpy(), series.cat.categories
+        else:
+            local, uniques = pd.factorize(series)
+        # La última posición atiende el código local -1 (nulo)
+        mapping = np.array([self._code(v) for v in uniques.tolist()] + [-1], dtype=np.int32)
+        return mapping[local]
+
+    def _code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def finalize(self):
+        """Valores ordenados y la tabla código de ingesta -> código final (posición -1 para nulos)"""
+        order = sorted(range(len(self.values)), key=lambda i: self.values[i])
+        remap = np.full(len(order) + 1, -1, dtype=np.int32)
+        remap[order] = np.arange(len(order), dtype=np.int32)
+        return [self.values[i] for i in order], remap
+
+
+class _ColumnSink:
+    """Columna que se acumula por bloques en memoria o en un fichero binario (spill)"""
+
+    def __init__(self, dtype, path=None):
+        self.dtype = np.dtype(dtype)
+        self.path = path
+        self._parts = []
+        self._file = open(path, 'wb') if path else None
+
+    def append(self, values):
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        if self._file:
+            values.tofile(self._file)
+        else:
+            self._parts.append(values)
+
+    def finish(self):
+        """Array completo: en memoria o memory-map del fichero"""
+        if self._file:
+            self._file.close()
+            if self.path.stat().st_size == 0:
+                return np.empty(0, dtype=self.dtype)
+            return np.memmap(self.path, dtype=self.dtype, mode='r+')
+        return np.concatenate(self._parts) if self._parts else np.empty(0, dtype=self.dtype)
+
+
+def _remap_in_place(codes, remap):
+    """codes = remap[codes] por bloques, para no duplicar en memoria una columna en disco"""
+    for start in range(0, len(codes), _REMAP_BLOCK_ROWS):
+        block = codes[start:start + _REMAP_BLOCK_ROWS]
+        block[:] = remap[block]
+
+
+def _hash_ids(series):
+    """Hash de 64 bits de cada id de un bloque (vectorizado; los nulos reciben un valor reservado)"""
+    hashes = pd.util.hash_array(series.to_numpy(dtype=object), categorize=False)
+    hashes[series.isna().to_numpy()] = _MISSING_HASH
+    return hashes
+
+
+def _day_numbers(dates):
+    """Días desde 1970-01-01 (int32) de una columna de fechas"""
+    days = dates.to_numpy(dtype='datetime64[D]')
+    numbers = days.astype(np.int64)
+    numbers[np.isnat(days)] = _MISSING_DAY
+    return numbers.astype(np.int32)
+
+
+class _IdCodes:
+    """Códigos densos (por orden de aparición, -1 = nulo) de ids hasheados que llegan por bloques
+
+    Los hashes conocidos se guardan en tramos ordenados de tamaño decreciente
+    que se fusionan como un contador binario: buscar los de un bloque es una
+    búsqueda binaria por tramo y cada hash se reordena O(log n) veces en toda
+    la ingesta, en lugar de un np.unique final sobre la columna completa.
+    """
+
+    def __init__(self):
+        self._runs = []
+        self.n_codes = 0
+
+    def encode(self, hashes):
+        """Códigos int32 de los hashes de un bloque; los ids nuevos reciben los siguientes códigos"""
+        uniques, inverse = np.unique(hashes, return_inverse=True)
+        codes = np.full(len(uniques), -1, dtype=np.int64)
+        pending = uniques != _MISSING_HASH
+        for run_hashes, run_codes in self._runs:
+            pos = np.minimum(np.searchsorted(run_hashes, uniques), len(run_hashes) - 1)
+            found = pending & (run_hashes[pos] == uniques)
+            codes[found] = run_codes[pos[found]]
+            pending &= ~found
+
+        new = np.flatnonzero(pending)
+        codes[new] = np.arange(self.n_codes, self.n_codes + len(new))
+        self.n_codes += len(new)
+        if len(new):
+            self._add_run(uniques[new], codes[new])
+        return codes.astype(np.int32)[inverse]
+
+    def _add_run(self, hashes, codes):
+        while self._runs and len(self._runs[-1][0]) <= len(hashes):
+            run_hashes, run_codes = self._runs.pop()
+            hashes = np.concatenate([run_hashes, hashes])
+            order = np.argsort(hashes, kind='stable')
+            hashes, codes = hashes[order], np.concatenate([run_codes, codes])[order]
+        self._runs.append((hashes, codes))
+
+
+def _merge_cubes(cubes, dimensions=CUBE_DIMENSIONS):
+    """Suma celda a celda cubos parciales con las dimensiones ya codificadas como enteros"""
+    cube = pd.concat(cubes, ignore_index=True)
+    return cube.groupby(dimensions, dropna=False, sort=False, as_index=False).sum()
+
+
+class _TreeSum:
+    """Suma de cubos parciales en árbol (como un contador binario)
+
+    Cada bloque se fusiona con el parcial pendiente de su mismo nivel, así que
+    cada celda se vuelve a agrupar O(log n) veces en lugar de una por bloque.
+    """
+
+    def __init__(self, dimensions):
+        self.dimensions = dimensions
+        self._levels = []
+
+    def add(self, cube):
+        level = 0
+        while self._levels and self._levels[-1][0] == level:
+            cube = _merge_cubes([self._levels.pop()[1], cube], self.dimensions)
+            level += 1
+        self._levels.append((level, cube))
+
+    def result(self):
+        """Cubo total (None si no se añadió ninguno)"""
+        if len(self._levels) <= 1:
+            return self._levels[0][1] if self._levels else None
+        return _merge_cubes([cube for _, cube in self._levels], self.dimensions)
+
+
+def _plain_table(chunk):
+    """Bloque tipado como tabla Arrow con las categóricas como texto (esquema igual en todos los bloques)"""
+    table = pa.Table.from_pandas(chunk, preserve_index=False)
+    return pa.table([col.cast(pa.string()) if pa.types.is_dictionary(col.type) else col
+                     for col in table.columns], names=table.column_names)
+
+
+class KeyColumns:
+    """Columnas de códigos por fila (arrays o memory-maps) que usa RowSelection"""
+
+    def __init__(self, columns, n_rows):
+        self.columns = columns
+        self.n_rows = n_rows
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def __len__(self):
+        return self.n_rows
+
+
+@dataclass(frozen=True)
+class StreamedDataset:
+    """Dataset ingerido por bloques: cubo y columnas clave, sin filas tipadas en memoria (solo lectura)"""
+    cube: pd.DataFrame
+    daily_cube: pd.DataFrame
+    sketch: pd.DataFrame
+    keys: KeyColumns
+    key_codes: dict
+    filter_options: dict
+    version: str
+    dates_sorted: bool = False
+    store: Path = None
+
+    @property
+    def n_rows(self):
+        return len(self.keys)
+
+    @property
+    def supports_date_range(self):
+        return self.store is not None
+
+    def select(self, filters):
+        """Filas que cumplen los filtros del sidebar, resueltas con una pasada sobre los códigos
+
+        Con rango de fechas y el CSV ordenado por fecha, la pasada se limita al
+        tramo de la ventana (búsqueda binaria sobre los días).
+        """
+        lo, hi = 0, self.n_rows
+        mask = None
+        bounds = date_range(filters)
+        if bounds is not None:
+            day_bounds = np.array(bounds).astype('datetime64[D]').astype(np.int64)
+            days = self.keys[DATE_FILTER]
+            if self.dates_sorted:
+                lo, hi = (int(i) for i in np.searchsorted(days, day_bounds))
+            else:
+                mask = (days >= day_bounds[0]) & (days < day_bounds[1])
+
+        for col in FILTER_COLUMNS:
+            values = filter_values(filters.get(col))
+            if values is None:
+                continue
+            codes = [self.key_codes[col][v] for v in values if v in self.key_codes[col]]
+            column_mask = np.isin(self.keys[col][lo:hi], codes)
+            mask = column_mask if mask is None else mask & column_mask
+
+        if (lo, hi) == (0, self.n_rows):
+            return RowSelection(self.keys, mask)
+        if mask is None:
+            return RowSelection(self.keys, slice(lo, hi))
+        return RowSelection(self.keys, lo + np.flatnonzero(mask))
+
+    def cells(self, filters, selection):
+        """Celdas de cubo de la selección: del cubo precalculado o, con rango de fechas, de las filas volcadas"""
+        if date_range(filters) is None:
+            return slice_cube(self.cube, filters)
+        if self.store is None:
+            raise ValueError("Los rangos de fechas en la ingesta por bloques necesitan INGEST_SPILL_DIR")
+        return build_cube(self._read_rows(selection.rows))
+
+    def daily_cells(self, filters):
+        """Celdas del cubo diario que cumplen los filtros"""
+        return slice_daily_cube(self.daily_cube, filters)
+
+    def sketch_cells(self, filters, selection):
+        """Histogramas de tiempos de entrega de la selección (con rango de fechas, de las filas volcadas)"""
+        if date_range(filters) is None:
+            return slice_cube(self.sketch, filters)
+        if self.store is None:
+            raise ValueError("Los rangos de fechas en la ingesta por bloques necesitan INGEST_SPILL_DIR")
+        return build_sketch(self._read_rows(selection.rows))
+
+    def _read_rows(self, rows):
+        """Filas tipadas de la selección, leídas del volcado Parquet (solo los grupos de filas que las contienen)"""
+        positions = np.arange(self.n_rows)[rows] if rows is not None else np.arange(self.n_rows)
+        rows_file = pq.ParquetFile(self.store / 'rows.parquet')
+        if len(positions) == 0:
+            return apply_schema(rows_file.schema_arrow.empty_table().to_pandas())
+
+        sizes = [rows_file.metadata.row_group(i).num_rows for i in range(rows_file.num_row_groups)]
+        starts = np.concatenate([[0], np.cumsum(sizes)])
+        first, last = np.searchsorted(starts, [positions[0], positions[-1]], side='right') - 1
+        table = rows_file.read_row_groups(range(first, last + 1))
+        table = table.take(pa.array(positions - starts[first]))
+        return apply_schema(table.to_pandas(date_as_object=False, coerce_temporal_nanoseconds=True))
+
+
+def _prepare_store(spill_dir, csv_path, version):
+    """Directorio del volcado de esta versión"""
+    store = Path(spill_dir) / f'{Path(csv_path).stem}-{version}'
+    store.mkdir(parents=True, exist_ok=True)
+    return store
+
+
+def prune_stores(spill_dir, csv_path, keep):
+    """Borra los volcados del mismo CSV salvo keep (llamar cuando la versión anterior ya no se sirve)"""
+    for old in Path(spill_dir).glob(f'{Path(csv_path).stem}-*'):
+        if old != keep and old.is_dir():
+            # En Linux los memory-maps abiertos siguen siendo válidos tras borrar el fichero
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def ingest_csv(csv_path, version, chunk_rows=DEFAULT_CHUNK_ROWS, spill_dir=None):
+    """Lee el CSV por bloques y construye un StreamedDataset con memoria acotada"""
+    store = _prepare_store(spill_dir, csv_path, version) if spill_dir else None
+    path = (lambda name: store / name) if store else (lambda name: None)
+
+    dimension_codes = {dim: _GlobalCodes() for dim in _CATEGORICAL_DIMENSIONS}
+    filter_codes = {col: _GlobalCodes() for col in FILTER_COLUMNS}
+    filter_sinks = {col: _ColumnSink(np.int16, path(f'{col}.codes')) for col in FILTER_COLUMNS}
+    id_codes = {col: _IdCodes() for col in ID_COLUMNS}
+    id_sinks = {col: _ColumnSink(np.int32, path(f'{col}.codes')) for col in ID_COLUMNS}
+    day_sink = _ColumnSink(np.int32, path(f'{DATE_FILTER}.days'))
+    dates_sorted, last_day = True, np.iinfo(np.int32).min
+    rows_writer = None
+    cubes, daily_cubes, sketches = _TreeSum(CUBE_DIMENSIONS), _TreeSum(DAILY_DIMENSIONS), _TreeSum(_SKETCH_KEYS)
+    n_rows = 0
+
+    try:
+        for chunk in read_dataset_csv_chunks(csv_path, chunk_rows, ids_as_text=True):
+            partial = build_cube(chunk)
+            for dim, codes in dimension_codes.items():
+                partial[dim] = codes.encode(partial[dim])
+            cubes.add(partial)
+            daily_partial = build_daily_cube(chunk)
+            for dim in DAILY_DIMENSIONS:
+                if dim in dimension_codes:
+                    daily_partial[dim] = dimension_codes[dim].encode(daily_partial[dim])
+            daily_cubes.add(daily_partial)
+            sketch_partial = build_sketch(chunk)
+            for dim in SKETCH_DIMENSIONS:
+                if dim in dimension_codes:
+                    sketch_partial[dim] = dimension_codes[dim].encode(sketch_partial[dim])
+            sketch_partial['medida'] = sketch_partial['medida'].cat.codes
+            sketches.add(sketch_partial)
+
+            for col in FILTER_COLUMNS:
+                filter_sinks[col].append(filter_codes[col].encode(chunk[col]))
+            for col in ID_COLUMNS:
+                id_sinks[col].append(id_codes[col].encode(_hash_ids(chunk[col])))
+            days = _day_numbers(chunk[DATE_FILTER])
+            day_sink.append(days)
+            if len(days):
+                dates_sorted &= bool(days[0] >= last_day and np.all(days[1:] >= days[:-1]))
+                last_day = days[-1]
+
+            if store:
+                table = _plain_table(chunk)
+                rows_writer = rows_writer or pq.ParquetWriter(store / 'rows.parquet', table.schema, compression='zstd')
+                rows_writer.write_table(table)
+
+            n_rows += len(chunk)
+            logger.info("Ingeridas %s filas de %s", f"{n_rows:,}", csv_path)
+    finally:
+        if rows_writer is not None:
+            rows_writer.close()
+
+    cube, daily_cube, sketch = cubes.result(), daily_cubes.result(), sketches.result()
+    if cube is None:
+        raise ValueError(f"{csv_path} no tiene filas")
+
+    # Dimensiones de los cubos: de códigos de ingesta a categóricas ordenadas, como en build_cube
+    for dim, codes in dimension_codes.items():
+        categories, remap = codes.finalize()
+        for target in (cube, daily_cube, sketch):
+            if dim in target:
+                target[dim] = pd.Categorical.from_codes(remap[target[dim].to_numpy()], categories=categories,
+                                                        ordered=dim in ORDERED_CATEGORICAL_COLUMNS)
+    cube = cube.sort_values(CUBE_DIMENSIONS, ignore_index=True)
+    daily_cube = daily_cube.sort_values(DAILY_DIMENSIONS, ignore_index=True)
+    sketch['medida'] = pd.Categorical.from_codes(sketch['medida'], categories=list(SKETCH_MEASURES))
+    # Filas de cada medida contiguas, como en build_sketch
+    sketch = sketch.sort_values(['medida'] + SKETCH_DIMENSIONS + ['dias'], ignore_index=True)
+
+    keys, key_codes, filter_options = {}, {}, {}
+    for col in FILTER_COLUMNS:
+        categories, remap = filter_codes[col].finalize()
+        keys[col] = filter_sinks[col].finish()
+        _remap_in_place(keys[col], remap.astype(np.int16))
+        key_codes[col] = {value: code for code, value in enumerate(categories)}
+        filter_options[col] = categories
+    keys[DATE_FILTER] = day_sink.finish()
+    valid_days = daily_cube['fecha'].dropna()
+    filter_options[DATE_FILTER] = ((valid_days.min().date(), valid_days.max().date())
+                                   if len(valid_days) else None)
+    for col in ID_COLUMNS:
+        keys[col] = id_sinks[col].finish()
+
+    return StreamedDataset(
+        cube=cube,
+        daily_cube=daily_cube,
+        sketch=sketch,
+        keys=KeyColumns(keys, n_rows),
+        key_codes=key_codes,
+        filter_options=filter_options,
+        version=version,
+        dates_sorted=dates_sorted,
+        store=store
+    )
@@ -10,13 +10,46 @@ Este dashboard muestra:
 - KPIs del dataset Olist de e-commerce brasileño
 """
 
-import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import numpy as np
-from pathlib import Path
+import time
+
+# Inicio de la primera ejecución del script: mide sus importaciones (ver metrics.record_startup)
+_SCRIPT_STARTED = time.perf_counter()
+
+import streamlit as st  # noqa: E402
+import pandas as pd  # noqa: E402
+import numpy as np  # noqa: E402
+import logging  # noqa: E402
+import os  # noqa: E402
+import sys  # noqa: E402
+from datetime import date, timedelta  # noqa: E402
+from functools import cache, partial  # noqa: E402
+from pathlib import Path  # noqa: E402
+
+import metrics  # noqa: E402
+from aggregations import (COMPARISONS, DEFAULT_COMPARISON, VIEWS, clip_dates, comparison_windows,  # noqa: E402
+                          compute_aggregates, compute_deltas, month_span, value_filters, window_dates)
+from dataset import build_dataset  # noqa: E402
+from refresh import DEFAULT_INTERVAL_SECONDS, DataRefresher  # noqa: E402
+from resources import process_resource  # noqa: E402
+from result_cache import ResultCache, filter_signature  # noqa: E402
+from schema import apply_schema, read_dataset_csv  # noqa: E402
+from snapshot import is_snapshot_valid, load_with_snapshot, snapshot_paths, source_fingerprint  # noqa: E402
+from timeseries import DEFAULT_MAX_POINTS, GRANULARITIES, lttb, resample_series  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# python main.py (ver serve) ejecuta el script una vez sin sesión antes de arrancar Streamlit: sin el aviso de
+# ejecución directa, como en report.py
+if __name__ == '__main__' and not st.runtime.exists():
+    from streamlit import config as streamlit_config
+
+    streamlit_config.set_option('global.showWarningOnDirectExecution', False)
+
+# Arranque en frío: edad del proceso al ejecutar el script por primera vez y tiempo de sus importaciones.
+# Plotly (graph_objects, subplots, express), figures, api, pg_backend, ingest, parallel y synthetic se
+# importan donde se usan (pandas y numpy ya los carga Streamlit)
+metrics.REGISTRY.record_startup('proceso', metrics.process_uptime())
+metrics.REGISTRY.record_startup('imports', time.perf_counter() - _SCRIPT_STARTED)
 
 # =============================================================================
 # CONFIGURACIÓN DE PÁGINA Y ESTILOS NUCLIO
@@ -310,8 +343,10 @@ KPI_FICHAS_TECNICAS = {
     }
 }
 
-# CSS personalizado con estilo Nuclio
-st.markdown(f"""
+@cache
+def nuclio_css():
+    """CSS personalizado con estilo Nuclio (también lo usan los informes estáticos de report.py)"""
+    return f"""
 <style>
     /* Fuente principal */
     @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
@@ -838,87 +873,293 @@ st.markdown(f"""
         margin: 2rem 0;
     }}
 </style>
-""", unsafe_allow_html=True)
+"""
+
+
+st.markdown(nuclio_css(), unsafe_allow_html=True)
 
 
 # =============================================================================
 # CARGA DE DATOS
 # =============================================================================
-@st.cache_data
+DATA_PATH = Path(__file__).parent / "data" / "olist_dashboard_dataset.csv"
+
+# Filas del dataset sintético que se genera si no existe el CSV
+SAMPLE_ROWS = int(os.environ.get('SAMPLE_ROWS', '10000'))
+
+# Ingesta: 'memory' (DataFrame completo vía snapshot) o 'streaming' (por bloques, ver ingest.py)
+INGEST_MODE = os.environ.get('INGEST_MODE', 'memory').lower()
+# Sin definir: DEFAULT_CHUNK_ROWS de ingest.py (se resuelve al importarlo, solo en modo streaming)
+INGEST_CHUNK_ROWS = os.environ.get('INGEST_CHUNK_ROWS')
+# Directorio donde la ingesta por bloques vuelca las columnas a disco (vacío = todo en memoria)
+INGEST_SPILL_DIR = os.environ.get('INGEST_SPILL_DIR') or None
+
+
 def load_data():
-    """Carga el dataset de Olist"""
-    data_path = Path(__file__).parent / "data" / "olist_dashboard_dataset.csv"
+    """Carga el dataset de Olist con el esquema tipado (ver schema.py) vía snapshot Parquet"""
+    data_path = DATA_PATH
 
     if not data_path.exists():
-        # Generar datos de ejemplo si no existe el archivo
-        np.random.seed(42)
-        n_records = 10000
-
-        categories = ['Bed Bath Table', 'Health Beauty', 'Sports Leisure', 'Computers Accessories',
-                     'Furniture Decor', 'Toys', 'Watches Gifts', 'Telephony', 'Auto', 'Baby']
-        states = ['SP', 'RJ', 'MG', 'RS', 'PR', 'SC', 'BA', 'GO', 'DF', 'PE']
-        payment_methods = ['Credit Card', 'Boleto', 'Voucher', 'Debit Card']
-        days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-
-        dates = pd.date_range('2017-01-01', '2018-08-31', periods=n_records)
-
-        df = pd.DataFrame({
-            'order_id': [f'order_{i}' for i in range(n_records)],
-            'customer_id': [f'customer_{np.random.randint(1, 5000)}' for _ in range(n_records)],
-            'fecha': dates,
-            'ano': [d.year for d in dates],
-            'mes': [d.month for d in dates],
-            'mes_nombre': [d.strftime('%Y-%m') for d in dates],
-            'dia_semana': np.random.choice(days, n_records),
-            'estado': np.random.choice(states, n_records, p=[0.35, 0.15, 0.12, 0.08, 0.08, 0.06, 0.06, 0.04, 0.03, 0.03]),
-            'categoria': np.random.choice(categories, n_records),
-            'precio': np.random.exponential(100, n_records) + 10,
-            'costo_envio': np.random.exponential(15, n_records) + 5,
-            'valor_total_pagado': np.random.exponential(120, n_records) + 15,
-            'metodo_pago': np.random.choice(payment_methods, n_records, p=[0.76, 0.19, 0.03, 0.02]),
-            'cuotas': np.random.choice(range(1, 11), n_records),
-            'dias_entrega': np.random.exponential(10, n_records) + 2,
-            'rating': np.random.choice([1, 2, 3, 4, 5], n_records, p=[0.05, 0.05, 0.1, 0.23, 0.57])
-        })
-
-        return df
-
-    df = pd.read_csv(data_path)
-    column_mapping = {'año': 'ano'}
-    df = df.rename(columns=column_mapping)
-    return df
-
-
-def calculate_kpis(df):
-    """Calcula los KPIs principales del dashboard"""
-    total_orders = df['order_id'].nunique()
-    gmv = df['precio'].sum()
-    aov = df['precio'].mean()
-    avg_rating = df['rating'].mean()
-    avg_delivery_days = df['dias_entrega'].mean()
-    fast_delivery_pct = (df['dias_entrega'] <= 7).mean() * 100
-    satisfied_customers_pct = (df['rating'] >= 4).mean() * 100
-    total_customers = df['customer_id'].nunique()
-
-    orders_per_customer = df.groupby('customer_id')['order_id'].nunique()
-    recurrent_customers_pct = (orders_per_customer > 1).mean() * 100
-
-    return {
-        'total_orders': total_orders,
-        'gmv': gmv,
-        'aov': aov,
-        'avg_rating': avg_rating,
-        'avg_delivery_days': avg_delivery_days,
-        'fast_delivery_pct': fast_delivery_pct,
-        'satisfied_customers_pct': satisfied_customers_pct,
-        'total_customers': total_customers,
-        'recurrent_customers_pct': recurrent_customers_pct
-    }
+        # Generar datos de ejemplo si no existe el archivo (ver synthetic.py)
+        from synthetic import generate_dataframe
+
+        return apply_schema(generate_dataframe(SAMPLE_ROWS, seed=42))
+
+    return load_with_snapshot(data_path, read_dataset_csv)
+
+
+# Segundos entre comprobaciones de cambios en el origen de datos (0 = sin recarga en segundo plano)
+DATA_REFRESH_SECONDS = int(os.environ.get('DATA_REFRESH_SECONDS', str(DEFAULT_INTERVAL_SECONDS)))
+
+# Filtros del sidebar sin selección (mismas claves y orden que en render_app)
+NO_FILTERS = {'ano': None, 'fecha': None, 'estado': None, 'categoria': None, 'metodo_pago': None}
+
+
+def data_version():
+    """Versión del CSV (formato, tamaño y mtime) o None si se usa el dataset sintético"""
+    if not DATA_PATH.exists():
+        return None
+    fingerprint = source_fingerprint(DATA_PATH)
+    return f"{fingerprint['format_version']}-{fingerprint['size']}-{fingerprint['mtime_ns']}"
+
+
+def build_shared_dataset(version):
+    """Dataset, cubo e índices de una versión del CSV (la versión se toma antes de leer: un cambio durante la carga no se oculta)"""
+    if INGEST_MODE == 'streaming' and version is not None:
+        from ingest import DEFAULT_CHUNK_ROWS, ingest_csv
+
+        with metrics.stage('ingest'):
+            return ingest_csv(DATA_PATH, version, chunk_rows=int(INGEST_CHUNK_ROWS or DEFAULT_CHUNK_ROWS),
+                              spill_dir=INGEST_SPILL_DIR)
+
+    with metrics.stage('read_data') as stage:
+        df = load_data()
+        stage.rows = len(df)
+    # Las estructuras derivadas se guardan junto al snapshot solo si df salió de él (ver dataset.py)
+    snapshot_path = snapshot_paths(DATA_PATH)[0] if version is not None and is_snapshot_valid(DATA_PATH) else None
+    with metrics.stage('build_derived'):
+        return build_dataset(df, version or f'synthetic-{SAMPLE_ROWS}', snapshot_path=snapshot_path)
+
+
+def warm_dataset(dataset, result_cache, pool):
+    """Precalcula las vistas sin filtros de una versión nueva antes de servirla"""
+    load_aggregates(dataset, NO_FILTERS, (), False, result_cache=result_cache, pool=pool)
+    for view in VIEWS:
+        load_aggregates(dataset, NO_FILTERS, (view,), True, result_cache=result_cache, pool=pool)
+
+
+def release_dataset(previous, current, result_cache):
+    """Libera lo que solo servía a la versión anterior: sus resultados cacheados y su volcado a disco"""
+    result_cache.retain(lambda key: key[0] == current.version)
+    if getattr(current, 'store', None) is not None:
+        from ingest import prune_stores
+
+        prune_stores(INGEST_SPILL_DIR, DATA_PATH, current.store)
+
+
+@st.cache_resource(show_spinner="Cargando dataset...")
+@process_resource
+def get_data_refresher():
+    """Dataset vigente, recargado en segundo plano cuando cambia el CSV (ver refresh.py)"""
+    metrics.mark_cache_miss()
+    # Las cachés de Streamlit no guardan nada desde hilos sin sesión: el hilo recibe los objetos ya resueltos
+    result_cache, pool = get_result_cache(), get_aggregation_pool()
+    refresher = DataRefresher(build_shared_dataset, data_version, DATA_REFRESH_SECONDS,
+                              warm=partial(warm_dataset, result_cache=result_cache, pool=pool),
+                              on_swap=partial(release_dataset, result_cache=result_cache))
+    release_dataset(None, refresher.current, result_cache)
+    return refresher.start()
+
+
+def load_dataset():
+    """Dataset, cubo e índices compartidos sin copia por todas las sesiones (la versión vigente al llamar)"""
+    return get_data_refresher().current
+
+
+# Puntos como máximo de las series temporales que se envían al navegador (ver timeseries.py)
+CHART_MAX_POINTS = int(os.environ.get('CHART_MAX_POINTS', str(DEFAULT_MAX_POINTS)))
+
+# Payload de los gráficos (ver figures.py): decimales de los arrays, presupuesto por figura en KB
+# (0 = sin límite) y puntos a partir de los que una serie se pinta con WebGL (0 = nunca).
+# Sin definir se usan los DEFAULT_* de figures.py, que se importa con el primer gráfico
+CHART_DECIMALS = os.environ.get('CHART_DECIMALS')
+CHART_MAX_KB = os.environ.get('CHART_MAX_KB')
+CHART_WEBGL_MIN_POINTS = os.environ.get('CHART_WEBGL_MIN_POINTS')
+
+# Presupuesto de la caché de resultados agregados, en MB
+RESULT_CACHE_MB = int(os.environ.get('RESULT_CACHE_MB', '64'))
+
+
+@process_resource
+def get_result_cache():
+    """Caché LRU de KPIs y tablas por firma de filtros, compartida por todas las sesiones (ver result_cache.py)"""
+    return ResultCache(max_bytes=RESULT_CACHE_MB * 1024 * 1024)
+
+
+# Agregación paralela (ver parallel.py): núcleos (0 = todos, 1 = en serie), hilos o procesos
+# y filas seleccionadas a partir de las que se reparte (sin definir: DEFAULT_MIN_ROWS de parallel.py)
+AGG_WORKERS = int(os.environ.get('AGG_WORKERS', '0'))
+AGG_EXECUTOR = os.environ.get('AGG_EXECUTOR', 'thread').lower()
+AGG_PARALLEL_MIN_ROWS = os.environ.get('AGG_PARALLEL_MIN_ROWS')
+
+
+def create_aggregation_pool():
+    """Pool de agregación por particiones con la configuración AGG_* (también lo usa report.py)"""
+    from parallel import DEFAULT_MIN_ROWS, AggregationPool
+
+    return AggregationPool(AGG_WORKERS or None, kind=AGG_EXECUTOR,
+                           min_rows=int(AGG_PARALLEL_MIN_ROWS or DEFAULT_MIN_ROWS))
+
+
+@process_resource
+def get_aggregation_pool():
+    """Pool de agregación por particiones compartido por todas las sesiones"""
+    return create_aggregation_pool()
+
+
+def load_aggregates(dataset, filters, views, with_kpis, comparison=DEFAULT_COMPARISON, result_cache=None, pool=None):
+    """KPIs y tablas de las vistas pedidas; solo se recalculan si la firma no está en la caché"""
+    result_cache = result_cache if result_cache is not None else get_result_cache()
+    pool = pool if pool is not None else get_aggregation_pool()
+    key = (dataset.version, filter_signature(filters), tuple(views), with_kpis, comparison)
+
+    def compute():
+        metrics.mark_cache_miss()
+        with metrics.stage('filter') as stage:
+            selection = dataset.select(filters)
+            cells = dataset.cells(filters, selection)
+            daily_cells = dataset.daily_cells(filters) if 'ceo' in views else None
+            sketch_cells = dataset.sketch_cells(filters, selection) if 'coo' in views else None
+            stage.rows = len(selection)
+        with metrics.stage('compute_aggregates', rows=len(cells)):
+            aggregates = compute_aggregates(cells, selection, views, with_kpis, pool=pool,
+                                            daily_cells=daily_cells, sketch_cells=sketch_cells)
+        if with_kpis:
+            with metrics.stage('compute_deltas'):
+                aggregates.windows, aggregates.deltas = load_deltas(dataset, filters, cells, aggregates.kpis,
+                                                                    comparison)
+                aggregates.comparison = comparison
+        return aggregates
+
+    return result_cache.get_or_compute(key, compute)
+
+
+def load_deltas(dataset, filters, cells, kpis, comparison):
+    """Ventanas (fechas) y variación de los KPIs del último mes o trimestre de la selección (None, None sin datos)
+
+    La ventana anterior sale del cubo; de las filas solo se leen los códigos
+    de order_id/customer_id de cada ventana (búsqueda binaria por fecha).
+    """
+    span = month_span(cells)
+    if span is None:
+        return None, None
+    windows = comparison_windows(span[1], comparison)
+    previous_dates = window_dates(windows[0])
+    current_dates = clip_dates(window_dates(windows[1]), filters)
+    selections = [dataset.select({**value_filters(filters), 'fecha': previous_dates})]
+    # Si la selección cabe en la ventana actual, sus KPIs ya son los de la ventana
+    covered = span[0] >= windows[1][0]
+    if not covered:
+        selections.append(dataset.select({**filters, 'fecha': current_dates}))
+    deltas = compute_deltas(dataset.cube, filters, cells, windows, selections, kpis if covered else None)
+    return (previous_dates, current_dates), deltas
+
+
+# Origen de datos: 'csv' (dataset en memoria) o 'postgres' (agregaciones en la BD)
+DATA_SOURCE = os.environ.get('DATA_SOURCE', 'csv').lower()
+POSTGRES_CACHE_TTL = int(os.environ.get('POSTGRES_CACHE_TTL', '300'))
+
+
+@process_resource
+def get_postgres_pool():
+    """Pool de conexiones a Postgres compartido por todas las sesiones"""
+    import pg_backend
+
+    return pg_backend.create_pool()
+
+
+# Tablas resumen de init-db/03-summary-tables.sql: 'auto' (si existen), 'on' u 'off'
+POSTGRES_SUMMARIES = os.environ.get('POSTGRES_SUMMARIES', 'auto').lower()
+
+
+@st.cache_data(ttl=POSTGRES_CACHE_TTL, show_spinner=False)
+def use_postgres_summaries():
+    """Si las agregaciones se leen de las tablas resumen en lugar de la tabla ventas"""
+    if POSTGRES_SUMMARIES != 'auto':
+        return POSTGRES_SUMMARIES == 'on'
+    import pg_backend
+
+    with pg_backend.connection(get_postgres_pool()) as conn:
+        return pg_backend.has_summary_tables(conn)
+
+
+# data_version (ver get_postgres_refresher) forma parte de la clave de caché: cuando cambian los
+# datos las entradas anteriores dejan de usarse sin esperar al TTL
+@st.cache_data(ttl=POSTGRES_CACHE_TTL, show_spinner=False)
+def load_postgres_filter_options(data_version):
+    """Valores de los filtros del sidebar leídos de Postgres"""
+    import pg_backend
+
+    metrics.mark_cache_miss()
+    with pg_backend.connection(get_postgres_pool()) as conn:
+        return pg_backend.fetch_filter_options(conn, summaries=use_postgres_summaries())
+
+
+@st.cache_data(ttl=POSTGRES_CACHE_TTL, show_spinner=False)
+def load_postgres_aggregates(filters, views, with_kpis, comparison, data_version):
+    """KPIs y tablas de las vistas pedidas agregados en Postgres para los filtros dados"""
+    import pg_backend
+
+    metrics.mark_cache_miss()
+    with pg_backend.connection(get_postgres_pool()) as conn:
+        return pg_backend.fetch_aggregates(conn, filters, views, with_kpis, summaries=use_postgres_summaries(),
+                                           comparison=comparison)
+
+
+def postgres_data_version(pool):
+    """Huella de los datos de Postgres (filas y última fecha de ventas, último recálculo de las tablas resumen)"""
+    import pg_backend
+
+    with pg_backend.connection(pool) as conn:
+        return pg_backend.fetch_data_version(conn)
+
+
+@process_resource
+def get_postgres_refresher():
+    """Versión vigente de los datos de Postgres, comprobada en segundo plano (ver refresh.py)
+
+    Aquí no hay nada que construir: la versión solo invalida las consultas cacheadas.
+    """
+    # Como en get_data_refresher, el hilo recibe el pool ya resuelto
+    return DataRefresher(lambda version: version, partial(postgres_data_version, get_postgres_pool()),
+                         DATA_REFRESH_SECONDS).start()
+
+
+def current_refresher():
+    """Refresher del origen de datos configurado"""
+    return get_postgres_refresher() if DATA_SOURCE == 'postgres' else get_data_refresher()
 
 
 # =============================================================================
 # COMPONENTES DE UI
 # =============================================================================
+def plotly_chart(fig):
+    """st.plotly_chart de la figura compactada (ver figures.py): tiempo de serialización y tamaño del payload"""
+    from figures import DEFAULT_DECIMALS, DEFAULT_MAX_KB, compact_figure, figure_bytes, fit_to_budget, reducible_traces
+
+    max_kb = int(CHART_MAX_KB or DEFAULT_MAX_KB)
+    with metrics.stage('plotly') as stage:
+        compact_figure(fig, int(CHART_DECIMALS or DEFAULT_DECIMALS))
+        # Solo las series se pueden reducir: el resto de figuras no se mide fuera del modo diagnóstico
+        if max_kb and reducible_traces(fig):
+            stage.payload_bytes = fit_to_budget(fig, max_kb * 1024)
+        st.plotly_chart(fig, use_container_width=True)
+    profile = metrics.current_profile()
+    if stage.payload_bytes is None and profile is not None and profile.trace_allocations:
+        # Misma serialización que hace Streamlit; fuera de la etapa para no duplicar su tiempo
+        stage.payload_bytes = figure_bytes(fig)
+
+
 def render_header():
     """Renderiza el header con el estilo de Nuclio"""
     st.markdown("""
@@ -1044,11 +1285,30 @@ def render_ficha_tecnica(kpi_key):
     """, unsafe_allow_html=True)
 
 
+def period_label(window):
+    """Texto de una ventana (inicio, fin): meses completos como MM/AAAA, si no días como DD/MM/AAAA"""
+    start, end = window
+    if start.day == 1 and (end + timedelta(days=1)).day == 1:
+        first, last = f"{start:%m/%Y}", f"{end:%m/%Y}"
+    else:
+        first, last = f"{start:%d/%m/%Y}", f"{end:%d/%m/%Y}"
+    return first if first == last else f"{first}–{last}"
+
+
+def kpi_delta(aggregates, kpi):
+    """Argumentos delta/delta_label de render_kpi_card_enhanced para un KPI (sin variación si no hay base)"""
+    if not aggregates.deltas:
+        return {}
+    previous, current = aggregates.windows
+    return {'delta': aggregates.deltas.get(kpi),
+            'delta_label': f"{period_label(current)} vs {period_label(previous)}"}
+
+
 def render_kpi_card_enhanced(title, value, delta=None, delta_label="vs período anterior",
                              prefix="", suffix="", kpi_key=None, color="yellow"):
     """Renderiza una tarjeta de KPI mejorada con opción de ficha técnica"""
     delta_html = ""
-    if delta is not None:
+    if delta is not None and np.isfinite(delta):
         delta_class = "positive" if delta >= 0 else "negative"
         delta_sign = "+" if delta >= 0 else ""
         arrow = "↑" if delta >= 0 else "↓"
@@ -1069,6 +1329,8 @@ def render_kpi_card_enhanced(title, value, delta=None, delta_label="vs período
 
 def render_gauge_chart(value, max_val, target, title, color):
     """Renderiza un gráfico de gauge"""
+    import plotly.graph_objects as go
+
     fig = go.Figure(go.Indicator(
         mode="gauge+number+delta",
         value=value,
@@ -1126,6 +1388,8 @@ def render_stakeholder_badge(stakeholder):
 
 def render_kpi_tree():
     """Renderiza el árbol de KPIs interactivo mejorado"""
+    import plotly.graph_objects as go
+
     st.markdown("### Árbol de KPIs - E-commerce")
 
     st.markdown("""
@@ -1176,8 +1440,11 @@ def render_kpi_tree():
          'color': NUCLIO_COLORS['green'], 'text_color': 'white', 'size': 0.055},
     ]
 
+    # Formas y anotaciones se pasan juntas a update_layout: cada add_shape/add_annotation vuelve a
+    # validar todas las anteriores (~1 s con las ~70 del árbol en el primer rerun)
+    shapes, annotations = [], []
     for node in nodes:
-        fig.add_shape(
+        shapes.append(dict(
             type="rect",
             x0=node['x'] - node['size'] + 0.005,
             y0=node['y'] - 0.055,
@@ -1186,8 +1453,8 @@ def render_kpi_tree():
             fillcolor='rgba(0,0,0,0.1)',
             line=dict(width=0),
             layer="below"
-        )
-        fig.add_shape(
+        ))
+        shapes.append(dict(
             type="rect",
             x0=node['x'] - node['size'],
             y0=node['y'] - 0.06,
@@ -1196,14 +1463,14 @@ def render_kpi_tree():
             fillcolor=node['color'],
             line=dict(width=0),
             layer="below"
-        )
-        fig.add_annotation(
+        ))
+        annotations.append(dict(
             x=node['x'], y=node['y'],
             text=node['label'],
             showarrow=False,
             font=dict(size=9, color=node['text_color'], family='Inter'),
             align="center"
-        )
+        ))
 
     connections = [
         (0.5, 0.94, 0.5, 0.91),
@@ -1219,14 +1486,16 @@ def render_kpi_tree():
     ]
 
     for x0, y0, x1, y1 in connections:
-        fig.add_shape(
+        shapes.append(dict(
             type="line",
             x0=x0, y0=y0, x1=x1, y1=y1,
             line=dict(color=NUCLIO_COLORS['gray_medium'], width=2),
             layer="below"
-        )
+        ))
 
     fig.update_layout(
+        shapes=shapes,
+        annotations=annotations,
         showlegend=False,
         xaxis=dict(visible=False, range=[-0.02, 1.02]),
         yaxis=dict(visible=False, range=[0.12, 1.08]),
@@ -1236,7 +1505,7 @@ def render_kpi_tree():
         paper_bgcolor='white'
     )
 
-    st.plotly_chart(fig, use_container_width=True)
+    plotly_chart(fig)
 
     st.markdown("#### Leyenda del Árbol")
     col1, col2, col3, col4, col5 = st.columns(5)
@@ -1252,8 +1521,12 @@ def render_kpi_tree():
         st.markdown('<div class="kpi-tree-node node-kpi">KPI</div>', unsafe_allow_html=True)
 
 
-def render_ceo_dashboard(df, kpis):
+def render_ceo_dashboard(aggregates):
     """Dashboard para el CEO - Visión estratégica con fichas técnicas"""
+    import plotly.graph_objects as go
+    from figures import DEFAULT_WEBGL_MIN_POINTS, scatter
+
+    tables, kpis = aggregates.ceo, aggregates.kpis
     render_stakeholder_badge('CEO')
 
     # Mostrar Dashboard Persona
@@ -1273,13 +1546,13 @@ def render_ceo_dashboard(df, kpis):
     col1, col2, col3, col4 = st.columns(4)
 
     with col1:
-        render_kpi_card_enhanced("GMV Total", f"{kpis['gmv']:,.0f}", delta=12.5, prefix="R$ ", kpi_key='GMV', color='yellow')
+        render_kpi_card_enhanced("GMV Total", f"{kpis['gmv']:,.0f}", **kpi_delta(aggregates, 'gmv'), prefix="R$ ", kpi_key='GMV', color='yellow')
     with col2:
-        render_kpi_card_enhanced("Total Órdenes", f"{kpis['total_orders']:,}", delta=8.3, kpi_key='Total_Ordenes', color='yellow')
+        render_kpi_card_enhanced("Total Órdenes", f"{kpis['total_orders']:,}", **kpi_delta(aggregates, 'total_orders'), kpi_key='Total_Ordenes', color='yellow')
     with col3:
-        render_kpi_card_enhanced("Ticket Promedio (AOV)", f"{kpis['aov']:.2f}", delta=3.7, prefix="R$ ", kpi_key='AOV', color='yellow')
+        render_kpi_card_enhanced("Ticket Promedio (AOV)", f"{kpis['aov']:.2f}", **kpi_delta(aggregates, 'aov'), prefix="R$ ", kpi_key='AOV', color='yellow')
     with col4:
-        render_kpi_card_enhanced("Clientes Únicos", f"{kpis['total_customers']:,}", delta=15.2, kpi_key='Total_Clientes', color='yellow')
+        render_kpi_card_enhanced("Clientes Únicos", f"{kpis['total_customers']:,}", **kpi_delta(aggregates, 'total_customers'), kpi_key='Total_Clientes', color='yellow')
 
     st.markdown('<div class="custom-divider"></div>', unsafe_allow_html=True)
 
@@ -1288,40 +1561,57 @@ def render_ceo_dashboard(df, kpis):
 
     with col1:
         fig = render_gauge_chart(kpis['avg_rating'], 5, 4.0, "Rating Promedio", NUCLIO_COLORS['yellow'])
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(fig)
     with col2:
         fig = render_gauge_chart(kpis['satisfied_customers_pct'], 100, 80, "% Clientes Satisfechos", NUCLIO_COLORS['green'])
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(fig)
     with col3:
         fig = render_gauge_chart(kpis['fast_delivery_pct'], 100, 60, "% Entregas Rápidas", NUCLIO_COLORS['purple'])
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(fig)
 
     st.markdown('<div class="custom-divider"></div>', unsafe_allow_html=True)
 
     col1, col2 = st.columns(2)
 
     with col1:
-        st.markdown("#### Evolución de GMV por Mes")
-        monthly_gmv = df.groupby('mes_nombre')['precio'].sum().reset_index()
-        monthly_gmv.columns = ['Mes', 'GMV']
-        monthly_gmv = monthly_gmv.sort_values('Mes')
+        st.markdown("#### Evolución de GMV")
+        monthly_gmv = tables['monthly_gmv']
+        daily_gmv = tables.get('daily_gmv')
+
+        granularity = 'Mensual'
+        if daily_gmv is not None:
+            granularity = st.radio("Granularidad", ['Mensual'] + list(GRANULARITIES), horizontal=True,
+                                   key='ceo_gmv_granularity', label_visibility='collapsed')
+        if granularity == 'Mensual':
+            x, y = monthly_gmv['Mes'].to_numpy(), monthly_gmv['GMV'].to_numpy()
+            keep = np.arange(len(y))
+        else:
+            # Serie completa para la tendencia; al navegador solo llegan los puntos de LTTB
+            series = resample_series(daily_gmv, granularity)
+            x, y = series.index, series.to_numpy()
+            keep = lttb(series.index.asi8, y, CHART_MAX_POINTS)
+        show_markers = len(keep) <= 60
 
         fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=monthly_gmv['Mes'], y=monthly_gmv['GMV'],
-            mode='lines+markers', fill='tozeroy',
-            line=dict(color=NUCLIO_COLORS['yellow'], width=3),
+        fig.add_trace(scatter(
+            x[keep], y[keep], webgl_min_points=int(CHART_WEBGL_MIN_POINTS or DEFAULT_WEBGL_MIN_POINTS),
+            mode='lines+markers' if show_markers else 'lines', fill='tozeroy',
+            line=dict(color=NUCLIO_COLORS['yellow'], width=3 if show_markers else 2),
             marker=dict(size=8, color=NUCLIO_COLORS['black']),
-            fillcolor='rgba(255, 198, 48, 0.2)'
+            fillcolor='rgba(255, 198, 48, 0.2)',
+            name='GMV'
         ))
 
-        z = np.polyfit(range(len(monthly_gmv)), monthly_gmv['GMV'], 1)
-        p = np.poly1d(z)
-        fig.add_trace(go.Scatter(
-            x=monthly_gmv['Mes'], y=p(range(len(monthly_gmv))),
-            mode='lines', line=dict(color=NUCLIO_COLORS['red'], width=2, dash='dash'),
-            name='Tendencia'
-        ))
+        # La tendencia es una recta: basta con sus extremos
+        if len(y) >= 2:
+            z = np.polyfit(range(len(y)), y, 1)
+            p = np.poly1d(z)
+            ends = keep[[0, -1]]
+            fig.add_trace(go.Scatter(
+                x=x[ends], y=p(ends),
+                mode='lines', line=dict(color=NUCLIO_COLORS['red'], width=2, dash='dash'),
+                name='Tendencia'
+            ))
 
         fig.update_layout(height=400, margin=dict(l=20, r=20, t=20, b=60),
                          xaxis_title="", yaxis_title="GMV (R$)",
@@ -1329,12 +1619,14 @@ def render_ceo_dashboard(df, kpis):
                          showlegend=True, legend=dict(orientation='h', y=-0.15))
         fig.update_xaxes(tickangle=45, gridcolor='#eee')
         fig.update_yaxes(gridcolor='#eee')
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(fig)
 
     with col2:
         st.markdown("#### Distribución por Estado (Top 10)")
-        state_gmv = df.groupby('estado')['precio'].sum().nlargest(10).reset_index()
-        state_gmv.columns = ['Estado', 'GMV']
+        state_gmv = tables['state_gmv']
+
+        # plotly.express tarda ~0,1 s en importarse: solo lo paga quien abre esta vista
+        import plotly.express as px
 
         fig = px.bar(state_gmv, x='Estado', y='GMV', color='GMV',
                     color_continuous_scale=[[0, NUCLIO_COLORS['gray_light']],
@@ -1345,11 +1637,15 @@ def render_ceo_dashboard(df, kpis):
                          plot_bgcolor='white', paper_bgcolor='white',
                          coloraxis_showscale=False)
         fig.update_yaxes(gridcolor='#eee')
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(fig)
 
 
-def render_cmo_dashboard(df, kpis):
+def render_cmo_dashboard(aggregates):
     """Dashboard para el CMO - Performance de Marketing con fichas técnicas"""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    tables, kpis = aggregates.cmo, aggregates.kpis
     render_stakeholder_badge('CMO')
 
     with st.expander("Ver Dashboard Persona - CMO", expanded=False):
@@ -1367,14 +1663,14 @@ def render_cmo_dashboard(df, kpis):
     col1, col2, col3, col4 = st.columns(4)
 
     with col1:
-        render_kpi_card_enhanced("Ticket Promedio (AOV)", f"{kpis['aov']:.2f}", delta=5.2, prefix="R$ ", kpi_key='AOV', color='purple')
+        render_kpi_card_enhanced("Ticket Promedio (AOV)", f"{kpis['aov']:.2f}", **kpi_delta(aggregates, 'aov'), prefix="R$ ", kpi_key='AOV', color='purple')
     with col2:
-        credit_card_pct = (df['metodo_pago'] == 'Credit Card').mean() * 100
+        credit_card_pct = tables['credit_card_pct']
         render_kpi_card_enhanced("% Pago con Tarjeta", f"{credit_card_pct:.1f}", suffix="%", color='purple')
     with col3:
-        render_kpi_card_enhanced("% Clientes Recurrentes", f"{kpis['recurrent_customers_pct']:.1f}", delta=2.3, suffix="%", kpi_key='Clientes_Recurrentes', color='purple')
+        render_kpi_card_enhanced("% Clientes Recurrentes", f"{kpis['recurrent_customers_pct']:.1f}", **kpi_delta(aggregates, 'recurrent_customers_pct'), suffix="%", kpi_key='Clientes_Recurrentes', color='purple')
     with col4:
-        render_kpi_card_enhanced("Rating Promedio", f"{kpis['avg_rating']:.2f}", delta=2.1, suffix="/5", kpi_key='Rating_Promedio', color='purple')
+        render_kpi_card_enhanced("Rating Promedio", f"{kpis['avg_rating']:.2f}", **kpi_delta(aggregates, 'avg_rating'), suffix="/5", kpi_key='Rating_Promedio', color='purple')
 
     st.markdown('<div class="custom-divider"></div>', unsafe_allow_html=True)
 
@@ -1382,28 +1678,25 @@ def render_cmo_dashboard(df, kpis):
 
     with col1:
         st.markdown("#### Top 10 Categorías por Ventas")
-        cat_sales = df.groupby('categoria').agg({'precio': 'sum', 'order_id': 'nunique', 'rating': 'mean'}).reset_index()
-        cat_sales.columns = ['Categoría', 'Ventas', 'Órdenes', 'Rating']
-        cat_sales = cat_sales.nlargest(10, 'Ventas')
+        cat_sales = tables['cat_sales']
 
         fig = go.Figure()
         fig.add_trace(go.Bar(
             y=cat_sales['Categoría'], x=cat_sales['Ventas'], orientation='h',
             marker=dict(color=cat_sales['Ventas'],
                        colorscale=[[0, NUCLIO_COLORS['purple_light']], [1, NUCLIO_COLORS['purple']]]),
-            text=[f"R$ {v:,.0f}" for v in cat_sales['Ventas']],
+            texttemplate='R$ %{x:,.0f}',
             textposition='inside', textfont=dict(color='white')
         ))
         fig.update_layout(height=450, margin=dict(l=20, r=20, t=20, b=20),
                          yaxis_title="", xaxis_title="Ventas (R$)",
                          plot_bgcolor='white', paper_bgcolor='white')
         fig.update_xaxes(gridcolor='#eee')
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(fig)
 
     with col2:
         st.markdown("#### Distribución de Métodos de Pago")
-        payment_dist = df['metodo_pago'].value_counts().reset_index()
-        payment_dist.columns = ['Método', 'Cantidad']
+        payment_dist = tables['payment_dist']
 
         fig = go.Figure(data=[go.Pie(
             labels=payment_dist['Método'], values=payment_dist['Cantidad'], hole=0.5,
@@ -1413,34 +1706,33 @@ def render_cmo_dashboard(df, kpis):
         )])
         fig.update_layout(height=450, margin=dict(l=20, r=20, t=20, b=20), showlegend=False,
                          annotations=[dict(text='Pagos', x=0.5, y=0.5, font_size=16, showarrow=False)])
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(fig)
 
     st.markdown("#### Patrón de Ventas por Día de la Semana")
     day_translation = {
         'Monday': 'Lunes', 'Tuesday': 'Martes', 'Wednesday': 'Miércoles',
         'Thursday': 'Jueves', 'Friday': 'Viernes', 'Saturday': 'Sábado', 'Sunday': 'Domingo'
     }
-    day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
 
-    day_sales = df.groupby('dia_semana').agg({'precio': ['sum', 'mean', 'count']}).reset_index()
-    day_sales.columns = ['Día', 'Total Ventas', 'Ticket Promedio', 'Núm Órdenes']
-    day_sales['Día_orden'] = day_sales['Día'].map({d: i for i, d in enumerate(day_order)})
-    day_sales = day_sales.sort_values('Día_orden')
-    day_sales['Día_ES'] = day_sales['Día'].map(day_translation)
+    day_sales = tables['day_sales']
+    day_labels = day_sales['Día'].astype(str).map(day_translation)
 
     fig = make_subplots(rows=1, cols=2, subplot_titles=('Ventas Totales por Día', 'Ticket Promedio por Día'))
-    fig.add_trace(go.Bar(x=day_sales['Día_ES'], y=day_sales['Total Ventas'],
+    fig.add_trace(go.Bar(x=day_labels, y=day_sales['Total Ventas'],
                         marker_color=NUCLIO_COLORS['yellow'], name='Ventas'), row=1, col=1)
-    fig.add_trace(go.Bar(x=day_sales['Día_ES'], y=day_sales['Ticket Promedio'],
+    fig.add_trace(go.Bar(x=day_labels, y=day_sales['Ticket Promedio'],
                         marker_color=NUCLIO_COLORS['purple'], name='Ticket'), row=1, col=2)
     fig.update_layout(height=350, margin=dict(l=20, r=20, t=40, b=20),
                      plot_bgcolor='white', paper_bgcolor='white', showlegend=False)
     fig.update_yaxes(gridcolor='#eee')
-    st.plotly_chart(fig, use_container_width=True)
+    plotly_chart(fig)
 
 
-def render_coo_dashboard(df, kpis):
+def render_coo_dashboard(aggregates):
     """Dashboard para el COO - Eficiencia Operacional con fichas técnicas"""
+    import plotly.graph_objects as go
+
+    tables, kpis = aggregates.coo, aggregates.kpis
     render_stakeholder_badge('COO')
 
     with st.expander("Ver Dashboard Persona - COO", expanded=False):
@@ -1458,13 +1750,13 @@ def render_coo_dashboard(df, kpis):
     col1, col2, col3, col4 = st.columns(4)
 
     with col1:
-        render_kpi_card_enhanced("Tiempo Entrega Prom.", f"{kpis['avg_delivery_days']:.1f}", delta=-8.5, suffix=" días", kpi_key='Tiempo_Entrega', color='green')
+        render_kpi_card_enhanced("Tiempo Entrega Prom.", f"{kpis['avg_delivery_days']:.1f}", **kpi_delta(aggregates, 'avg_delivery_days'), suffix=" días", kpi_key='Tiempo_Entrega', color='green')
     with col2:
-        render_kpi_card_enhanced("% Entregas Rápidas", f"{kpis['fast_delivery_pct']:.1f}", delta=5.3, suffix="%", kpi_key='Entregas_Rapidas', color='green')
+        render_kpi_card_enhanced("% Entregas Rápidas", f"{kpis['fast_delivery_pct']:.1f}", **kpi_delta(aggregates, 'fast_delivery_pct'), suffix="%", kpi_key='Entregas_Rapidas', color='green')
     with col3:
-        render_kpi_card_enhanced("% Clientes Satisfechos", f"{kpis['satisfied_customers_pct']:.1f}", delta=3.2, suffix="%", kpi_key='Clientes_Satisfechos', color='green')
+        render_kpi_card_enhanced("% Clientes Satisfechos", f"{kpis['satisfied_customers_pct']:.1f}", **kpi_delta(aggregates, 'satisfied_customers_pct'), suffix="%", kpi_key='Clientes_Satisfechos', color='green')
     with col4:
-        render_kpi_card_enhanced("Rating Promedio", f"{kpis['avg_rating']:.2f}", delta=1.8, suffix="/5", kpi_key='Rating_Promedio', color='green')
+        render_kpi_card_enhanced("Rating Promedio", f"{kpis['avg_rating']:.2f}", **kpi_delta(aggregates, 'avg_rating'), suffix="/5", kpi_key='Rating_Promedio', color='green')
 
     st.markdown('<div class="custom-divider"></div>', unsafe_allow_html=True)
 
@@ -1474,13 +1766,13 @@ def render_coo_dashboard(df, kpis):
     with col1:
         delivery_score = max(0, 100 - (kpis['avg_delivery_days'] - 7) * 10)
         fig = render_gauge_chart(min(delivery_score, 100), 100, 70, "Score Entrega (7 días = 100)", NUCLIO_COLORS['green'])
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(fig)
     with col2:
         fig = render_gauge_chart(kpis['avg_rating'], 5, 4.0, "Rating Objetivo >= 4.0", NUCLIO_COLORS['yellow'])
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(fig)
     with col3:
         fig = render_gauge_chart(kpis['satisfied_customers_pct'], 100, 80, "Satisfacción Objetivo >= 80%", NUCLIO_COLORS['purple'])
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(fig)
 
     st.markdown('<div class="custom-divider"></div>', unsafe_allow_html=True)
 
@@ -1488,51 +1780,45 @@ def render_coo_dashboard(df, kpis):
 
     with col1:
         st.markdown("#### Distribución de Ratings")
-        rating_dist = df['rating'].value_counts().sort_index().reset_index()
-        rating_dist.columns = ['Rating', 'Cantidad']
+        rating_dist = tables['rating_dist']
         colors = [NUCLIO_COLORS['red'], NUCLIO_COLORS['orange'], NUCLIO_COLORS['yellow'],
                  NUCLIO_COLORS['green'], NUCLIO_COLORS['green_dark']]
 
         fig = go.Figure(data=[go.Bar(x=rating_dist['Rating'], y=rating_dist['Cantidad'],
-                                    marker_color=colors, text=rating_dist['Cantidad'], textposition='outside')])
+                                    marker_color=colors, texttemplate='%{y}', textposition='outside')])
         fig.add_vline(x=3.5, line_dash="dash", line_color=NUCLIO_COLORS['black'], annotation_text="Umbral Satisfacción")
         fig.update_layout(height=400, margin=dict(l=20, r=20, t=20, b=20),
                          xaxis_title="Rating (estrellas)", yaxis_title="Cantidad de Reviews",
                          plot_bgcolor='white', paper_bgcolor='white')
         fig.update_yaxes(gridcolor='#eee')
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(fig)
 
     with col2:
         st.markdown("#### Tiempo de Entrega por Estado")
-        state_delivery = df.groupby('estado').agg({'dias_entrega': 'mean', 'order_id': 'count'}).reset_index()
-        state_delivery.columns = ['Estado', 'Días Promedio', 'Órdenes']
-        state_delivery = state_delivery.nlargest(10, 'Órdenes')
+        state_delivery = tables['state_delivery']
 
         fig = go.Figure()
         fig.add_trace(go.Bar(
             x=state_delivery['Estado'], y=state_delivery['Días Promedio'],
             marker_color=[NUCLIO_COLORS['green'] if d <= 7 else NUCLIO_COLORS['orange'] if d <= 14 else NUCLIO_COLORS['red']
                          for d in state_delivery['Días Promedio']],
-            text=[f"{d:.1f}d" for d in state_delivery['Días Promedio']], textposition='outside'
+            texttemplate='%{y:.1f}d', textposition='outside'
         ))
         fig.add_hline(y=7, line_dash="dash", line_color=NUCLIO_COLORS['green'], annotation_text="Objetivo: 7 días")
         fig.update_layout(height=400, margin=dict(l=20, r=20, t=20, b=20),
                          xaxis_title="", yaxis_title="Días Promedio",
                          plot_bgcolor='white', paper_bgcolor='white')
         fig.update_yaxes(gridcolor='#eee')
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(fig)
+
+    if 'delivery_quantiles' in tables:
+        render_delivery_sla(tables)
 
     st.markdown("#### Análisis: Impacto del Tiempo de Entrega en el Rating")
     col1, col2 = st.columns([2, 1])
 
     with col1:
-        df_temp = df.copy()
-        df_temp['delivery_bin'] = pd.cut(df_temp['dias_entrega'], bins=[0, 7, 14, 21, 100],
-                                        labels=['1-7 días (Rápido)', '8-14 días (Normal)',
-                                               '15-21 días (Lento)', '>21 días (Muy lento)'])
-        delivery_analysis = df_temp.groupby('delivery_bin', observed=False).agg({'rating': ['mean', 'count'], 'order_id': 'nunique'}).reset_index()
-        delivery_analysis.columns = ['Rango', 'Rating Promedio', 'Total Reviews', 'Órdenes']
-        delivery_analysis = delivery_analysis.dropna()
+        delivery_analysis = tables['delivery_analysis']
 
         # Colores basados en el rango
         color_map = {
@@ -1547,14 +1833,14 @@ def render_coo_dashboard(df, kpis):
         fig.add_trace(go.Bar(
             x=delivery_analysis['Rango'].astype(str), y=delivery_analysis['Rating Promedio'],
             marker_color=colors,
-            text=[f"{r:.2f}" for r in delivery_analysis['Rating Promedio']], textposition='outside'
+            texttemplate='%{y:.2f}', textposition='outside'
         ))
         fig.add_hline(y=4.0, line_dash="dash", line_color=NUCLIO_COLORS['black'], annotation_text="Objetivo Rating: 4.0")
         fig.update_layout(height=350, margin=dict(l=20, r=20, t=20, b=20),
                          xaxis_title="Tiempo de Entrega", yaxis_title="Rating Promedio",
                          plot_bgcolor='white', paper_bgcolor='white', yaxis=dict(range=[0, 5]))
         fig.update_yaxes(gridcolor='#eee')
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(fig)
 
     with col2:
         st.markdown("""
@@ -1566,6 +1852,41 @@ def render_coo_dashboard(df, kpis):
         """, unsafe_allow_html=True)
 
 
+def render_delivery_sla(tables):
+    """Percentiles de entrega (SLA) del dashboard COO, calculados con los sketches de entrega"""
+    import plotly.graph_objects as go
+
+    st.markdown("#### SLA de Entrega: Percentiles")
+
+    entrega = tables['delivery_quantiles'].set_index('Medida').loc['Días de entrega']
+    col1, col2, col3 = st.columns(3)
+    for col, name, note in ((col1, 'P50', "Mediana"), (col2, 'P90', "9 de cada 10"), (col3, 'P99', "Cola")):
+        with col:
+            value = "-" if pd.isna(entrega[name]) else f"{entrega[name]:.1f}"
+            render_kpi_card_enhanced(f"Entrega {name} ({note})", value, suffix=" días", color='green')
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.markdown("##### Percentiles de Entrega por Estado")
+        state_sla = tables['state_sla']
+        fig = go.Figure()
+        for name, color in (('P50', NUCLIO_COLORS['green']), ('P90', NUCLIO_COLORS['orange']),
+                            ('P99', NUCLIO_COLORS['red'])):
+            fig.add_trace(go.Bar(x=state_sla['Estado'], y=state_sla[f'Entrega {name}'], name=name, marker_color=color))
+        fig.add_hline(y=7, line_dash="dash", line_color=NUCLIO_COLORS['green'], annotation_text="Objetivo: 7 días")
+        fig.update_layout(height=400, margin=dict(l=20, r=20, t=20, b=20), barmode='group',
+                         xaxis_title="", yaxis_title="Días de Entrega",
+                         plot_bgcolor='white', paper_bgcolor='white',
+                         legend=dict(orientation='h', yanchor='bottom', y=1.02))
+        fig.update_yaxes(gridcolor='#eee')
+        plotly_chart(fig)
+
+    with col2:
+        st.markdown("##### Percentiles por Categoría (días)")
+        st.dataframe(tables['category_sla'].round(1), hide_index=True, use_container_width=True, height=400)
+
+
 def render_about_section():
     """Sección de información educativa mejorada"""
     st.markdown("## Guía Educativa del Dashboard")
@@ -1716,14 +2037,51 @@ def render_about_section():
     """, unsafe_allow_html=True)
 
 
+# =============================================================================
+# NAVEGACIÓN
+# =============================================================================
+# Vistas del dashboard. Solo la vista activa calcula sus datos y figuras
+VIEW_LABELS = {
+    'arbol': "Árbol de KPIs",
+    'ceo': "CEO Dashboard",
+    'cmo': "CMO Dashboard",
+    'coo': "COO Dashboard",
+    'guia': "Guía Educativa"
+}
+
+
+def render_view_selector():
+    """Selector de vista con estado (sesión + ?vista= en la URL); devuelve la vista activa"""
+    views, labels = list(VIEW_LABELS), list(VIEW_LABELS.values())
+    if 'vista' not in st.session_state:
+        st.session_state['vista'] = VIEW_LABELS.get(st.query_params.get('vista'), labels[0])
+
+    label = st.radio("Vista", labels, key='vista', horizontal=True, label_visibility="collapsed")
+    view = views[labels.index(label)]
+    st.query_params['vista'] = view
+    return view
+
+
 # =============================================================================
 # APLICACIÓN PRINCIPAL
 # =============================================================================
-def main():
+def render_app():
     render_header()
-
-    df = load_data()
-    kpis = calculate_kpis(df)
+    view = render_view_selector()
+    views = (view,) if view in VIEWS else ()
+    # El árbol y la guía no muestran KPIs: solo necesitan el resumen del sidebar
+    with_kpis = bool(views)
+
+    with metrics.stage('load', cacheable=True) as stage:
+        if DATA_SOURCE == 'postgres':
+            dataset = None
+            # Una sola lectura por rerun: todo el rerun usa la misma versión de los datos
+            postgres_version = get_postgres_refresher().current
+            filter_options = load_postgres_filter_options(postgres_version)
+        else:
+            dataset = load_dataset()
+            filter_options = dataset.filter_options
+            stage.rows = dataset.n_rows
 
     with st.sidebar:
         st.markdown(f"""
@@ -1745,24 +2103,44 @@ def main():
         st.markdown("---")
         st.markdown(f"<p style='color: {NUCLIO_COLORS['yellow']}; font-weight: 600; margin-bottom: 0.5rem;'>FILTROS</p>", unsafe_allow_html=True)
 
-        years = sorted(df['ano'].dropna().unique())
-        selected_year = st.selectbox("Año", ["Todos"] + [int(y) for y in years])
-
-        states = sorted(df['estado'].dropna().unique())
-        selected_state = st.selectbox("Estado", ["Todos"] + list(states))
+        selected_year = st.selectbox("Año", ["Todos"] + [int(y) for y in filter_options['ano']])
+        date_range = None
+        if filter_options.get('fecha') and getattr(dataset, 'supports_date_range', True):
+            first_date, last_date = filter_options['fecha']
+            if selected_year != "Todos":
+                first_date = max(first_date, date(selected_year, 1, 1))
+                last_date = min(last_date, date(selected_year, 12, 31))
+            if first_date < last_date:
+                selected_dates = st.slider("Fechas", min_value=first_date, max_value=last_date,
+                                           value=(first_date, last_date), format="DD/MM/YYYY",
+                                           key=f"fecha_{selected_year}")
+                # El rango completo equivale a no filtrar (misma entrada de caché)
+                if selected_dates != (first_date, last_date):
+                    date_range = selected_dates
+        selected_states = st.multiselect("Estados", list(filter_options['estado']), placeholder="Todos")
+        selected_categories = st.multiselect("Categorías", list(filter_options['categoria']), placeholder="Todas")
+        selected_payments = st.multiselect("Métodos de pago", list(filter_options['metodo_pago']), placeholder="Todos")
+
+        # Sin selección = todos; los valores se ordenan para que la firma de caché no dependa del orden de clic
+        filters = {
+            'ano': None if selected_year == "Todos" else selected_year,
+            'fecha': date_range,
+            'estado': tuple(sorted(selected_states)) or None,
+            'categoria': tuple(sorted(selected_categories)) or None,
+            'metodo_pago': tuple(sorted(selected_payments)) or None
+        }
 
-        categories = sorted(df['categoria'].dropna().unique())
-        selected_category = st.selectbox("Categoría", ["Todas"] + list(categories))
+        comparison = st.selectbox("Comparar KPIs con", list(COMPARISONS),
+                                  index=list(COMPARISONS).index(DEFAULT_COMPARISON))
 
-        df_filtered = df.copy()
-        if selected_year != "Todos":
-            df_filtered = df_filtered[df_filtered['ano'] == selected_year]
-        if selected_state != "Todos":
-            df_filtered = df_filtered[df_filtered['estado'] == selected_state]
-        if selected_category != "Todas":
-            df_filtered = df_filtered[df_filtered['categoria'] == selected_category]
+        with metrics.stage('aggregates', cacheable=True) as stage:
+            if DATA_SOURCE == 'postgres':
+                aggregates = load_postgres_aggregates(filters, views, with_kpis, comparison, postgres_version)
+            else:
+                aggregates = load_aggregates(dataset, filters, views, with_kpis, comparison)
+            stage.rows = aggregates.summary['n_rows']
 
-        kpis_filtered = calculate_kpis(df_filtered)
+        summary = aggregates.summary
 
         st.markdown("---")
         st.markdown(f"<p style='color: {NUCLIO_COLORS['yellow']}; font-weight: 600;'>DATASET INFO</p>", unsafe_allow_html=True)
@@ -1771,45 +2149,34 @@ def main():
         <div style="background: rgba(255,255,255,0.1); border-radius: 8px; padding: 1rem; margin-top: 0.5rem;">
             <div style="margin-bottom: 0.75rem;">
                 <span style="color: #BBBBBB; font-size: 0.75rem; letter-spacing: 1px;">REGISTROS</span><br>
-                <span style="color: {NUCLIO_COLORS['yellow']}; font-size: 1.5rem; font-weight: 700;">{len(df_filtered):,}</span>
+                <span style="color: {NUCLIO_COLORS['yellow']}; font-size: 1.5rem; font-weight: 700;">{summary['n_rows']:,}</span>
             </div>
             <div>
                 <span style="color: #BBBBBB; font-size: 0.75rem; letter-spacing: 1px;">PERÍODO</span><br>
-                <span style="color: {NUCLIO_COLORS['white']}; font-size: 0.9rem; font-weight: 500;">{df_filtered['mes_nombre'].min()}<br>a {df_filtered['mes_nombre'].max()}</span>
+                <span style="color: {NUCLIO_COLORS['white']}; font-size: 0.9rem; font-weight: 500;">{summary['period_start']}<br>a {summary['period_end']}</span>
             </div>
         </div>
         """, unsafe_allow_html=True)
 
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
-        "Árbol de KPIs",
-        "CEO Dashboard",
-        "CMO Dashboard",
-        "COO Dashboard",
-        "Guía Educativa"
-    ])
-
-    with tab1:
-        render_kpi_tree()
-        st.markdown("""
-        <div class="info-box">
-            <strong>Cómo usar el árbol:</strong><br>
-            El árbol de KPIs muestra la conexión entre la estrategia y las métricas operacionales.
-            Cada dashboard de stakeholder (CEO, CMO, COO) muestra los KPIs relevantes para su rol,
-            junto con la ficha técnica completa de cada indicador y el Dashboard Persona.
-        </div>
-        """, unsafe_allow_html=True)
-
-    with tab2:
-        render_ceo_dashboard(df_filtered, kpis_filtered)
-
-    with tab3:
-        render_cmo_dashboard(df_filtered, kpis_filtered)
-
-    with tab4:
-        render_coo_dashboard(df_filtered, kpis_filtered)
-
-    with tab5:
-        render_about_section()
+    with metrics.stage(f'render_{view}'):
+        if view == 'arbol':
+            render_kpi_tree()
+            st.markdown("""
+            <div class="info-box">
+                <strong>Cómo usar el árbol:</strong><br>
+                El árbol de KPIs muestra la conexión entre la estrategia y las métricas operacionales.
+                Cada dashboard de stakeholder (CEO, CMO, COO) muestra los KPIs relevantes para su rol,
+                junto con la ficha técnica completa de cada indicador y el Dashboard Persona.
+            </div>
+            """, unsafe_allow_html=True)
+        elif view == 'ceo':
+            render_ceo_dashboard(aggregates)
+        elif view == 'cmo':
+            render_cmo_dashboard(aggregates)
+        elif view == 'coo':
+            render_coo_dashboard(aggregates)
+        else:
+            render_about_section()
 
     st.markdown("---")
     st.markdown(f"""
@@ -1821,5 +2188,162 @@ def main():
     """, unsafe_allow_html=True)
 
 
+# =============================================================================
+# DIAGNÓSTICO
+# =============================================================================
+# Panel de rendimiento en el sidebar (también con ?debug=1 en la URL)
+DEBUG_PANEL = os.environ.get('DEBUG_PANEL', '0') == '1'
+# Exportación OpenMetrics: fichero reescrito tras cada rerun y/o endpoint HTTP /metrics
+METRICS_FILE = os.environ.get('METRICS_FILE')
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '0'))
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+
+
+@process_resource
+def start_metrics_server():
+    """Endpoint /metrics compartido por todo el proceso"""
+    return metrics.start_http_server(METRICS_PORT, METRICS_HOST)
+
+
+def publish_metrics():
+    """Actualiza los gauges de la caché de resultados y escribe el fichero OpenMetrics si está configurado"""
+    refresh = current_refresher().stats()
+    metrics.REGISTRY.set_gauge('dashboard_data_generation', refresh['generation'],
+                               'Recargas de datos en segundo plano desde el arranque')
+    if DATA_SOURCE != 'postgres':
+        stats = get_result_cache().stats()
+        metrics.REGISTRY.set_gauge('dashboard_result_cache_entries', stats['entries'], 'Entradas en la caché de resultados')
+        metrics.REGISTRY.set_gauge('dashboard_result_cache_bytes', stats['bytes'], 'Bytes ocupados por la caché de resultados')
+        metrics.REGISTRY.set_gauge('dashboard_result_cache_hit_ratio', stats['hit_ratio'], 'Aciertos / búsquedas de la caché de resultados')
+    if METRICS_FILE:
+        try:
+            metrics.REGISTRY.write_openmetrics(METRICS_FILE)
+        except OSError:
+            pass
+
+
+# API JSON de KPIs y tablas (ver api.py): puerto (0 = desactivada) e interfaz
+API_PORT = int(os.environ.get('API_PORT', '0'))
+API_HOST = os.environ.get('API_HOST', '127.0.0.1')
+
+
+def fetch_postgres_aggregates(pool, summaries, result_cache, version, filters, views, with_kpis, comparison):
+    """Agregados de Postgres para la API, cacheados por versión de los datos y firma de filtros"""
+    import pg_backend
+
+    key = (version, filter_signature(filters), tuple(views), with_kpis, comparison)
+
+    def compute():
+        with pg_backend.connection(pool) as conn:
+            return pg_backend.fetch_aggregates(conn, filters, views, with_kpis, summaries=summaries,
+                                               comparison=comparison)
+
+    return result_cache.get_or_compute(key, compute)
+
+
+def fetch_postgres_filter_options(pool, summaries, result_cache, version):
+    """Valores de los filtros de Postgres para la API, cacheados por versión de los datos"""
+    import pg_backend
+
+    def compute():
+        with pg_backend.connection(pool) as conn:
+            return pg_backend.fetch_filter_options(conn, summaries=summaries)
+
+    return result_cache.get_or_compute((version, 'filtros'), compute)
+
+
+@process_resource
+def start_api_server():
+    """API JSON compartida por todo el proceso: dataset vigente y caché de resultados del dashboard"""
+    import api
+
+    # Como en get_data_refresher, los hilos del servidor reciben los objetos ya resueltos
+    result_cache = get_result_cache()
+    if DATA_SOURCE == 'postgres':
+        refresher, pool, summaries = get_postgres_refresher(), get_postgres_pool(), use_postgres_summaries()
+
+        def snapshot():
+            version = refresher.current
+            return api.ApiSnapshot(version, fetch_postgres_filter_options(pool, summaries, result_cache, version),
+                                   partial(fetch_postgres_aggregates, pool, summaries, result_cache, version))
+    else:
+        refresher, pool = get_data_refresher(), get_aggregation_pool()
+
+        def snapshot():
+            dataset = refresher.current
+            return api.ApiSnapshot(dataset.version, dataset.filter_options,
+                                   partial(load_aggregates, dataset, result_cache=result_cache, pool=pool))
+
+    return api.start_http_server(api.DashboardApi(snapshot), API_PORT, API_HOST)
+
+
+def render_debug_panel(profile):
+    """Tiempo, filas, caché y bytes de cada etapa del rerun en el sidebar"""
+    cache_labels = {True: 'hit', False: 'miss', None: ''}
+    stages = pd.DataFrame([{
+        'Etapa': '· ' * record.depth + record.name,
+        'ms': round(record.seconds * 1000, 1),
+        'Filas': record.rows,
+        'Caché': cache_labels[record.cache_hit],
+        'KB reservados': None if record.allocated_bytes is None else round(record.allocated_bytes / 1024, 1),
+        'KB payload': None if record.payload_bytes is None else round(record.payload_bytes / 1024, 1)
+    } for record in profile.stages])
+
+    with st.sidebar.expander("Diagnóstico del rerun", expanded=True):
+        st.caption(f"Rerun completo: {profile.seconds * 1000:.0f} ms")
+        st.dataframe(stages, hide_index=True, use_container_width=True)
+        refresh = current_refresher().stats()
+        st.caption(f"Datos: generación {refresh['generation']}, cargados a las "
+                   f"{time.strftime('%H:%M:%S', time.localtime(refresh['loaded_at']))}"
+                   + (f" (última recarga fallida: {refresh['last_error']})" if refresh['last_error'] else ""))
+        if DATA_SOURCE != 'postgres':
+            stats = get_result_cache().stats()
+            st.caption(f"Caché de resultados: {stats['entries']} entradas, {stats['bytes'] / 1024:.0f} KB, "
+                       f"{stats['hits']} hits / {stats['misses']} misses")
+        st.caption(metrics.format_startup(metrics.REGISTRY.startup()))
+
+
+@st.cache_resource
+def log_startup_report():
+    """Escribe una vez por proceso el desglose del arranque en frío (tras el primer rerun)"""
+    logger.info(metrics.format_startup(metrics.REGISTRY.startup()))
+
+
+def start_servers():
+    """Arranca una vez por proceso el endpoint /metrics y la API JSON configurados"""
+    if METRICS_PORT:
+        start_metrics_server()
+    if API_PORT:
+        start_api_server()
+
+
+def serve():
+    """Arranque en el servidor (python main.py): /metrics y la API antes de la primera sesión, luego Streamlit
+
+    Streamlit ejecuta el script en el mismo proceso, así que las sesiones reciben los mismos servidores,
+    dataset y cachés que se crearon aquí (ver resources.py).
+    """
+    start_servers()
+    from streamlit.web import cli
+
+    sys.argv = ['streamlit', 'run', __file__, *sys.argv[1:]]
+    sys.exit(cli.main())
+
+
+def main():
+    # Con streamlit run sin el arranque de serve(), la primera sesión los arranca
+    start_servers()
+    debug = DEBUG_PANEL or st.query_params.get('debug') == '1'
+    with metrics.rerun(trace_allocations=debug) as profile:
+        render_app()
+    log_startup_report()
+    publish_metrics()
+    if debug:
+        render_debug_panel(profile)
+
+
 if __name__ == "__main__":
-    main()
+    if st.runtime.exists():
+        main()
+    else:
+        serve()
@@ -0,0 +1,320 @@
+"""
+Instrumentación de cada rerun del dashboard
+
+Cada rerun se envuelve en rerun() y sus etapas (carga, filtros, agregados,
+render de cada vista, serialización de cada gráfico Plotly) en stage(). Por
+etapa se registra el tiempo, las filas procesadas, si la respondió una caché
+y, en modo diagnóstico, los bytes reservados (tracemalloc) y el tamaño del
+payload enviado al navegador.
+
+Las etapas se acumulan en un registro del proceso que se exporta en formato
+OpenMetrics (Prometheus) a un fichero o a un endpoint HTTP local.
+
+El registro guarda además el desglose del arranque en frío: fases medidas
+una sola vez por proceso (record_startup) y las etapas del primer rerun,
+que es el que carga los datos.
+"""
+
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+# Límites (segundos) del histograma de duración por etapa
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_local = threading.local()
+
+
+@dataclass
+class StageRecord:
+    """Medidas de una etapa de un rerun (None = no aplica o no medido)"""
+    name: str
+    depth: int = 0
+    seconds: float = 0.0
+    rows: int = None
+    cache_hit: bool = None
+    allocated_bytes: int = None
+    payload_bytes: int = None
+    _peak: int = field(default=0, repr=False)
+
+
+class RerunProfile:
+    """Etapas de un rerun, en orden de inicio"""
+
+    def __init__(self, trace_allocations=False):
+        self.trace_allocations = trace_allocations
+        self.stages = []
+        self.seconds = 0.0
+        self._stack = []
+
+
+class _TracingRefCount:
+    """tracemalloc es global al proceso: se activa mientras haya algún rerun en modo diagnóstico"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._count = 0
+
+    def acquire(self):
+        with self._lock:
+            if self._count == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self._count += 1
+
+    def release(self):
+        with self._lock:
+            self._count -= 1
+            if self._count == 0 and tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+
+_tracing = _TracingRefCount()
+
+
+def current_profile():
+    """Perfil del rerun en curso en este hilo (None fuera de rerun())"""
+    return getattr(_local, 'profile', None)
+
+
+@contextmanager
+def rerun(trace_allocations=False):
+    """Perfila un rerun completo y lo acumula en REGISTRY al terminar"""
+    profile = RerunProfile(trace_allocations)
+    previous = current_profile()
+    _local.profile = profile
+    if trace_allocations:
+        _tracing.acquire()
+    started = time.perf_counter()
+    try:
+        yield profile
+    finally:
+        profile.seconds = time.perf_counter() - started
+        if trace_allocations:
+            _tracing.release()
+        _local.profile = previous
+        REGISTRY.observe(profile)
+
+
+@contextmanager
+def stage(name, rows=None, cacheable=False):
+    """Mide una etapa del rerun en curso; sin rerun activo solo devuelve un registro suelto"""
+    profile = current_profile()
+    record = StageRecord(name, rows=rows, cache_hit=True if cacheable else None)
+    if profile is None:
+        yield record
+        return
+
+    record.depth = len(profile._stack)
+    profile.stages.append(record)
+    profile._stack.append(record)
+    tracing = profile.trace_allocations and tracemalloc.is_tracing()
+    if tracing:
+        start_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.seconds = time.perf_counter() - started
+        profile._stack.pop()
+        if tracing:
+            # Una etapa anidada reinicia el pico: el de la etapa es el mayor de los dos
+            peak = max(tracemalloc.get_traced_memory()[1], record._peak)
+            record.allocated_bytes = max(peak - start_bytes, 0)
+            if profile._stack:
+                parent = profile._stack[-1]
+                parent._peak = max(parent._peak, peak)
+
+
+def mark_cache_miss():
+    """Marca como fallo de caché la etapa cacheable más interna en curso (llamar dentro del cálculo)"""
+    profile = current_profile()
+    if profile is None:
+        return
+    for record in reversed(profile._stack):
+        if record.cache_hit is not None:
+            record.cache_hit = False
+            return
+
+
+def process_uptime():
+    """Segundos desde que arrancó el proceso (None si no hay /proc)"""
+    try:
+        # starttime es el campo 22 de /proc/self/stat; el nombre del proceso (campo 2) puede tener espacios
+        start_ticks = int(Path('/proc/self/stat').read_text().rsplit(')', 1)[1].split()[19])
+        uptime = float(Path('/proc/uptime').read_text().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+
+
+def format_startup(startup):
+    """Desglose del arranque en frío en una línea"""
+    phases = ', '.join(f'{phase} {seconds:.2f} s' for phase, seconds in startup.items())
+    return f"Arranque en frío: {phases or 'sin medir'}"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry:
+    """Acumulado de todas las etapas del proceso, exportable en formato OpenMetrics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reruns = 0
+        self.rerun_seconds = 0.0
+        self._stages = {}
+        self._gauges = {}
+        self._startup = {}
+
+    def record_startup(self, phase, seconds):
+        """Duración de una fase del arranque en frío; solo cuenta la primera medida de cada fase"""
+        if seconds is None:
+            return
+        with self._lock:
+            self._startup.setdefault(phase, seconds)
+
+    def startup(self):
+        """Fases del arranque en frío en el orden en que se midieron"""
+        with self._lock:
+            return dict(self._startup)
+
+    def observe(self, profile):
+        with self._lock:
+            if self.reruns == 0:
+                # Primer rerun del proceso: sus etapas hasta el segundo nivel (p.ej. lectura y derivados bajo load)
+                first = {}
+                for record in profile.stages:
+                    if record.depth <= 1:
+                        key = f'primer_rerun/{record.name}'
+                        first[key] = first.get(key, 0.0) + record.seconds
+                self._startup.setdefault('primer_rerun', profile.seconds)
+                for key, seconds in first.items():
+                    self._startup.setdefault(key, seconds)
+            self.reruns += 1
+            self.rerun_seconds += profile.seconds
+            for record in profile.stages:
+                s = self._stages.setdefault(record.name, {
+                    'count': 0, 'seconds': 0.0, 'buckets': [0] * len(SECONDS_BUCKETS),
+                    'rows': 0, 'cache_hits': 0, 'cache_misses': 0,
+                    'allocated_bytes': None, 'payload_bytes': None
+                })
+                s['count'] += 1
+                s['seconds'] += record.seconds
+                for i, bound in enumerate(SECONDS_BUCKETS):
+                    if record.seconds <= bound:
+                        s['buckets'][i] += 1
+                s['rows'] += record.rows or 0
+                if record.cache_hit is True:
+                    s['cache_hits'] += 1
+                elif record.cache_hit is False:
+                    s['cache_misses'] += 1
+                if record.allocated_bytes is not None:
+                    s['allocated_bytes'] = record.allocated_bytes
+                if record.payload_bytes is not None:
+                    s['payload_bytes'] = record.payload_bytes
+
+    def set_gauge(self, name, value, help_text):
+        """Valor instantáneo adicional (p.ej. ocupación de la caché de resultados)"""
+        with self._lock:
+            self._gauges[name] = (value, help_text)
+
+    def to_openmetrics(self):
+        """Exposición en formato de texto OpenMetrics"""
+        with self._lock:
+            stages = {name: dict(s, buckets=list(s['buckets'])) for name, s in self._stages.items()}
+            gauges = dict(self._gauges)
+            startup = dict(self._startup)
+            reruns, rerun_seconds = self.reruns, self.rerun_seconds
+
+        lines = [
+            '# TYPE dashboard_reruns counter',
+            '# HELP dashboard_reruns Reruns completados',
+            f'dashboard_reruns_total {reruns}',
+            '# TYPE dashboard_rerun_seconds counter',
+            '# UNIT dashboard_rerun_seconds seconds',
+            '# HELP dashboard_rerun_seconds Tiempo total de reruns',
+            f'dashboard_rerun_seconds_total {rerun_seconds:.6f}',
+            '# TYPE dashboard_stage_seconds histogram',
+            '# UNIT dashboard_stage_seconds seconds',
+            '# HELP dashboard_stage_seconds Duración de cada etapa del rerun',
+        ]
+        for name, s in sorted(stages.items()):
+            label = f'stage="{_escape(name)}"'
+            for bound, count in zip(SECONDS_BUCKETS, s['buckets']):
+                lines.append(f'dashboard_stage_seconds_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'dashboard_stage_seconds_bucket{{{label},le="+Inf"}} {s["count"]}')
+            lines.append(f'dashboard_stage_seconds_count{{{label}}} {s["count"]}')
+            lines.append(f'dashboard_stage_seconds_sum{{{label}}} {s["seconds"]:.6f}')
+
+        for metric, key, kind, help_text in [
+            ('dashboard_stage_rows', 'rows', 'counter', 'Filas procesadas por etapa'),
+            ('dashboard_stage_cache_hits', 'cache_hits', 'counter', 'Etapas respondidas por una caché'),
+            ('dashboard_stage_cache_misses', 'cache_misses', 'counter', 'Etapas que tuvieron que calcularse'),
+            ('dashboard_stage_allocated_bytes', 'allocated_bytes', 'gauge', 'Bytes reservados en la última ejecución trazada'),
+            ('dashboard_stage_payload_bytes', 'payload_bytes', 'gauge', 'Tamaño del último payload enviado al navegador'),
+        ]:
+            lines.append(f'# TYPE {metric} {kind}')
+            if metric.endswith('_bytes'):
+                lines.append(f'# UNIT {metric} bytes')
+            lines.append(f'# HELP {metric} {help_text}')
+            suffix = '_total' if kind == 'counter' else ''
+            for name, s in sorted(stages.items()):
+                # Solo las etapas a las que aplica la medida (no todas tienen filas o caché)
+                if s[key]:
+                    lines.append(f'{metric}{suffix}{{stage="{_escape(name)}"}} {s[key]}')
+
+        if startup:
+            lines += ['# TYPE dashboard_startup_seconds gauge',
+                      '# UNIT dashboard_startup_seconds seconds',
+                      '# HELP dashboard_startup_seconds Duración de cada fase del arranque en frío']
+            lines += [f'dashboard_startup_seconds{{phase="{_escape(phase)}"}} {seconds:.6f}'
+                      for phase, seconds in startup.items()]
+
+        for name, (value, help_text) in sorted(gauges.items()):
+            lines += [f'# TYPE {name} gauge', f'# HELP {name} {help_text}', f'{name} {value}']
+
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def write_openmetrics(self, path):
+        """Escribe la exposición en un fichero (atómico, para que un scraper nunca lea uno a medias)"""
+        path = Path(path)
+        tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+        tmp_path.write_text(self.to_openmetrics())
+        os.replace(tmp_path, path)
+
+
+REGISTRY = MetricsRegistry()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = REGISTRY.to_openmetrics().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', OPENMETRICS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host='127.0.0.1'):
+    """Sirve GET /metrics en un hilo daemon"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
@@ -0,0 +1,55 @@
+"""
+Precálculo del snapshot y de las estructuras derivadas del dataset
+
+Se ejecuta al construir la imagen Docker (ver Dockerfile) para que el primer
+arranque del contenedor lea el snapshot Parquet y los cubos, histogramas e
+índices ya calculados en lugar de parsear el CSV y recalcularlos (ver
+snapshot.py y dataset.py). Es idempotente: si ya están al día solo los
+valida.
+
+    python precompute.py                     # data/olist_dashboard_dataset.csv
+    python precompute.py ruta/al/dataset.csv
+
+Sin CSV no hay nada que precalcular: el dataset sintético se genera al
+arrancar.
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+from dataset import build_dataset, derived_path
+from schema import read_dataset_csv
+from snapshot import is_snapshot_valid, load_with_snapshot, snapshot_paths
+
+DEFAULT_CSV_PATH = Path(__file__).parent / 'data' / 'olist_dashboard_dataset.csv'
+
+
+def precompute(csv_path):
+    """Genera (o valida) el snapshot y las estructuras derivadas del CSV, como la carga del dashboard"""
+    started = time.perf_counter()
+    df = load_with_snapshot(csv_path, read_dataset_csv)
+    if not is_snapshot_valid(csv_path):
+        raise OSError(f"No se pudo escribir el snapshot de {csv_path}")
+    snapshot_path = snapshot_paths(csv_path)[0]
+    loaded = time.perf_counter()
+    dataset = build_dataset(df, csv_path.name, snapshot_path=snapshot_path)
+    if not derived_path(snapshot_path).exists():
+        raise OSError(f"No se pudieron guardar las estructuras derivadas de {snapshot_path}")
+    print(f"{dataset.n_rows:,} filas: snapshot {loaded - started:.2f} s, "
+          f"derivados {time.perf_counter() - loaded:.2f} s -> {snapshot_path.parent}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precalcula el snapshot y las estructuras derivadas del dataset")
+    parser.add_argument('csv_path', nargs='?', type=Path, default=DEFAULT_CSV_PATH, help="CSV del dataset")
+    args = parser.parse_args()
+
+    if not args.csv_path.exists():
+        print(f"{args.csv_path} no existe: el dashboard usará el dataset sintético")
+        return
+    precompute(args.csv_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Recarga de datos en segundo plano con cambio atómico
+
+El dataset se carga una vez por proceso y, sin esto, solo se renovaba
+vaciando la caché: el primer rerun después pagaba la recarga completa en
+frío. DataRefresher guarda la versión vigente y un hilo comprueba cada
+interval segundos la huella del origen (probe: tamaño y mtime del CSV, o
+filas y última fecha de ventas en Postgres). Si cambia, construye la nueva
+versión fuera de los reruns (load), precalcula lo que se quiera tener listo
+(warm) y solo entonces la sustituye con una única asignación: cada rerun lee
+current una vez y trabaja con esa versión hasta el final, así que nunca ve
+mezcla de datos viejos y nuevos, y mientras se construye la nueva sigue
+respondiendo con la anterior.
+
+generation cuenta los cambios. Las cachés que dependen de los datos incluyen
+la versión en la clave (ver main.py), de modo que el cambio las invalida sin
+borrarlas a mano; on_swap limpia lo que ya no se va a usar. Si la carga
+falla se registra el error, se conserva la versión anterior y se reintenta en
+la siguiente comprobación. Durante la carga conviven las dos versiones en
+memoria.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL_SECONDS = 60
+
+
+class DataRefresher:
+    """Versión vigente de los datos y recarga en segundo plano cuando cambia la huella del origen"""
+
+    def __init__(self, load, probe, interval=DEFAULT_INTERVAL_SECONDS, warm=None, on_swap=None):
+        self._load = load
+        self._probe = probe
+        self._warm = warm
+        self._on_swap = on_swap
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.generation = 0
+        self.last_error = None
+
+        # Carga inicial (bloqueante): la huella se toma antes de leer, como en snapshot.py
+        self._token = probe()
+        self._current = load(self._token)
+        self.loaded_at = time.time()
+
+    @property
+    def current(self):
+        """Versión vigente (leerla una vez por rerun)"""
+        return self._current
+
+    def check(self):
+        """Recarga si la huella del origen cambió; devuelve True si se sustituyó la versión"""
+        with self._lock:
+            try:
+                token = self._probe()
+                if token == self._token:
+                    return False
+                started = time.perf_counter()
+                fresh = self._load(token)
+                if self._warm is not None:
+                    self._warm(fresh)
+            except Exception as e:
+                self.last_error = repr(e)
+                logger.exception("Error recargando los datos; se mantiene la versión anterior")
+                return False
+
+            previous, self._current, self._token = self._current, fresh, token
+            self.generation += 1
+            self.loaded_at = time.time()
+            self.last_error = None
+            logger.info("Datos recargados (generación %d) en %.1f s", self.generation, time.perf_counter() - started)
+
+        if self._on_swap is not None:
+            try:
+                self._on_swap(previous, fresh)
+            except Exception:
+                logger.exception("Error liberando la versión anterior de los datos")
+        return True
+
+    def start(self):
+        """Arranca el hilo de comprobación (no hace nada con interval <= 0 o si ya está en marcha)"""
+        if self.interval <= 0 or self._thread is not None:
+            return self
+        self._thread = threading.Thread(target=self._run, name='data-refresh', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def stats(self):
+        """Estado para diagnóstico"""
+        return {
+            'generation': self.generation,
+            'loaded_at': self.loaded_at,
+            'last_error': self.last_error
+        }
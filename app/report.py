@@ -0,0 +1,364 @@
+"""
+Informes HTML estáticos de los dashboards CEO, CMO y COO
+
+Genera un HTML por combinación de filtros con las vistas pedidas, pintadas
+por las mismas funciones render_* del dashboard: en los procesos del pool,
+HtmlRecorder sustituye a st en main.py e implementa el subconjunto de la API
+de Streamlit que usan (markdown, columns, expander, plotly_chart, ...),
+escribiendo HTML en lugar de mensajes al navegador. Las figuras van como
+JSON de Plotly embebido y plotly.js se enlaza una sola vez por directorio
+(o desde el CDN), así que cada fichero se abre sin servidor.
+
+Los datos se cargan una sola vez, en el proceso principal, con el mismo
+origen y configuración que el dashboard (DATA_SOURCE, INGEST_MODE, ...).
+El proceso principal calcula los agregados de cada combinación (milisegundos
+con el cubo) y los envía al pool, que reparte entre núcleos lo caro: construir
+y serializar las figuras. Solo viajan los DashboardAggregates, nunca filas.
+
+    # Pack semanal: una página por estado con las tres vistas de 2018
+    python app/report.py --output informes/semana --ano 2018 --estado todos
+
+    # Combinaciones sueltas, con la sintaxis de la API JSON (ver api.py)
+    python app/report.py --output informes/sp --consulta "estado=SP&desde=2018-01-01&hasta=2018-03-31"
+"""
+
+import argparse
+import html
+import itertools
+import multiprocessing
+import re
+import textwrap
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from urllib.parse import urlencode
+
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+from plotly.offline.offline import get_plotlyjs_version
+from streamlit import config as streamlit_config
+from streamlit import logger as streamlit_logger
+
+# main.py se importa fuera de `streamlit run`: sin el aviso de ejecución directa ni los de las cachés
+streamlit_config.set_option('global.showWarningOnDirectExecution', False)
+streamlit_logger.set_log_level('error')
+
+import main as dashboard  # noqa: E402
+import pg_backend
+from aggregations import COMPARISONS, DEFAULT_COMPARISON, VIEWS
+from api import ApiError, ApiSnapshot, parse_query
+from filters import DATE_FILTER, FILTER_COLUMNS
+from parallel import default_workers
+from result_cache import ResultCache
+
+# Valor de un filtro que se expande a cada uno de sus valores (una página por valor)
+EACH_VALUE = 'todos'
+
+PLOTLY_JS_FILENAME = 'plotly.min.js'
+
+_HEADING = re.compile(r'^(#{1,6})\s+(.*)$')
+
+REPORT_CSS = """
+<style>
+    body { margin: 0; background: #FAFAFA; }
+    .report { max-width: 1400px; margin: 0 auto; padding: 1.5rem; }
+    .report-row { display: flex; gap: 1.5rem; align-items: flex-start; }
+    .report-col { min-width: 0; }
+    .report-chart { width: 100%; min-height: 200px; }
+    .report-filters { color: #555; margin: 0 0 1.5rem; }
+    .report-table { border-collapse: collapse; width: 100%; font-size: 0.85rem; }
+    .report-table th, .report-table td { padding: 0.35rem 0.6rem; border-bottom: 1px solid #eee; text-align: right; }
+    .report-table th:first-child, .report-table td:first-child { text-align: left; }
+    details { margin: 0.5rem 0 1rem; }
+    summary { cursor: pointer; font-weight: 600; }
+</style>
+"""
+
+
+def _inline(text):
+    return re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', html.escape(text))
+
+
+def markdown_html(body, unsafe_allow_html=False):
+    """HTML de un bloque de st.markdown: encabezados (#), párrafos y negritas; con unsafe_allow_html el HTML pasa tal cual"""
+    text = textwrap.dedent(body).strip()
+    heading = _HEADING.match(text)
+    if heading and '\n' not in text:
+        level = len(heading.group(1))
+        return f'<h{level}>{_inline(heading.group(2))}</h{level}>'
+    if unsafe_allow_html:
+        return text
+    return ''.join(f'<p>{_inline(paragraph)}</p>' for paragraph in re.split(r'\n\s*\n', text) if paragraph.strip())
+
+
+class _Block:
+    """Contenedor de HTML (página, fila de columnas, columna o expander); con with, recibe lo que se pinta dentro"""
+
+    def __init__(self, recorder, opening='', closing=''):
+        self._recorder = recorder
+        self.opening, self.closing = opening, closing
+        self.parts = []
+
+    def __enter__(self):
+        self._recorder._stack.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._recorder._stack.pop()
+
+    def html(self):
+        return self.opening + ''.join(part if isinstance(part, str) else part.html() for part in self.parts) + self.closing
+
+
+class HtmlRecorder:
+    """Subconjunto de la API de Streamlit que usan las funciones render_* de main.py, escrito a HTML"""
+
+    def __init__(self):
+        self._root = _Block(self)
+        self._stack = [self._root]
+        self._charts = 0
+
+    def _append(self, part):
+        self._stack[-1].parts.append(part)
+
+    def markdown(self, body, unsafe_allow_html=False, **kwargs):
+        self._append(markdown_html(body, unsafe_allow_html))
+
+    def caption(self, body, **kwargs):
+        self._append(f'<p class="report-filters">{_inline(body)}</p>')
+
+    def columns(self, spec, **kwargs):
+        widths = [1] * spec if isinstance(spec, int) else list(spec)
+        row = _Block(self, '<div class="report-row">', '</div>')
+        row.parts = [_Block(self, f'<div class="report-col" style="flex: {width} 1 0">', '</div>') for width in widths]
+        self._append(row)
+        return row.parts
+
+    def expander(self, label, expanded=False, **kwargs):
+        block = _Block(self, f'<details{" open" if expanded else ""}><summary>{html.escape(label)}</summary>',
+                       '</details>')
+        self._append(block)
+        return block
+
+    def radio(self, label, options, index=0, **kwargs):
+        """Un informe estático muestra la opción por defecto"""
+        return list(options)[index]
+
+    def plotly_chart(self, fig, **kwargs):
+        self._charts += 1
+        div_id = f'grafico-{self._charts}'
+        # Un "</" dentro del JSON cerraría el <script>
+        spec = pio.to_json(fig, validate=False).replace('</', '<\\/')
+        self._append(f'<div id="{div_id}" class="report-chart"></div>'
+                     f'<script>(function (f) {{ Plotly.newPlot("{div_id}", f.data, f.layout, '
+                     f'{{responsive: true, displaylogo: false}}); }})({spec});</script>')
+
+    def dataframe(self, data, hide_index=False, **kwargs):
+        self._append(data.to_html(index=not hide_index, classes='report-table', border=0, na_rep='-'))
+
+    def html(self):
+        return self._root.html()
+
+
+def render_views(aggregates, views):
+    """HTML de las vistas pedidas pintadas con las funciones render_* del dashboard"""
+    recorder = HtmlRecorder()
+    streamlit, dashboard.st = dashboard.st, recorder
+    try:
+        dashboard.render_header()
+        for view in views:
+            recorder.markdown(f"## {dashboard.VIEW_LABELS[view]}")
+            getattr(dashboard, f'render_{view}_dashboard')(aggregates)
+    finally:
+        dashboard.st = streamlit
+    return recorder.html()
+
+
+def render_page(title, description, body, plotly_script):
+    return f"""<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{html.escape(title)}</title>
+{plotly_script}
+{dashboard.nuclio_css()}
+{REPORT_CSS}
+</head>
+<body>
+<main class="report">
+<p class="report-filters">{html.escape(description)}</p>
+{body}
+</main>
+</body>
+</html>
+"""
+
+
+def write_report(path, title, description, aggregates, views, plotly_script):
+    """Pinta y escribe el informe de una combinación (se ejecuta en los procesos del pool); devuelve los bytes"""
+    page = render_page(title, description, render_views(aggregates, views), plotly_script)
+    data = page.encode('utf-8')
+    Path(path).write_bytes(data)
+    return len(data)
+
+
+def describe_filters(filters, comparison):
+    """Descripción legible de una combinación de filtros"""
+    labels = {'ano': "Año", 'estado': "Estados", 'categoria': "Categorías", 'metodo_pago': "Métodos de pago"}
+    parts = []
+    for col in FILTER_COLUMNS:
+        value = filters.get(col)
+        if value is not None:
+            parts.append(f"{labels[col]}: {', '.join(map(str, value)) if isinstance(value, tuple) else value}")
+    if filters.get(DATE_FILTER):
+        start, end = filters[DATE_FILTER]
+        parts.append(f"Fechas: {start:%d/%m/%Y} - {end:%d/%m/%Y}")
+    parts.append(f"Variación: {comparison.lower()}")
+    return ' · '.join(parts if len(parts) > 1 else ["Sin filtros"] + parts)
+
+
+def report_slug(filters, comparison=DEFAULT_COMPARISON):
+    """Nombre de fichero de una combinación de filtros y comparación (la por defecto no se añade)"""
+    parts = []
+    for col in FILTER_COLUMNS + (DATE_FILTER,):
+        value = filters.get(col)
+        if value is not None:
+            values = value if isinstance(value, tuple) else (value,)
+            parts.append(f"{col}-{'-'.join(str(v) for v in values)}")
+    if comparison != DEFAULT_COMPARISON:
+        parts.append(f"comparacion-{comparison.lower()}")
+    return re.sub(r'[^\w.-]+', '-', '_'.join(parts) or 'todos')
+
+
+def combination_queries(choices, filter_options, dates=None, comparison=DEFAULT_COMPARISON):
+    """Query strings (sintaxis de la API) del producto cartesiano de los valores pedidos de cada filtro
+
+    choices: columna -> lista de valores; EACH_VALUE se expande a cada valor
+    disponible del filtro. Las columnas sin valores no filtran.
+    """
+    axes = []
+    for col in FILTER_COLUMNS:
+        values = choices.get(col)
+        if not values:
+            axes.append([None])
+        elif EACH_VALUE in values:
+            axes.append(list(filter_options[col]))
+        else:
+            axes.append(values)
+
+    for combination in itertools.product(*axes):
+        params = [(col, value) for col, value in zip(FILTER_COLUMNS, combination) if value is not None]
+        params += [(name, value) for name, value in (dates or {}).items() if value]
+        params.append(('comparacion', comparison))
+        yield urlencode(params)
+
+
+def load_snapshot(result_cache):
+    """Carga los datos una sola vez con el origen y la configuración del dashboard"""
+    if dashboard.DATA_SOURCE == 'postgres':
+        pool = pg_backend.create_pool()
+        with pg_backend.connection(pool) as conn:
+            version = pg_backend.fetch_data_version(conn)
+            summaries = dashboard.POSTGRES_SUMMARIES == 'on' or (
+                dashboard.POSTGRES_SUMMARIES == 'auto' and pg_backend.has_summary_tables(conn))
+        return ApiSnapshot(version, dashboard.fetch_postgres_filter_options(pool, summaries, result_cache, version),
+                           partial(dashboard.fetch_postgres_aggregates, pool, summaries, result_cache, version))
+
+    dataset = dashboard.build_shared_dataset(dashboard.data_version())
+    pool = dashboard.create_aggregation_pool()
+    return ApiSnapshot(dataset.version, dataset.filter_options,
+                       partial(dashboard.load_aggregates, dataset, result_cache=result_cache, pool=pool))
+
+
+def plotly_script(output, mode):
+    """<script> de plotly.js: un único fichero en el directorio de salida o el CDN"""
+    if mode == 'cdn':
+        return f'<script src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js" charset="utf-8"></script>'
+    (output / PLOTLY_JS_FILENAME).write_text(get_plotlyjs(), encoding='utf-8')
+    return f'<script src="{PLOTLY_JS_FILENAME}" charset="utf-8"></script>'
+
+
+def write_index(output, reports, version):
+    """Índice con un enlace por informe"""
+    rows = ''.join(f'<tr><td><a href="{html.escape(path.name)}">{html.escape(path.stem)}</a></td>'
+                   f'<td>{html.escape(description)}</td></tr>' for path, description in reports)
+    body = (f'<h2>Informes ({len(reports)})</h2><p class="report-filters">Datos: versión {html.escape(str(version))}, '
+            f'generados el {datetime.now():%d/%m/%Y %H:%M}</p>'
+            f'<table class="report-table"><tr><th>Informe</th><th>Filtros</th></tr>{rows}</table>')
+    (output / 'index.html').write_text(render_page("Informes", "", body, ""), encoding='utf-8')
+
+
+def build_reports(output, queries, views=VIEWS, workers=None, plotly_js='directory', snapshot=None):
+    """Genera un informe por query string en output (más index.html); devuelve [(ruta, descripción)]"""
+    output = Path(output)
+    output.mkdir(parents=True, exist_ok=True)
+    snapshot = snapshot or load_snapshot(ResultCache(max_bytes=dashboard.RESULT_CACHE_MB * 1024 * 1024))
+    script = plotly_script(output, plotly_js)
+
+    reports = []
+    # spawn, como en parallel.py: hacer fork de un proceso con hilos no es seguro
+    with ProcessPoolExecutor(max_workers=workers or default_workers(),
+                             mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = []
+        # Los agregados se calculan aquí, en orden, mientras el pool pinta los anteriores
+        seen = set()
+        for query in queries:
+            filters, comparison = parse_query(query, snapshot.filter_options)
+            path = output / f'{report_slug(filters, comparison)}.html'
+            # Dos consultas con el mismo nombre son el mismo informe: se pinta una vez
+            if path in seen:
+                continue
+            seen.add(path)
+            aggregates = snapshot.aggregates(filters, views, True, comparison)
+            description = describe_filters(filters, comparison)
+            futures.append(executor.submit(write_report, path, f"Informe {path.stem}", description,
+                                           aggregates, views, script))
+            reports.append((path, description))
+        for future in as_completed(futures):
+            future.result()
+
+    write_index(output, reports, snapshot.version)
+    return reports
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera informes HTML estáticos de los dashboards por combinación de filtros")
+    parser.add_argument('--output', required=True, help="Directorio de salida")
+    parser.add_argument('--vistas', nargs='+', choices=VIEWS, default=list(VIEWS), help="Vistas de cada informe")
+    for col in FILTER_COLUMNS:
+        parser.add_argument(f"--{col.replace('_', '-')}", dest=col, nargs='+', metavar='VALOR',
+                            help=f"Valores de {col} ('{EACH_VALUE}' = un informe por cada valor)")
+    parser.add_argument('--desde', help="Inicio del rango de fechas (AAAA-MM-DD)")
+    parser.add_argument('--hasta', help="Fin del rango de fechas (AAAA-MM-DD)")
+    parser.add_argument('--comparacion', choices=list(COMPARISONS), default=DEFAULT_COMPARISON)
+    parser.add_argument('--consulta', action='append', metavar='QUERY',
+                        help="Combinación suelta con la sintaxis de la API (repetible); sustituye al producto de filtros")
+    parser.add_argument('--workers', type=int, default=0, help="Procesos que pintan los informes (0 = todos los núcleos)")
+    parser.add_argument('--plotly-js', choices=['directory', 'cdn'], default='directory',
+                        help="plotly.js copiado una vez en el directorio de salida o enlazado al CDN")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    snapshot = load_snapshot(ResultCache(max_bytes=dashboard.RESULT_CACHE_MB * 1024 * 1024))
+    loaded = time.perf_counter()
+    if args.consulta:
+        queries = args.consulta
+    else:
+        choices = {col: getattr(args, col) for col in FILTER_COLUMNS}
+        queries = combination_queries(choices, snapshot.filter_options, {'desde': args.desde, 'hasta': args.hasta},
+                                      args.comparacion)
+
+    try:
+        reports = build_reports(args.output, queries, tuple(args.vistas), args.workers or None, args.plotly_js,
+                                snapshot)
+    except ApiError as e:
+        parser.error(str(e))
+    elapsed = time.perf_counter() - started
+    print(f"{len(reports)} informes en {args.output} en {elapsed:.1f} s (carga {loaded - started:.1f} s)")
+
+
+if __name__ == '__main__':
+    main()
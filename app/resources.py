@@ -0,0 +1,30 @@
+"""
+Recursos compartidos por todo el proceso
+
+st.cache_resource no guarda nada fuera de una ejecución del script (sin
+ScriptRunContext), así que lo que `python main.py` arranca antes de la primera
+sesión (API, /metrics y el dataset que sirven) no llegaría a las sesiones.
+process_resource guarda el resultado en este módulo, que sigue en sys.modules
+entre reruns: el arranque del servidor y las sesiones reciben el mismo objeto.
+"""
+
+import functools
+import threading
+
+_resources = {}
+# Reentrante: un recurso puede pedir otros al crearse (p.ej. el refresher pide la caché de resultados)
+_lock = threading.RLock()
+
+
+def process_resource(func):
+    """Decorador: el resultado de func() se crea una vez por proceso y se reutiliza desde cualquier hilo"""
+    key = (func.__module__, func.__qualname__)
+
+    @functools.wraps(func)
+    def wrapper():
+        with _lock:
+            if key not in _resources:
+                _resources[key] = func()
+            return _resources[key]
+
+    return wrapper
@@ -0,0 +1,111 @@
+"""
+Caché de resultados agregados por firma de filtros
+
+Guarda los DashboardAggregates (KPIs y tablas de cada vista, nunca filas)
+indexados por la versión del dataset y la firma normalizada de los filtros.
+Tiene un presupuesto en bytes con expulsión LRU y contadores de aciertos y
+fallos. Volver a una combinación de filtros ya vista es una búsqueda en un
+diccionario. Es compartida por todas las sesiones y segura entre hilos.
+"""
+
+import dataclasses
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def filter_signature(filters):
+    """Firma canónica de los filtros: pares (columna, valor) ordenados, sin los filtros inactivos"""
+    return tuple(sorted((col, value) for col, value in filters.items() if value is not None))
+
+
+def estimate_size(value):
+    """Tamaño aproximado en bytes de un resultado agregado"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if dataclasses.is_dataclass(value):
+        return sys.getsizeof(value) + sum(estimate_size(getattr(value, f.name)) for f in dataclasses.fields(value))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """Caché LRU con presupuesto en bytes y contadores de aciertos/fallos"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Devuelve el resultado cacheado (y lo marca como reciente) o None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """Guarda un resultado expulsando los menos recientes hasta caber en el presupuesto"""
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            while self._entries and self.current_bytes + size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+
+    def get_or_compute(self, key, compute):
+        """Resultado cacheado para key; si no existe lo calcula con compute() fuera del lock y lo guarda"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def retain(self, keep):
+        """Elimina las entradas cuya clave no cumple keep(key) (p.ej. las de una versión anterior del dataset)"""
+        with self._lock:
+            for key in [key for key in self._entries if not keep(key)]:
+                self.current_bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """Contadores para diagnóstico"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
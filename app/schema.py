@@ -0,0 +1,118 @@
+"""
+Esquema tipado del dataset de Olist
+
+Define el tipo de cada columna para que el dataset se cargue con categóricas
+(dictionary encoding), fechas reales, enteros pequeños y float32 en lugar de
+columnas object y float64. Reduce la memoria residente y acelera los groupby
+de los dashboards.
+"""
+
+import pandas as pd
+
+# Renombrado de columnas del CSV original
+COLUMN_MAPPING = {'año': 'ano'}
+
+# Columnas de texto con pocos valores distintos -> category
+CATEGORICAL_COLUMNS = [
+    'estado', 'ciudad', 'categoria', 'metodo_pago',
+    'dia_semana', 'estado_orden'
+]
+
+# Identificadores: se codifican como category para que los nunique y los
+# groupby trabajen sobre códigos enteros en lugar de strings
+ID_COLUMNS = ['order_id', 'customer_id']
+
+# mes_nombre ('YYYY-MM') se ordena lexicográficamente = cronológicamente,
+# por eso es una categórica ordenada (permite min/max y orden de gráficos)
+ORDERED_CATEGORICAL_COLUMNS = ['mes_nombre']
+
+DATE_COLUMNS = ['fecha']
+
+# Enteros pequeños. 'Int8' es nullable por si el export trae valores vacíos
+INTEGER_DTYPES = {
+    'ano': 'int16',
+    'mes': 'int8',
+    'order_item_id': 'Int8',
+    'cuotas': 'Int8',
+}
+
+# Medidas con decimales que no se suman en KPIs monetarios -> float32.
+# rating no es entero: las órdenes con varias reviews traen medias (4.5, 3.5...).
+# precio, costo_envio y valor_total_pagado se mantienen en float64 porque
+# se agregan en el GMV y float32 pierde céntimos en sumas grandes
+FLOAT_DTYPES = {
+    'rating': 'float32',
+    'peso_producto_g': 'float32',
+    'dias_entrega': 'float32',
+    'dias_retraso': 'float32',
+    'precio': 'float64',
+    'costo_envio': 'float64',
+    'valor_total_pagado': 'float64',
+}
+
+
+def _csv_read_dtypes():
+    """Tipos que se pasan a read_csv (los enteros se leen como float y se castean después)"""
+    dtypes = {col: 'category' for col in CATEGORICAL_COLUMNS + ID_COLUMNS}
+    dtypes.update({col: 'float32' for col in INTEGER_DTYPES})
+    dtypes.update(FLOAT_DTYPES)
+    # El CSV trae la columna 'año', no 'ano'
+    inverse_mapping = {v: k for k, v in COLUMN_MAPPING.items()}
+    return {inverse_mapping.get(col, col): dtype for col, dtype in dtypes.items()}
+
+
+def apply_schema(df, skip=()):
+    """Convierte un DataFrame a los tipos del esquema (solo las columnas presentes y no incluidas en skip)"""
+    df = df.rename(columns=COLUMN_MAPPING)
+
+    for col in CATEGORICAL_COLUMNS + ID_COLUMNS:
+        if col in df.columns and col not in skip and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+
+    for col in ORDERED_CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            values = df[col].astype(str) if isinstance(df[col].dtype, pd.CategoricalDtype) else df[col]
+            categories = sorted(pd.unique(values.dropna()))
+            df[col] = pd.Categorical(values, categories=categories, ordered=True)
+
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+
+    for col, dtype in INTEGER_DTYPES.items():
+        if col in df.columns:
+            # Pasar por float permite castear '5.0' y NaN a enteros nullable
+            df[col] = df[col].astype('float32').round().astype(dtype)
+
+    for col, dtype in FLOAT_DTYPES.items():
+        if col in df.columns:
+            df[col] = df[col].astype(dtype)
+
+    return df
+
+
+def read_dataset_csv(path):
+    """Lee el CSV de Olist aplicando el esquema tipado"""
+    df = pd.read_csv(path, dtype=_csv_read_dtypes(), parse_dates=DATE_COLUMNS)
+    return apply_schema(df)
+
+
+def read_dataset_csv_chunks(path, chunk_rows, ids_as_text=False):
+    """Lee el CSV de Olist por bloques de chunk_rows filas, cada uno con el esquema tipado
+
+    Con ids_as_text los ids se dejan como texto: categorizar millones de ids
+    distintos por bloque (ordenar sus categorías) es lo más caro del parseo.
+    """
+    dtypes = _csv_read_dtypes()
+    skip = ()
+    if ids_as_text:
+        dtypes.update({col: 'object' for col in ID_COLUMNS})
+        skip = ID_COLUMNS
+    with pd.read_csv(path, dtype=dtypes, parse_dates=DATE_COLUMNS, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            yield apply_schema(chunk, skip=skip)
+
+
+def memory_usage_mb(df):
+    """Memoria ocupada por el DataFrame en MB (incluye strings de columnas object)"""
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
@@ -0,0 +1,123 @@
+"""
+Sketches de cuantiles combinables para los tiempos de entrega
+
+Los percentiles (p50/p90/p99) de dias_entrega y dias_retraso no se pueden
+sumar como las medias del cubo. En lugar de ordenar las filas seleccionadas
+en cada cambio de filtro, al cargar los datos se guarda, para cada celda
+(ano, mes, estado, categoria, metodo_pago), el histograma por día de cada
+medida. Los histogramas son aditivos: los de las celdas que cumplen los
+filtros se suman (en total, por estado o por categoría) y los percentiles se
+leen de los acumulados. El coste depende de los pares (celda, día)
+presentes, no del número de filas, y los sketches de bloques o particiones
+distintas se combinan sumando (ver ingest.py).
+
+Las medidas se guardan en días enteros (redondeando) dentro de un rango
+acotado (SKETCH_MEASURES; los valores de fuera se llevan al extremo), así
+que el sketch es exacto para los datos de Olist, que son diferencias de
+fechas en días, y con valores fraccionarios el error es como mucho de medio
+día. Entre posiciones se interpola linealmente, como np.quantile.
+"""
+
+import numpy as np
+import pandas as pd
+
+SKETCH_DIMENSIONS = ['ano', 'mes', 'estado', 'categoria', 'metodo_pago']
+
+# Medida -> rango de días (incluidos) que cubre el histograma
+SKETCH_MEASURES = {
+    'dias_entrega': (0, 365),
+    'dias_retraso': (-365, 365),
+}
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def build_sketch(df):
+    """Histograma por día de cada medida y celda: filas (dimensiones, medida, dias, n)"""
+    parts = []
+    for measure, (low, high) in SKETCH_MEASURES.items():
+        days = df[measure].to_numpy(dtype='float64', na_value=np.nan)
+        valid = ~np.isnan(days)
+        part = df.loc[valid, SKETCH_DIMENSIONS].assign(dias=np.clip(np.rint(days[valid]), low, high).astype(np.int16))
+        part = part.groupby(SKETCH_DIMENSIONS + ['dias'], observed=True, dropna=False, sort=True).size()
+        part = part.reset_index(name='n')
+        part.insert(len(SKETCH_DIMENSIONS), 'medida', measure)
+        parts.append(part)
+    sketch = pd.concat(parts, ignore_index=True)
+    sketch['medida'] = pd.Categorical(sketch['medida'], categories=list(SKETCH_MEASURES))
+    return sketch
+
+
+def histogram_quantiles(hist, low, quantiles=QUANTILES):
+    """Percentiles de cada fila de una matriz de histogramas (columna i = día low + i); NaN si está vacía"""
+    cumulative = np.cumsum(hist, axis=1)
+    total = cumulative[:, -1] if hist.shape[1] else np.zeros(len(hist))
+    result = np.full((len(hist), len(quantiles)), np.nan)
+    for j, q in enumerate(quantiles):
+        position = (total - 1) * q
+        below, above = np.floor(position), np.ceil(position)
+        # Día de la observación de posición r (desde 0): días cuyo acumulado no supera r
+        day_below = (cumulative <= below[:, None]).sum(axis=1) + low
+        day_above = (cumulative <= above[:, None]).sum(axis=1) + low
+        result[:, j] = day_below + (position - below) * (day_above - day_below)
+    result[total == 0] = np.nan
+    return result
+
+
+def grouped_quantiles(codes, days, counts, n_groups, measure, quantiles=QUANTILES):
+    """Observaciones y percentiles por grupo a partir de pares (grupo, día, conteo) de un histograma
+
+    days debe estar dentro del rango de la medida (SKETCH_MEASURES); los
+    códigos de grupo negativos (nulos) se ignoran.
+    """
+    low, high = SKETCH_MEASURES[measure]
+    n_days = high - low + 1
+    valid = codes >= 0
+    if not valid.all():
+        codes, days, counts = codes[valid], days[valid], counts[valid]
+    slots = codes.astype(np.int64) * n_days + days - low
+    hist = np.bincount(slots, weights=counts, minlength=n_groups * n_days).reshape(n_groups, n_days)
+    return hist.sum(axis=1), histogram_quantiles(hist, low, quantiles)
+
+
+def sketch_quantiles(sketch, measure, by=None, quantiles=QUANTILES):
+    """Categorías presentes, observaciones y percentiles de measure en total (by=None) o por la dimensión by"""
+    # Las filas de cada medida son contiguas (build_sketch las concatena por medida)
+    measure_codes = sketch['medida'].cat.codes.to_numpy()
+    code = list(SKETCH_MEASURES).index(measure)
+    rows = slice(*np.searchsorted(measure_codes, [code, code + 1]))
+    days = sketch['dias'].to_numpy()[rows]
+    counts = sketch['n'].to_numpy(dtype='float64')[rows]
+    if by is None:
+        codes, categories = np.zeros(len(days), dtype=np.int64), np.array(['Total'])
+    else:
+        codes, categories = sketch[by].cat.codes.to_numpy()[rows], np.asarray(sketch[by].cat.categories)
+    observations, values = grouped_quantiles(codes, days, counts, len(categories), measure, quantiles)
+    observed = observations > 0
+    return categories[observed], observations[observed], values[observed]
+
+
+def _quantile_columns(prefix=''):
+    return [f"{prefix}P{q * 100:g}" for q in QUANTILES]
+
+
+def delivery_quantiles(sketch):
+    """Tabla de percentiles de entrega y retraso de toda la selección"""
+    rows = []
+    for measure, label in (('dias_entrega', 'Días de entrega'), ('dias_retraso', 'Días de retraso')):
+        _, observations, values = sketch_quantiles(sketch, measure)
+        rows.append([label, int(observations.sum())] + (list(values[0]) if len(values) else [np.nan] * len(QUANTILES)))
+    return pd.DataFrame(rows, columns=['Medida', 'Observaciones'] + _quantile_columns())
+
+
+def sla_table(sketch, by, label, top=10):
+    """Percentiles de entrega y retraso por la dimensión by, de las top categorías con más entregas"""
+    categories, observations, values = sketch_quantiles(sketch, 'dias_entrega', by)
+    table = pd.DataFrame(values, columns=_quantile_columns('Entrega '))
+    table.insert(0, label, categories)
+    table.insert(1, 'Entregas', observations.astype('int64'))
+
+    categories, _, values = sketch_quantiles(sketch, 'dias_retraso', by)
+    delays = pd.DataFrame(values, columns=_quantile_columns('Retraso '))
+    delays.insert(0, label, categories)
+    return table.merge(delays, on=label, how='left').nlargest(top, 'Entregas').reset_index(drop=True)
@@ -0,0 +1,140 @@
+"""
+Snapshot columnar del dataset
+
+La primera carga parsea el CSV y guarda una copia tipada y comprimida en
+Parquet junto a los datos. Las cargas siguientes leen el snapshot con
+memory-map en lugar de volver a parsear el CSV. El snapshot se reconstruye
+solo cuando cambia la huella (tamaño, mtime o hash) del CSV de origen.
+Con SNAPSHOT_DIR se guarda en ese directorio en lugar de junto al CSV.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIRNAME = '.snapshots'
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR') or None
+SNAPSHOT_COMPRESSION = 'zstd'
+
+# Se incrementa cuando cambia el esquema tipado para invalidar snapshots viejos
+SNAPSHOT_FORMAT_VERSION = 1
+
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def snapshot_paths(csv_path):
+    """Rutas del snapshot Parquet y de su fichero de huella"""
+    csv_path = Path(csv_path)
+    snapshot_dir = Path(SNAPSHOT_DIR) if SNAPSHOT_DIR else csv_path.parent / SNAPSHOT_DIRNAME
+    return (snapshot_dir / f"{csv_path.stem}.parquet",
+            snapshot_dir / f"{csv_path.stem}.fingerprint.json")
+
+
+def file_hash(path):
+    """SHA-256 del fichero, leído por bloques"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_fingerprint(csv_path, with_hash=False):
+    """Huella del CSV de origen: tamaño, mtime y opcionalmente hash"""
+    stat = os.stat(csv_path)
+    fingerprint = {
+        'format_version': SNAPSHOT_FORMAT_VERSION,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+    }
+    if with_hash:
+        fingerprint['sha256'] = file_hash(csv_path)
+    return fingerprint
+
+
+def _read_stored_fingerprint(meta_path):
+    try:
+        return json.loads(Path(meta_path).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def write_atomic(path, write_fn):
+    """Escribe a un temporal y lo renombra, para que nunca se lea un fichero a medias"""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        write_fn(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def is_snapshot_valid(csv_path):
+    """Indica si el snapshot existe y corresponde al CSV actual"""
+    snapshot_path, meta_path = snapshot_paths(csv_path)
+    stored = _read_stored_fingerprint(meta_path)
+    if not snapshot_path.exists() or not stored:
+        return False
+
+    current = source_fingerprint(csv_path)
+    if stored.get('format_version') != current['format_version'] or stored.get('size') != current['size']:
+        return False
+    if stored.get('mtime_ns') == current['mtime_ns']:
+        return True
+
+    # Mismo tamaño pero otro mtime (p.ej. copiado o touch): decide el hash
+    current_hash = file_hash(csv_path)
+    if stored.get('sha256') != current_hash:
+        return False
+    current['sha256'] = current_hash
+    try:
+        write_atomic(meta_path, lambda p: p.write_text(json.dumps(current)))
+    except OSError:
+        pass
+    return True
+
+
+def read_snapshot(snapshot_path):
+    """Lee el snapshot con memory-map y lo devuelve como DataFrame tipado"""
+    table = pq.read_table(snapshot_path, memory_map=True)
+    return table.to_pandas()
+
+
+def write_snapshot(df, csv_path, fingerprint=None):
+    """Guarda el DataFrame tipado como snapshot Parquet comprimido"""
+    snapshot_path, meta_path = snapshot_paths(csv_path)
+    fingerprint = fingerprint or source_fingerprint(csv_path, with_hash=True)
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    write_atomic(snapshot_path,
+                  lambda p: pq.write_table(table, p, compression=SNAPSHOT_COMPRESSION))
+    write_atomic(meta_path, lambda p: p.write_text(json.dumps(fingerprint)))
+
+
+def load_with_snapshot(csv_path, reader):
+    """Carga el dataset desde el snapshot si es válido; si no, parsea el CSV con reader y lo regenera"""
+    snapshot_path, _ = snapshot_paths(csv_path)
+    if is_snapshot_valid(csv_path):
+        try:
+            return read_snapshot(snapshot_path)
+        except (OSError, pa.ArrowException) as e:
+            logger.warning("Snapshot ilegible (%s), se regenera desde el CSV", e)
+
+    # La huella se toma antes de leer para no marcar como válido un CSV que cambió durante la carga
+    fingerprint = source_fingerprint(csv_path, with_hash=True)
+    df = reader(csv_path)
+    try:
+        write_snapshot(df, csv_path, fingerprint)
+    except OSError as e:
+        # Un volumen de solo lectura no debe impedir servir el dashboard
+        logger.warning("No se pudo escribir el snapshot en %s: %s", snapshot_path, e)
+    return df
@@ -0,0 +1,419 @@
+"""
+Generador de datos sintéticos con la forma del dataset de Olist
+
+Genera N filas con las mismas columnas que olist_dashboard_dataset.csv y la
+tabla ventas, con distribuciones calibradas sobre la muestra real: volumen
+diario creciente con pico de Black Friday, estados y ciudades, categorías
+con su nivel de precio, peso y coste de envío correlacionados, cuotas solo
+con tarjeta, tiempos de entrega por estado, retrasos que hunden el rating y
+un porcentaje de clientes que repiten compra.
+
+Todo está vectorizado con NumPy y se genera por bloques (pa.Table) ya
+ordenados por fecha, así que 100M de filas se escriben a CSV/Parquet o se
+cargan con COPY en Postgres sin tener el dataset entero en memoria. Cada
+bloque usa su propia semilla derivada de (seed, primera fila): la misma
+semilla y el mismo tamaño de bloque reproducen el mismo dataset.
+
+Uso:
+    python app/synthetic.py --rows 10000000 --output data/ventas_10m.parquet
+    python app/synthetic.py --rows 1000000 --output ventas_1m.csv --copy --replace
+"""
+
+import argparse
+import io
+import time
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+# Columnas en el orden del CSV de Olist (la tabla ventas usa 'ano')
+CSV_COLUMNS = [
+    'order_id', 'order_item_id', 'customer_id', 'fecha', 'año', 'mes', 'mes_nombre',
+    'dia_semana', 'estado', 'ciudad', 'categoria', 'peso_producto_g', 'precio',
+    'costo_envio', 'valor_total_pagado', 'metodo_pago', 'cuotas', 'estado_orden',
+    'dias_entrega', 'dias_retraso', 'rating'
+]
+TABLE_COLUMNS = ['ano' if col == 'año' else col for col in CSV_COLUMNS]
+
+START_DATE = np.datetime64('2016-10-04')
+END_DATE = np.datetime64('2018-08-28')
+
+DEFAULT_CHUNK_ROWS = 1_000_000
+DEFAULT_REPEAT_CUSTOMER_RATE = 0.03
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+WEEKDAY_WEIGHTS = [0.161, 0.159, 0.155, 0.153, 0.146, 0.109, 0.117]
+
+STATE_WEIGHTS = {
+    'SP': 0.4156, 'RJ': 0.1266, 'MG': 0.116, 'RS': 0.058, 'PR': 0.0498, 'SC': 0.0387,
+    'BA': 0.0361, 'GO': 0.0231, 'DF': 0.021, 'ES': 0.02, 'PE': 0.016, 'CE': 0.0142,
+    'MT': 0.0101, 'PA': 0.009, 'MA': 0.0078, 'MS': 0.0072, 'PB': 0.0058, 'RN': 0.0051,
+    'PI': 0.0041, 'SE': 0.0036, 'AL': 0.0033, 'RO': 0.0026, 'TO': 0.0024, 'AM': 0.0017,
+    'AC': 0.0009, 'AP': 0.0008, 'RR': 0.0005
+}
+
+# Ciudades más frecuentes de cada estado, de mayor a menor volumen
+STATE_CITIES = {
+    'SP': ['sao paulo', 'campinas', 'guarulhos', 'sao bernardo do campo', 'osasco', 'santo andre', 'jundiai', 'sao jose dos campos'],
+    'RJ': ['rio de janeiro', 'niteroi', 'nova iguacu', 'sao goncalo', 'duque de caxias', 'volta redonda', 'petropolis', 'teresopolis'],
+    'MG': ['belo horizonte', 'uberlandia', 'juiz de fora', 'contagem', 'betim', 'sete lagoas', 'ipatinga', 'ribeirao das neves'],
+    'RS': ['porto alegre', 'caxias do sul', 'canoas', 'pelotas', 'santa maria', 'sao leopoldo', 'passo fundo', 'santa cruz do sul'],
+    'PR': ['curitiba', 'maringa', 'londrina', 'cascavel', 'sao jose dos pinhais', 'ponta grossa', 'foz do iguacu', 'colombo'],
+    'SC': ['florianopolis', 'sao jose', 'blumenau', 'joinville', 'palhoca', 'itajai', 'chapeco', 'jaragua do sul'],
+    'BA': ['salvador', 'feira de santana', 'porto seguro', 'juazeiro', 'vitoria da conquista', 'camacari', 'lauro de freitas'],
+    'GO': ['goiania', 'aparecida de goiania', 'rio verde', 'luziania', 'jatai', 'anapolis'],
+    'DF': ['brasilia', 'ceilandia', 'taguatinga'],
+    'ES': ['vitoria', 'vila velha', 'serra', 'cariacica', 'cachoeiro de itapemirim', 'guarapari', 'linhares'],
+    'PE': ['recife', 'jaboatao dos guararapes', 'caruaru', 'olinda', 'paulista', 'petrolina'],
+    'CE': ['fortaleza', 'sobral', 'caucaia', 'maracanau', 'juazeiro do norte', 'crato'],
+    'MT': ['cuiaba', 'rondonopolis', 'caceres', 'primavera do leste', 'sinop', 'tangara da serra'],
+    'PA': ['belem', 'ananindeua', 'santarem', 'parauapebas', 'altamira', 'paragominas'],
+    'MA': ['sao luis', 'imperatriz', 'balsas', 'sao jose de ribamar', 'timon'],
+    'MS': ['campo grande', 'dourados', 'tres lagoas', 'nova andradina', 'navirai'],
+    'PB': ['joao pessoa', 'campina grande', 'bayeux', 'sousa', 'cabedelo'],
+    'RN': ['natal', 'parnamirim', 'mossoro', 'pau dos ferros'],
+    'PI': ['teresina', 'parnaiba', 'piripiri', 'picos'],
+    'SE': ['aracaju', 'nossa senhora do socorro', 'itabaiana', 'estancia'],
+    'AL': ['maceio', 'arapiraca', 'palmeira dos indios', 'delmiro gouveia'],
+    'RO': ['porto velho', 'ji-parana', 'cacoal', 'vilhena'],
+    'TO': ['palmas', 'araguaina', 'gurupi'],
+    'AM': ['manaus', 'itacoatiara', 'humaita'],
+    'AC': ['rio branco', 'cruzeiro do sul'],
+    'AP': ['macapa', 'santana'],
+    'RR': ['boa vista', 'bonfim']
+}
+
+# Días de entrega medios por estado (distancia a los centros de SP)
+STATE_DELIVERY_DAYS = {
+    'SP': 8.2, 'RJ': 14.8, 'MG': 11.8, 'RS': 14.4, 'PR': 11.6, 'SC': 13.8, 'BA': 18.9,
+    'GO': 14.1, 'DF': 12.0, 'ES': 15.7, 'PE': 17.7, 'CE': 19.8, 'MT': 17.7, 'PA': 24.1,
+    'MA': 20.7, 'MS': 15.1, 'PB': 19.5, 'RN': 18.1, 'PI': 15.2, 'SE': 20.7, 'AL': 24.0,
+    'RO': 18.0, 'TO': 16.2, 'AM': 23.4, 'AC': 17.1, 'AP': 45.0, 'RR': 23.4
+}
+
+# Categorías principales; 'Other' agrupa la cola larga
+CATEGORY_WEIGHTS = {
+    'Bed Bath Table': 0.0997, 'Health Beauty': 0.0864, 'Sports Leisure': 0.0813,
+    'Furniture Decor': 0.0781, 'Computers Accessories': 0.072, 'Housewares': 0.0585,
+    'Watches Gifts': 0.0493, 'Telephony': 0.0401, 'Auto': 0.0395, 'Garden Tools': 0.039,
+    'Toys': 0.037, 'Cool Stuff': 0.0339, 'Perfumery': 0.0286, 'Baby': 0.0261,
+    'Electronics': 0.0257, 'Stationery': 0.0231, 'Fashion Bags Accessories': 0.0186,
+    'Office Furniture': 0.0153, 'Pet Shop': 0.0153, 'Luggage Accessories': 0.0093,
+    'Consoles Games': 0.0088, 'Construction Tools Construction': 0.0072,
+    'Home Appliances': 0.007, 'Small Appliances': 0.0058, 'Musical Instruments': 0.0052,
+    'Home Construction': 0.0051, 'Books General Interest': 0.0045, 'Food': 0.0045,
+    'Home Confort': 0.0044, 'Furniture Living Room': 0.0042, 'Audio': 0.0036,
+    'Air Conditioning': 0.0025, 'Computers': 0.0023, 'Home Appliances 2': 0.0022,
+    'Other': 0.0420
+}
+
+# Multiplicador del precio respecto a la mediana global
+CATEGORY_PRICE_FACTOR = {
+    'Computers': 6.0, 'Home Appliances 2': 2.5, 'Small Appliances': 2.0,
+    'Office Furniture': 1.8, 'Musical Instruments': 1.8, 'Air Conditioning': 1.8,
+    'Watches Gifts': 1.7, 'Consoles Games': 1.2, 'Baby': 1.3, 'Cool Stuff': 1.4,
+    'Telephony': 0.5, 'Health Beauty': 1.0, 'Bed Bath Table': 1.0,
+    'Stationery': 0.8, 'Books General Interest': 0.6, 'Food': 0.6
+}
+
+PAYMENT_WEIGHTS = {'Credit Card': 0.7588, 'Boleto': 0.1978, 'Voucher': 0.026, 'Debit Card': 0.0174}
+
+# Cuotas de los pagos con tarjeta de crédito (el resto paga en 1 cuota)
+CREDIT_CARD_INSTALLMENTS = {
+    1: 0.318, 2: 0.159, 3: 0.14, 4: 0.091, 5: 0.065, 6: 0.057, 7: 0.023, 8: 0.058,
+    9: 0.008, 10: 0.076, 12: 0.003, 15: 0.001, 18: 0.0005, 24: 0.0005
+}
+
+ORDER_ITEM_WEIGHTS = {1: 0.875, 2: 0.0862, 3: 0.0214, 4: 0.0091, 5: 0.0039, 6: 0.0031, 7: 0.0013}
+
+# Rating de 1 a 5 según la entrega llegue a tiempo o con retraso
+RATING_ON_TIME = [0.09, 0.03, 0.085, 0.20, 0.595]
+RATING_LATE = [0.45, 0.08, 0.12, 0.14, 0.21]
+HALF_STAR_RATE = 0.0012
+MISSING_RATING_RATE = 0.007
+MISSING_WEIGHT_RATE = 0.0003
+
+# Los dos caracteres hexadecimales de cada byte empaquetados en un uint16: _HEX_PAIRS[255] = b'ff'
+_HEX_PAIRS = np.frombuffer(''.join(f'{b:02x}' for b in range(256)).encode(), dtype=np.uint16)
+_MASK64 = (1 << 64) - 1
+
+
+def _probabilities(weights):
+    """Claves y probabilidades normalizadas de un diccionario de pesos"""
+    keys = list(weights)
+    p = np.array([weights[k] for k in keys], dtype='float64')
+    return keys, p / p.sum()
+
+
+def _day_weights(days):
+    """Peso de cada día: crecimiento hasta nov-2017, pico de Black Friday y perfil semanal"""
+    t = (days - np.datetime64('2016-12-01')).astype('float64')
+    plateau = (np.datetime64('2017-11-01') - np.datetime64('2016-12-01')).astype('float64')
+    trend = np.clip(t / plateau, 0.05, 1.0)
+    black_friday = (days >= np.datetime64('2017-11-20')) & (days <= np.datetime64('2017-11-27'))
+    trend = np.where(black_friday, trend * 2.5, trend)
+    weekday = (days.astype('int64') + 3) % 7
+    weights = trend * np.asarray(WEEKDAY_WEIGHTS)[weekday]
+    return weights / weights.sum()
+
+
+def _splitmix64(x):
+    """Mezcla biyectiva de 64 bits: ids distintos dan hashes distintos"""
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _hex_ids(numbers, salt):
+    """Ids de 32 caracteres hexadecimales (como los de Olist) derivados de enteros, sin bucles por fila"""
+    high = _splitmix64(numbers.astype(np.uint64) ^ np.uint64(salt & _MASK64))
+    low = _splitmix64(high)
+    # 128 bits en big-endian -> 16 bytes por id -> 32 caracteres
+    raw = np.stack([high, low], axis=1).astype('>u8').view(np.uint8)
+    chars = _HEX_PAIRS[raw]
+    offsets = np.arange(0, 32 * (len(numbers) + 1), 32, dtype=np.int32)
+    return pa.StringArray.from_buffers(len(numbers), pa.py_buffer(offsets), pa.py_buffer(chars))
+
+
+def _dictionary(codes, values):
+    """Columna codificada como diccionario (se lee como category en pandas)"""
+    return pa.DictionaryArray.from_arrays(pa.array(codes, type=pa.int32()), pa.array(values, type=pa.string()))
+
+
+def _city_table():
+    """Nombres de ciudad únicos y, por estado, códigos y probabilidades acumuladas (Zipf)"""
+    names = sorted({city for cities in STATE_CITIES.values() for city in cities})
+    position = {name: i for i, name in enumerate(names)}
+    codes, cumulative = [], []
+    for state in STATE_WEIGHTS:
+        cities = STATE_CITIES[state]
+        weights = 1.0 / np.arange(1, len(cities) + 1) ** 1.1
+        codes.append(np.array([position[c] for c in cities]))
+        cumulative.append(np.cumsum(weights) / weights.sum())
+    return names, codes, cumulative
+
+
+def _choose_city(rng, state_codes, city_codes, city_cumulative):
+    """Ciudad de cada fila condicionada a su estado"""
+    u = rng.random(len(state_codes))
+    result = np.empty(len(state_codes), dtype=np.int32)
+    for state, (codes, cumulative) in enumerate(zip(city_codes, city_cumulative)):
+        rows = state_codes == state
+        positions = np.minimum(np.searchsorted(cumulative, u[rows]), len(codes) - 1)
+        result[rows] = codes[positions]
+    return result
+
+
+def _build_chunk(rng, seed, rows, dates, repeat_customer_rate, tables):
+    """Un bloque de filas (posiciones globales rows, fechas ya ordenadas) como pa.Table"""
+    n = len(rows)
+    states, state_p = _probabilities(STATE_WEIGHTS)
+    categories, category_p = _probabilities(CATEGORY_WEIGHTS)
+    payments, payment_p = _probabilities(PAYMENT_WEIGHTS)
+    installments, installment_p = _probabilities(CREDIT_CARD_INSTALLMENTS)
+    items, item_p = _probabilities(ORDER_ITEM_WEIGHTS)
+    city_names, city_codes, city_cumulative = tables['cities']
+    month_labels, first_month = tables['months']
+
+    # Calendario
+    months = dates.astype('datetime64[M]').astype('int64')
+    ano = (dates.astype('datetime64[Y]').astype('int64') + 1970).astype(np.int16)
+    weekday = (dates.astype('int64') + 3) % 7
+
+    # Clientes: cada fila es un cliente nuevo salvo las que repiten con un cliente anterior
+    customer = rows.copy()
+    repeat = (rng.random(n) < repeat_customer_rate) & (rows > 0)
+    customer[repeat] = (rng.random(np.count_nonzero(repeat)) * rows[repeat]).astype(np.int64)
+
+    # Geografía y producto
+    state = rng.choice(len(states), n, p=state_p)
+    city = _choose_city(rng, state, city_codes, city_cumulative)
+    category = rng.choice(len(categories), n, p=category_p)
+    price_factor = np.array([CATEGORY_PRICE_FACTOR.get(c, 1.0) for c in categories])[category]
+
+    log_weight = rng.normal(6.68, 1.33, n)
+    weight_z = (log_weight - 6.68) / 1.33
+    peso = np.clip(np.round(np.exp(log_weight)), 2, 30000)
+    peso[rng.random(n) < MISSING_WEIGHT_RATE] = np.nan
+
+    precio = np.round(np.maximum(np.exp(rng.normal(4.30, 0.85, n) + 0.25 * weight_z) * price_factor, 0.85), 2)
+
+    # El envío crece con el peso y con la distancia (días de entrega del estado)
+    delivery_mean = np.array([STATE_DELIVERY_DAYS[s] for s in states])[state]
+    distance_factor = (delivery_mean / STATE_DELIVERY_DAYS['SP']) ** 0.3
+    shipping_z = 0.48 * weight_z + 0.877 * rng.standard_normal(n)
+    costo_envio = np.round(np.exp(2.80 + 0.57 * shipping_z) * distance_factor, 2)
+    costo_envio[rng.random(n) < 0.003] = 0.0
+
+    # Pago
+    payment = rng.choice(len(payments), n, p=payment_p)
+    credit_card = payment == payments.index('Credit Card')
+    cuotas = np.ones(n, dtype=np.int16)
+    cuotas[credit_card] = np.asarray(installments)[rng.choice(len(installments), np.count_nonzero(credit_card), p=installment_p)]
+    order_item_id = np.asarray(items, dtype=np.int16)[rng.choice(len(items), n, p=item_p)]
+    valor_total_pagado = np.round((precio + costo_envio) * order_item_id, 2)
+
+    # Entrega y satisfacción: un pedido que llega después de la fecha estimada puntúa peor
+    dias_entrega = np.round(rng.gamma(3.0, delivery_mean / 3.0))
+    # La fecha estimada también depende de la distancia, con holgura de ~1 semana
+    estimated = np.clip(np.round(delivery_mean * 1.4 + rng.normal(7.5, 6.0, n)), 2, 90)
+    dias_retraso = dias_entrega - estimated
+    late = dias_retraso > 0
+    rating = np.where(late, rng.choice(5, n, p=RATING_LATE), rng.choice(5, n, p=RATING_ON_TIME)) + 1.0
+    half_star = (rng.random(n) < HALF_STAR_RATE) & (rating < 5)
+    rating[half_star] += 0.5
+    rating[rng.random(n) < MISSING_RATING_RATE] = np.nan
+
+    columns = {
+        'order_id': _hex_ids(rows, seed * 2 + 1),
+        'order_item_id': pa.array(order_item_id),
+        'customer_id': _hex_ids(customer, seed * 2 + 2),
+        'fecha': pa.array(dates, type=pa.date32()),
+        'año': pa.array(ano),
+        'mes': pa.array((months % 12 + 1).astype(np.int8)),
+        'mes_nombre': _dictionary(months - first_month, month_labels),
+        'dia_semana': _dictionary(weekday, DAY_NAMES),
+        'estado': _dictionary(state, states),
+        'ciudad': _dictionary(city, city_names),
+        'categoria': _dictionary(category, categories),
+        'peso_producto_g': pa.array(peso, from_pandas=True),
+        'precio': pa.array(precio),
+        'costo_envio': pa.array(costo_envio),
+        'valor_total_pagado': pa.array(valor_total_pagado),
+        'metodo_pago': _dictionary(payment, payments),
+        'cuotas': pa.array(cuotas),
+        'estado_orden': _dictionary(np.zeros(n, dtype=np.int32), ['Delivered']),
+        'dias_entrega': pa.array(dias_entrega),
+        'dias_retraso': pa.array(dias_retraso),
+        'rating': pa.array(rating, from_pandas=True)
+    }
+    return pa.table([columns[col] for col in CSV_COLUMNS], names=CSV_COLUMNS)
+
+
+def generate_chunks(n_rows, seed=42, chunk_rows=DEFAULT_CHUNK_ROWS,
+                    repeat_customer_rate=DEFAULT_REPEAT_CUSTOMER_RATE):
+    """Genera n_rows filas en bloques pa.Table consecutivos y ordenados por fecha"""
+    rng = np.random.default_rng(seed)
+    days = np.arange(START_DATE, END_DATE + 1)
+    # Reparto de filas por día fijado de antemano: los bloques solo recorren posiciones
+    day_end = np.cumsum(rng.multinomial(n_rows, _day_weights(days)))
+
+    month_range = np.arange(START_DATE.astype('datetime64[M]'), END_DATE.astype('datetime64[M]') + 1)
+    tables = {
+        'cities': _city_table(),
+        'months': ([str(m) for m in month_range], month_range[0].astype('int64'))
+    }
+
+    for start in range(0, n_rows, chunk_rows):
+        rows = np.arange(start, min(start + chunk_rows, n_rows), dtype=np.int64)
+        dates = days[np.searchsorted(day_end, rows, side='right')]
+        chunk_rng = np.random.default_rng([seed, start])
+        yield _build_chunk(chunk_rng, seed, rows, dates, repeat_customer_rate, tables)
+
+
+def generate_dataframe(n_rows, seed=42, **kwargs):
+    """Dataset sintético completo como DataFrame (columnas del CSV; aplicar schema.apply_schema)"""
+    table = pa.concat_tables(generate_chunks(n_rows, seed=seed, **kwargs))
+    return table.to_pandas(date_as_object=False, coerce_temporal_nanoseconds=True)
+
+
+def _plain_columns(table):
+    """Decodifica los diccionarios a texto para escribir CSV"""
+    return pa.table([col.cast(pa.string()) if pa.types.is_dictionary(col.type) else col
+                     for col in table.columns], names=table.column_names)
+
+
+def iter_written(chunks, path, file_format=None):
+    """Escribe cada bloque a CSV o Parquet (según la extensión) y lo vuelve a entregar, sin acumularlos"""
+    path = Path(path)
+    file_format = file_format or path.suffix.lstrip('.').lower()
+    if file_format not in ('csv', 'parquet'):
+        raise ValueError(f"Formato no soportado: {file_format} (csv o parquet)")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    writer = None
+    try:
+        for table in chunks:
+            if file_format == 'csv':
+                plain = _plain_columns(table)
+                writer = writer or pa_csv.CSVWriter(path, plain.schema)
+                writer.write_table(plain)
+            else:
+                writer = writer or pq.ParquetWriter(path, table.schema, compression='zstd')
+                writer.write_table(table)
+            yield table
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_chunks(chunks, path, file_format=None):
+    """Escribe los bloques a CSV o Parquet y devuelve el número de filas"""
+    return sum(table.num_rows for table in iter_written(chunks, path, file_format))
+
+
+def copy_chunks_to_postgres(chunks, dsn, replace=False):
+    """Carga los bloques en la tabla ventas con COPY ... FROM STDIN en una transacción"""
+    import psycopg2
+
+    copy_sql = f"COPY ventas({','.join(TABLE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+    write_options = pa_csv.WriteOptions(include_header=False)
+    n_rows = 0
+    with psycopg2.connect(dsn) as conn:
+        with conn.cursor() as cur:
+            if replace:
+                cur.execute("TRUNCATE ventas")
+            for table in chunks:
+                buffer = io.BytesIO()
+                pa_csv.write_csv(_plain_columns(table), buffer, write_options)
+                buffer.seek(0)
+                cur.copy_expert(copy_sql, buffer)
+                n_rows += table.num_rows
+            cur.execute("ANALYZE ventas")
+    conn.close()
+    return n_rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera un dataset sintético con la forma del de Olist")
+    parser.add_argument('--rows', type=int, default=10000, help="Número de filas (por defecto 10000)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS, help="Filas por bloque")
+    parser.add_argument('--repeat-rate', type=float, default=DEFAULT_REPEAT_CUSTOMER_RATE,
+                        help="Fracción de órdenes de clientes que ya compraron")
+    parser.add_argument('--output', help="Fichero .csv o .parquet de salida")
+    parser.add_argument('--format', choices=['csv', 'parquet'], help="Formato si la extensión no lo indica")
+    parser.add_argument('--copy', nargs='?', const='', metavar='DATABASE_URL',
+                        help="Carga las filas en la tabla ventas (por defecto DATABASE_URL)")
+    parser.add_argument('--replace', action='store_true', help="Vacía ventas antes de cargar (con --copy)")
+    args = parser.parse_args(argv)
+
+    if not args.output and args.copy is None:
+        parser.error("indica --output, --copy o ambos")
+
+    started = time.perf_counter()
+    chunks = generate_chunks(args.rows, seed=args.seed, chunk_rows=args.chunk_rows,
+                             repeat_customer_rate=args.repeat_rate)
+
+    if args.copy is not None:
+        from pg_backend import database_url, refresh_summary_tables
+        dsn = args.copy or database_url()
+        if args.output:
+            # Un único recorrido: cada bloque se escribe al fichero y después se copia a Postgres
+            chunks = iter_written(chunks, args.output, args.format)
+        n_rows = copy_chunks_to_postgres(chunks, dsn, replace=args.replace)
+        refreshed = refresh_summary_tables(dsn)
+        if refreshed:
+            print(f"Tablas resumen recalculadas: {', '.join(refreshed)}")
+    else:
+        n_rows = write_chunks(chunks, args.output, args.format)
+
+    elapsed = time.perf_counter() - started
+    print(f"{n_rows:,} filas generadas en {elapsed:.1f} s ({n_rows / max(elapsed, 1e-9):,.0f} filas/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Series temporales del dashboard: granularidad y reducción de puntos
+
+La serie de GMV diario (aggregations.daily_gmv_series) se agrega a la
+granularidad elegida y, si aun así tiene más puntos que el presupuesto del
+gráfico, se reduce en el servidor con Largest-Triangle-Three-Buckets (LTTB)
+antes de construir la figura: el navegador nunca recibe más de max_points
+puntos, sea cual sea el rango de fechas.
+
+LTTB conserva el primer y el último punto y, en cada tramo, el punto que
+forma el triángulo de mayor área con el elegido en el tramo anterior y la
+media del siguiente, así que mantiene picos y valles que un promedio por
+tramos aplanaría.
+"""
+
+import numpy as np
+
+# Granularidad -> regla de pandas (semanas de lunes a domingo, etiquetadas por el lunes)
+GRANULARITIES = {
+    'Diaria': 'D',
+    'Semanal': 'W-MON',
+}
+
+DEFAULT_MAX_POINTS = 500
+# El primer punto, el último y al menos un tramo entre ellos
+MIN_POINTS = 3
+
+
+def resample_series(daily, granularity):
+    """Suma la serie diaria a la granularidad pedida ('Diaria' o 'Semanal')"""
+    rule = GRANULARITIES[granularity]
+    if rule == 'D' or daily.empty:
+        return daily
+    return daily.resample(rule, label='left', closed='left').sum()
+
+
+def lttb(x, y, max_points):
+    """Posiciones de los puntos que conserva LTTB (todas si ya caben en max_points, nunca menos de MIN_POINTS)"""
+    n = len(y)
+    max_points = max(max_points, MIN_POINTS)
+    if n <= max_points:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    # max_points - 2 tramos entre el primer y el último punto
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    previous = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()
+        area = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
@@ -0,0 +1,200 @@
+"""
+Benchmarks del dashboard por tamaño de dataset
+
+Genera datasets sintéticos (ver app/synthetic.py) de cada tamaño y mide por
+separado cada etapa de un rerun: carga del CSV, escritura y lectura del
+snapshot, construcción del dataset compartido (cubo + índices), ingesta por
+bloques (ingest.py), filtros del sidebar, calculate_kpis, variación de los
+KPIs frente al mes anterior (main.load_deltas), agregados de cada vista y
+render de cada dashboard.
+Las funciones de render se ejecutan en modo headless de Streamlit, que
+construye y serializa las figuras igual que en la app pero sin navegador.
+
+Cada etapa se ejecuta una vez con tracemalloc para medir su pico de memoria
+y después --repeat veces sin él para medir el tiempo. El resultado se guarda
+en JSON (benchmarks/results/) para comparar ejecuciones con compare.py.
+
+Uso:
+    python benchmarks/bench_dashboard.py
+    python benchmarks/bench_dashboard.py --sizes 10000 1000000 --repeat 5
+"""
+
+import argparse
+import json
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+APP_DIR = ROOT_DIR / 'app'
+sys.path.insert(0, str(APP_DIR))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import streamlit.logger  # noqa: E402
+
+from aggregations import DEFAULT_COMPARISON, VIEWS, calculate_kpis, compute_aggregates  # noqa: E402
+from dataset import build_dataset  # noqa: E402
+from filters import RowSelection  # noqa: E402
+from ingest import ingest_csv  # noqa: E402
+from parallel import AggregationPool  # noqa: E402
+from schema import memory_usage_mb, read_dataset_csv  # noqa: E402
+from snapshot import load_with_snapshot, write_snapshot  # noqa: E402
+from synthetic import generate_chunks, write_chunks  # noqa: E402
+
+DEFAULT_SIZES = [10_000, 1_000_000, 10_000_000]
+DATA_DIR = Path(__file__).resolve().parent / '.data'
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+# Combinaciones de filtros del sidebar que se miden
+FILTER_SCENARIOS = {
+    'sin_filtros': {'ano': None, 'estado': None, 'categoria': None},
+    'ano': {'ano': 2018, 'estado': None, 'categoria': None},
+    'estado': {'ano': None, 'estado': 'SP', 'categoria': None},
+    'ano_estado_categoria': {'ano': 2018, 'estado': 'SP', 'categoria': 'Health Beauty'},
+    'estados_multiples': {'estado': ('MG', 'RJ', 'SP'), 'categoria': ('Auto', 'Health Beauty')},
+    'rango_90_dias': {'fecha': (date(2017, 10, 1), date(2017, 12, 29)), 'estado': ('RJ', 'SP')}
+}
+
+
+def measure(fn, repeat):
+    """Pico de memoria (MB, con tracemalloc) y tiempos (s) de fn; devuelve también el último resultado"""
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+
+    stats = {
+        'seconds_min': min(timings),
+        'seconds_median': statistics.median(timings),
+        'runs': repeat,
+        'peak_mb': peak / 1024 ** 2
+    }
+    return stats, result
+
+
+def dataset_csv(n_rows, seed):
+    """CSV sintético de n_rows filas (se genera una vez y se reutiliza entre ejecuciones)"""
+    path = DATA_DIR / f'synthetic_{n_rows}_seed{seed}.csv'
+    if not path.exists():
+        print(f"  generando {path.name}...", flush=True)
+        tmp_path = path.with_suffix('.tmp.csv')
+        write_chunks(generate_chunks(n_rows, seed=seed), tmp_path)
+        tmp_path.replace(path)
+    return path
+
+
+def bench_size(n_rows, seed, repeat, dashboard, render=True, pool=None):
+    """Mide todas las etapas para un tamaño de dataset"""
+    csv_path = dataset_csv(n_rows, seed)
+    stages = []
+
+    def record(stage, fn, runs=repeat):
+        stats, result = measure(fn, runs)
+        stages.append({'stage': stage, **stats})
+        print(f"  {stage:<40} {stats['seconds_median'] * 1000:>10.1f} ms  {stats['peak_mb']:>9.1f} MB", flush=True)
+        return result
+
+    # Las cargas son caras: una sola ejecución cronometrada
+    df = record('load_csv', lambda: read_dataset_csv(csv_path), runs=1)
+    record('snapshot_write', lambda: write_snapshot(df, csv_path), runs=1)
+    df = record('load_snapshot', lambda: load_with_snapshot(csv_path, read_dataset_csv), runs=1)
+    dataset = record('build_dataset', lambda: build_dataset(df, version=csv_path.name), runs=1)
+    record('ingest_streaming', lambda: ingest_csv(csv_path, version=csv_path.name), runs=1)
+
+    for name, filters in FILTER_SCENARIOS.items():
+        def apply_filters(filters=filters):
+            selection = dataset.select(filters)
+            return dataset.cells(filters, selection), selection
+
+        cells, selection = record(f'filter[{name}]', apply_filters)
+        kpis = record(f'calculate_kpis[{name}]', lambda: calculate_kpis(cells, selection, pool=pool))
+        record(f'deltas[{name}]', lambda filters=filters: dashboard.load_deltas(dataset, filters, cells, kpis,
+                                                                                DEFAULT_COMPARISON))
+
+    full_selection = RowSelection(dataset.df)
+    for view in VIEWS:
+        aggregates = record(f'aggregates[{view}]',
+                            lambda view=view: compute_aggregates(dataset.cube, full_selection, (view,), pool=pool,
+                                                                 daily_cells=dataset.daily_cube,
+                                                                 sketch_cells=dataset.sketch))
+        if render:
+            render_fn = getattr(dashboard, f'render_{view}_dashboard')
+            record(f'render[{view}]', lambda: render_fn(aggregates))
+
+    return {
+        'rows': n_rows,
+        'dataset_mb': memory_usage_mb(dataset.df),
+        'cube_cells': len(dataset.cube),
+        'stages': stages
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _load_dashboard_module():
+    """Importa main.py en modo headless para llamar a load_deltas y a sus funciones de render"""
+    streamlit.logger.set_log_level('error')
+    import main
+    return main
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de carga, filtros, KPIs y render del dashboard")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Filas de cada dataset")
+    parser.add_argument('--repeat', type=int, default=3, help="Ejecuciones cronometradas por etapa")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-render', action='store_true', help="No mide las funciones de render")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Núcleos para la agregación por particiones (1 = en serie, ver parallel.py)")
+    parser.add_argument('--output', type=Path, help="Fichero JSON de resultados")
+    args = parser.parse_args(argv)
+
+    dashboard = _load_dashboard_module()
+    pool = AggregationPool(args.workers) if args.workers > 1 else None
+    started_at = datetime.now(timezone.utc)
+    results = []
+    for n_rows in args.sizes:
+        print(f"{n_rows:,} filas", flush=True)
+        results.append(bench_size(n_rows, args.seed, args.repeat, dashboard, not args.no_render, pool))
+
+    report = {
+        'started_at': started_at.isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'workers': args.workers,
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'results': results
+    }
+
+    output = args.output or RESULTS_DIR / f"bench_{started_at:%Y%m%dT%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Resultados en {output}")
+
+
+if __name__ == '__main__':
+    main()
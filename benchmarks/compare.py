@@ -0,0 +1,63 @@
+"""
+Compara dos ejecuciones de bench_dashboard.py
+
+Muestra por tamaño y etapa la mediana de tiempo y el pico de memoria de cada
+ejecución y el cociente nueva/base. Marca las etapas que empeoran más que
+--threshold.
+
+Uso:
+    python benchmarks/compare.py results/base.json results/nueva.json
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def _stages(report):
+    """{(filas, etapa): medidas} de un informe"""
+    return {
+        (result['rows'], stage['stage']): stage
+        for result in report['results']
+        for stage in result['stages']
+    }
+
+
+def compare(base, new, threshold):
+    """Filas de la comparación y si alguna etapa empeora más que threshold"""
+    base_stages, new_stages = _stages(base), _stages(new)
+    rows = []
+    regressed = False
+    for key in sorted(base_stages.keys() & new_stages.keys()):
+        old, cur = base_stages[key], new_stages[key]
+        ratio = cur['seconds_median'] / old['seconds_median'] if old['seconds_median'] else float('inf')
+        slower = ratio > 1 + threshold
+        regressed |= slower
+        rows.append((key[0], key[1], old['seconds_median'] * 1000, cur['seconds_median'] * 1000, ratio,
+                     old['peak_mb'], cur['peak_mb'], slower))
+    return rows, regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara dos ficheros de resultados de benchmarks")
+    parser.add_argument('base', type=Path)
+    parser.add_argument('new', type=Path)
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Empeoramiento relativo que se marca como regresión (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    base = json.loads(args.base.read_text())
+    new = json.loads(args.new.read_text())
+    rows, regressed = compare(base, new, args.threshold)
+
+    print(f"base: {base.get('git_commit')} ({base['started_at']})  nueva: {new.get('git_commit')} ({new['started_at']})")
+    print(f"{'filas':>12} {'etapa':<36} {'base ms':>10} {'nueva ms':>10} {'x':>6} {'base MB':>9} {'nueva MB':>9}")
+    for n_rows, stage, old_ms, new_ms, ratio, old_mb, new_mb, slower in rows:
+        flag = '  <-- regresión' if slower else ''
+        print(f"{n_rows:>12,} {stage:<36} {old_ms:>10.1f} {new_ms:>10.1f} {ratio:>6.2f} {old_mb:>9.1f} {new_mb:>9.1f}{flag}")
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+-- Tablas resumen (vistas materializadas) sobre ventas
+--
+-- Metabase y el dashboard (DATA_SOURCE=postgres) leen estas tablas en lugar de
+-- repetir los mismos GROUP BY sobre la tabla completa. Todas conservan ano,
+-- estado y categoria para poder aplicar los filtros del sidebar, y solo
+-- guardan sumas y conteos (aditivos: se pueden volver a agrupar a cualquier
+-- nivel superior). Los promedios se calculan como suma / conteo.
+--
+-- Se recalculan con 04-refresh-summaries.sh después de cada carga. El índice
+-- único de cada una es el que permite REFRESH MATERIALIZED VIEW CONCURRENTLY
+-- (sin bloquear las lecturas mientras se recalcula).
+
+\c ecommerce;
+
+-- GMV mensual y medidas de los KPIs por mes (variación frente al período anterior)
+CREATE MATERIALIZED VIEW IF NOT EXISTS resumen_gmv_mensual AS
+SELECT
+    ano, mes, mes_nombre, estado, categoria,
+    COUNT(*) AS filas,
+    SUM(precio) AS gmv,
+    COUNT(precio) AS precio_n,
+    SUM(rating) AS rating_sum,
+    COUNT(rating) AS rating_n,
+    SUM(dias_entrega) AS dias_entrega_sum,
+    COUNT(dias_entrega) AS dias_entrega_n,
+    COUNT(*) FILTER (WHERE dias_entrega <= 7) AS entregas_rapidas,
+    COUNT(*) FILTER (WHERE rating >= 4) AS satisfechos
+FROM ventas
+GROUP BY ano, mes, mes_nombre, estado, categoria;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_resumen_gmv_mensual
+    ON resumen_gmv_mensual(ano, mes, mes_nombre, estado, categoria);
+
+-- GMV diario (series diarias y semanales del dashboard CEO)
+CREATE MATERIALIZED VIEW IF NOT EXISTS resumen_gmv_diario AS
+SELECT
+    fecha, ano, estado, categoria,
+    COUNT(*) AS filas,
+    SUM(precio) AS gmv,
+    COUNT(precio) AS precio_n
+FROM ventas
+GROUP BY fecha, ano, estado, categoria;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_resumen_gmv_diario
+    ON resumen_gmv_diario(fecha, ano, estado, categoria);
+
+-- Estado x categoría: las medidas de los KPIs y de las tablas por estado y por categoría
+CREATE MATERIALIZED VIEW IF NOT EXISTS resumen_estado_categoria AS
+SELECT
+    ano, estado, categoria,
+    COUNT(*) AS filas,
+    COUNT(order_id) AS ordenes_n,
+    SUM(precio) AS gmv,
+    COUNT(precio) AS precio_n,
+    SUM(rating) AS rating_sum,
+    COUNT(rating) AS rating_n,
+    SUM(dias_entrega) AS dias_entrega_sum,
+    COUNT(dias_entrega) AS dias_entrega_n,
+    COUNT(*) FILTER (WHERE dias_entrega <= 7) AS entregas_rapidas,
+    COUNT(*) FILTER (WHERE rating >= 4) AS satisfechos
+FROM ventas
+GROUP BY ano, estado, categoria;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_resumen_estado_categoria
+    ON resumen_estado_categoria(ano, estado, categoria);
+
+-- Rango de entrega x rating: distribución del rating y rating medio por rango
+CREATE MATERIALIZED VIEW IF NOT EXISTS resumen_entrega_rating AS
+SELECT
+    ano, estado, categoria,
+    CASE
+        WHEN dias_entrega > 0 AND dias_entrega <= 7 THEN 0
+        WHEN dias_entrega > 7 AND dias_entrega <= 14 THEN 1
+        WHEN dias_entrega > 14 AND dias_entrega <= 21 THEN 2
+        WHEN dias_entrega > 21 AND dias_entrega <= 100 THEN 3
+    END::smallint AS rango_entrega,
+    rating,
+    COUNT(*) AS filas
+FROM ventas
+GROUP BY ano, estado, categoria, rango_entrega, rating;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_resumen_entrega_rating
+    ON resumen_entrega_rating(ano, estado, categoria, rango_entrega, rating);
+
+COMMENT ON COLUMN resumen_entrega_rating.rango_entrega IS
+    '0: 1-7 días, 1: 8-14 días, 2: 15-21 días, 3: >21 días (hasta 100); NULL: sin entrega o fuera de rango';
+
+-- Día de la semana x método de pago
+CREATE MATERIALIZED VIEW IF NOT EXISTS resumen_dia_pago AS
+SELECT
+    ano, estado, categoria, dia_semana, metodo_pago,
+    COUNT(*) AS filas,
+    SUM(precio) AS gmv,
+    COUNT(precio) AS precio_n
+FROM ventas
+GROUP BY ano, estado, categoria, dia_semana, metodo_pago;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_resumen_dia_pago
+    ON resumen_dia_pago(ano, estado, categoria, dia_semana, metodo_pago);
+
+-- Histogramas por día de dias_entrega y dias_retraso: percentiles de entrega del
+-- dashboard COO (los histogramas se suman; ver app/sketches.py)
+CREATE MATERIALIZED VIEW IF NOT EXISTS resumen_dias_histograma AS
+SELECT
+    ano, mes, estado, categoria, metodo_pago, m.medida,
+    ROUND(m.dias)::smallint AS dias,
+    COUNT(*) AS filas
+FROM ventas
+CROSS JOIN LATERAL (VALUES ('dias_entrega', dias_entrega), ('dias_retraso', dias_retraso)) AS m(medida, dias)
+WHERE m.dias IS NOT NULL
+GROUP BY ano, mes, estado, categoria, metodo_pago, m.medida, ROUND(m.dias)::smallint;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_resumen_dias_histograma
+    ON resumen_dias_histograma(ano, mes, estado, categoria, metodo_pago, medida, dias);